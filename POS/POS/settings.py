@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from . import database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover the whole stack
+    'pos_app.middleware.RequestProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -78,12 +82,13 @@ WSGI_APPLICATION = 'POS.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# Database - SQLite for all environments
+# Database - SQLite for all environments, in WAL mode with persistent connections (see POS/database.py)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database.sqlite(
+        BASE_DIR / 'db.sqlite3',
+        # File-backed test database so concurrency tests get real SQLite locking
+        TEST={'NAME': BASE_DIR / 'test_db.sqlite3'},
+    )
 }
 
 
@@ -138,6 +143,20 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache - per-process memory, so only for a single development process; settings_production
+# requires REDIS_URL so dashboard invalidations reach every worker
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Per-request query count, DB time and N+1 detection (pos_app.middleware).
+# When False the middleware is dropped at startup and costs nothing.
+REQUEST_PROFILING = True
+REQUEST_PROFILING_SLOW_MS = 500
+REQUEST_PROFILING_SLOW_QUERIES = 50
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -2,6 +2,7 @@ import os
 import dj_database_url
 from decouple import config
 from .settings import *
+from . import database
 
 # Production settings
 DEBUG = config('DEBUG', default=False, cast=bool)
@@ -9,9 +10,21 @@ SECRET_KEY = config('SECRET_KEY', default='django-insecure-6-*5^vn8r*%+@kiev%+__
 
 # Railway provides DATABASE_URL automatically
 DATABASES = {
-    'default': dj_database_url.parse(config('DATABASE_URL'))
+    'default': database.tune(dj_database_url.parse(config('DATABASE_URL'), conn_max_age=database.CONN_MAX_AGE))
 }
 
+# Shared cache, required: with several gunicorn workers a per-process cache would only
+# drop the dashboard snapshot in the worker that made the write, and the others would
+# keep serving it (and 304s for its ETag) until it expires
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_URL'),
+    }
+}
+
+REQUEST_PROFILING = config('REQUEST_PROFILING', default=False, cast=bool)
+
 # Allowed hosts
 ALLOWED_HOSTS = [
     config('RAILWAY_STATIC_URL', default='localhost'),
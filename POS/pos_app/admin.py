@@ -160,6 +160,13 @@ class NotificationAdmin(admin.ModelAdmin):
     message_preview.short_description = 'Message'
 
 
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ['date', 'notification_type', 'count']
+    list_filter = ['notification_type']
+    date_hierarchy = 'date'
+
+
 @admin.register(CashDrawer)
 class CashDrawerAdmin(admin.ModelAdmin):
     list_display = ['opened_by', 'opening_amount', 'closing_amount', 'opened_at', 'closed_at', 'is_active']
@@ -238,3 +245,22 @@ class PaymentCollectionAdmin(admin.ModelAdmin):
     get_entity.short_description = 'Entity'
 
 
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['scope', 'key', 'user', 'response_status', 'created_at', 'expires_at']
+    list_filter = ['scope', 'response_status']
+    search_fields = ['key']
+    readonly_fields = ['created_at']
+
+
+@admin.register(Sequence)
+class SequenceAdmin(admin.ModelAdmin):
+    list_display = ['name', 'last_value']
+    search_fields = ['name']
+
+
+@admin.register(CatalogTombstone)
+class CatalogTombstoneAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'object_id', 'catalog_version', 'deleted_at']
+    list_filter = ['kind']
+    readonly_fields = ['deleted_at']
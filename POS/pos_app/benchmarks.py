@@ -0,0 +1,834 @@
+"""Benchmark scenarios for the hot API paths.
+
+Every scenario runs inside a transaction that is rolled back afterwards, so
+the benchmarks can be pointed at any database without leaving rows behind.
+Run them with ``python manage.py run_benchmarks``; ``seed_benchmark_data`` fills a
+scratch database with the same synthetic history for manual profiling.
+"""
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import Case, DateTimeField, Sum, Value, When
+from django.utils import timezone
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIClient
+
+from .middleware import QueryRecorder
+from .models import (
+    Category, Customer, Expense, Loss, Notification, Payment, Product, Receipt, Reseller, Sequence, StockMovement, Transaction,
+    TransactionItem, SALE_STATUSES
+)
+from .pagination import TimestampCursorPagination
+from .services import (
+    CatalogService, DashboardService, InventoryService, ProductLookupService, ReportEngine, ReportGenerator, RollupService,
+    SalePostingService
+)
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Register a benchmark scenario under the given name"""
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def measure(func, *args, **kwargs):
+    """Call func and return (result, query_count, elapsed_ms)"""
+    # Counted by an execute wrapper: the connection's query log is capped, and full after a large seed
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    return result, recorder.count, round(elapsed_ms, 2)
+
+
+def api_client():
+    """Return an APIClient authenticated as a throwaway superuser"""
+    user = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def run(names=None, params=None):
+    """Run the selected scenarios (all by default) and return their results.
+
+    params maps a scenario name to keyword arguments for it.
+    """
+    params = params or {}
+    results = {}
+    for name in names or SCENARIOS:
+        with transaction.atomic():
+            results[name] = SCENARIOS[name](**params.get(name, {}))
+            transaction.set_rollback(True)
+    return results
+
+
+def seed_catalog(products=2_000, categories=20, customers=5_000, resellers=50, opening_stock=100_000, rng=None):
+    """Bulk-insert a store's master data and return it as a dict of lists.
+
+    Every product gets an opening receipt in the stock ledger, so the
+    ledger agrees with stock_quantity. Codes carry a per-run tag, so the
+    catalog can be seeded more than once into the same database.
+    """
+    rng = rng or random.Random(0)
+    tag = timezone.now().strftime('%Y%m%d%H%M%S%f')
+    category_rows = Category.objects.bulk_create([
+        Category(name=f'Category {i} ({tag})') for i in range(categories)
+    ])
+    product_rows = []
+    for start in range(0, products, 5000):
+        product_rows += Product.objects.bulk_create([
+            Product(
+                name=f'Product {i}',
+                product_unique_code=f'SEED-{tag}-{i:07d}',
+                barcode=f'{tag[-6:]}{i:07d}',
+                category=category_rows[i % categories],
+                cost_price_avg=cost,
+                default_sale_price=cost * Decimal('1.4'),
+                stock_quantity=opening_stock,
+                low_stock_threshold=5,
+            )
+            for i in range(start, min(start + 5000, products))
+            for cost in [Decimal(rng.randint(200, 50_000)) / 100]
+        ])
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                movement_type='RECEIPT', product=product, quantity=opening_stock, unit_cost=product.cost_price_avg,
+                reference_doc_type='OPENING', reason='OPENING', notes='Opening balance'
+            )
+            for product in product_rows[start:]
+        ])
+    customer_rows = []
+    for start in range(0, customers, 5000):
+        customer_rows += Customer.objects.bulk_create([
+            Customer(name=f'Customer {i}', account_code=f'SEED-{tag}-{i:07d}', phone_no=f'07{i:08d}')
+            for i in range(start, min(start + 5000, customers))
+        ])
+    reseller_rows = Reseller.objects.bulk_create([
+        Reseller(name=f'Reseller {i}', account_code=f'SEED-{tag}-{i:05d}', commission_rate_pct=Decimal('10.00'))
+        for i in range(resellers)
+    ])
+    return {'categories': category_rows, 'products': product_rows, 'customers': customer_rows, 'resellers': reseller_rows}
+
+
+def seed_sales(catalog, count, items_per_sale=3, days=365, user=None, rng=None):
+    """Bulk-insert count multi-item sales spread over the last days days.
+
+    Each sale is posted the way checkout posts it: items, stock movements
+    and a numbered receipt, with some sales on credit or through resellers.
+    Payments and notifications are added at realistic rates. Stock levels
+    and daily summaries are brought in line at the end. Returns the rows
+    added per table.
+    """
+    rng = rng or random.Random(1)
+    products, customers, resellers = catalog['products'], catalog['customers'], catalog['resellers']
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    sold = Counter()
+    added = Counter()
+
+    for day_index in range(days):
+        day = start + timedelta(days=day_index)
+        day_count = count // days + (1 if day_index < count % days else 0)
+        if not day_count:
+            continue
+        opening = timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=8))
+        # Trading hours 08:00-18:00, in order so primary keys follow time
+        moments = sorted(opening + timedelta(seconds=rng.randrange(10 * 3600)) for _ in range(day_count))
+
+        baskets = []
+        for moment in moments:
+            lines = [
+                (product, rng.randint(1, 3))
+                for product in rng.sample(products, min(len(products), rng.randint(1, 2 * items_per_sale - 1)))
+            ]
+            status = rng.choices(SALE_STATUSES, weights=[90, 5, 5])[0]
+            reseller = rng.choice(resellers) if resellers and rng.random() < 0.1 else None
+            sale = Transaction(
+                product=lines[0][0],
+                quantity=sum(quantity for _, quantity in lines),
+                status=status,
+                customer=rng.choice(customers) if customers and (status != 'SOLD' or rng.random() < 0.3) else None,
+                reseller=reseller,
+                dealership_price=lines[0][0].cost_price_avg if reseller else 0,
+                sale_price=lines[0][0].default_sale_price,
+                total_amount=sum(product.default_sale_price * quantity for product, quantity in lines),
+                payment_method=rng.choices(['CASH', 'CARD', 'ECOCASH'], weights=[60, 25, 15])[0],
+            )
+            baskets.append((sale, lines, moment))
+        sales = Transaction.objects.bulk_create([sale for sale, _, _ in baskets])
+
+        items, movements, line_moments = [], [], []
+        for sale, lines, moment in baskets:
+            for product, quantity in lines:
+                items.append(TransactionItem(
+                    transaction=sale, product=product, quantity=quantity,
+                    unit_price=product.default_sale_price, total_price=product.default_sale_price * quantity
+                ))
+                movements.append(SalePostingService.sale_movement(sale, product, quantity, user))
+                line_moments.append(moment)
+                sold[product.id] += quantity
+        TransactionItem.objects.bulk_create(items)
+        StockMovement.objects.bulk_create(movements)
+
+        prefix = f"RCP-{day:%Y%m%d}"
+        first = Sequence.objects.allocate(prefix, len(sales))
+        receipts = Receipt.objects.bulk_create([
+            Receipt(
+                receipt_number=f'{prefix}-{number:04d}', transaction=sale, customer=sale.customer,
+                total_amount=sale.total_amount, payment_method=sale.payment_method, printed_by=user
+            )
+            for number, sale in enumerate(sales, first)
+        ])
+        paid = [(sale, moment) for sale, _, moment in baskets if sale.customer and rng.random() < 0.2]
+        payments = Payment.objects.bulk_create([
+            Payment(customer=sale.customer, amount=sale.total_amount, payment_method=sale.payment_method, recorded_by=user)
+            for sale, _ in paid
+        ])
+        noticed = [(sale, moment) for sale, _, moment in baskets if rng.random() < 0.02]
+        notifications = Notification.objects.bulk_create([
+            Notification(message=f'Sale {sale.id} recorded', notification_type='GENERAL', is_read=day < end)
+            for sale, _ in noticed
+        ])
+
+        # auto_now_add stamped every row with the current time; move them back to when they happened
+        sale_moments = [moment for _, _, moment in baskets]
+        backdate(Transaction, 'timestamp', sales, sale_moments)
+        backdate(StockMovement, 'timestamp', movements, line_moments)
+        backdate(Receipt, 'printed_at', receipts, sale_moments)
+        backdate(Payment, 'date', payments, [moment for _, moment in paid])
+        backdate(Notification, 'timestamp', notifications, [moment for _, moment in noticed])
+        for model, rows in [
+            (Transaction, sales), (TransactionItem, items), (StockMovement, movements),
+            (Receipt, receipts), (Payment, payments), (Notification, notifications),
+        ]:
+            added[model._meta.model_name] += len(rows)
+
+    sold = list(sold.items())
+    for offset in range(0, len(sold), 500):
+        InventoryService.apply_deltas({product_id: -quantity for product_id, quantity in sold[offset:offset + 500]})
+    RollupService.rebuild(start, end)
+    return dict(added)
+
+
+def backdate(model, field, rows, moments, hours_per_update=10):
+    """Set field on freshly inserted rows (in primary key order) to their moments, to the hour.
+
+    One UPDATE covers a run of hours with a CASE on primary key
+    boundaries, instead of one UPDATE per row.
+    """
+    boundaries = []
+    for row, moment in zip(rows, moments):
+        moment = moment.replace(minute=0, second=0, microsecond=0)
+        if boundaries and boundaries[-1][1] == moment:
+            boundaries[-1][0] = row.pk
+        else:
+            boundaries.append([row.pk, moment])
+    first_pk = rows[0].pk if rows else None
+    for offset in range(0, len(boundaries), hours_per_update):
+        chunk = boundaries[offset:offset + hours_per_update]
+        model.objects.filter(pk__gte=first_pk, pk__lte=chunk[-1][0]).update(**{field: Case(
+            *[When(pk__lte=last_pk, then=Value(moment)) for last_pk, moment in chunk],
+            output_field=DateTimeField()
+        )})
+        first_pk = chunk[-1][0] + 1
+
+
+@scenario('checkout')
+def checkout_scenario(line_counts=(1, 10, 50, 200)):
+    """Time POST /api/transactions/ for growing basket sizes"""
+    client = api_client()
+    category = Category.objects.create(name='Benchmark')
+    products = Product.objects.bulk_create([
+        Product(
+            name=f'Benchmark Product {i}',
+            product_unique_code=f'BENCH-{i:05d}',
+            category=category,
+            default_sale_price=Decimal('10.00'),
+            stock_quantity=100000
+        )
+        for i in range(max(line_counts))
+    ])
+
+    rows = []
+    for line_count in line_counts:
+        payload = {
+            'status': 'SOLD',
+            'payment_method': 'CASH',
+            'items': [{'product': p.id, 'quantity': 1, 'unit_price': '10.00'} for p in products[:line_count]],
+        }
+        response, queries, elapsed_ms = measure(client.post, '/api/transactions/', payload, format='json')
+        rows.append({
+            'lines': line_count,
+            'status': response.status_code,
+            'queries': queries,
+            'ms': elapsed_ms,
+        })
+    return rows
+
+
+@scenario('batch_ingest')
+def batch_ingest_scenario(sale_count=1000, lines_per_sale=3):
+    """Time POST /api/transactions/batch/ with a backlog of offline sales"""
+    client = api_client()
+    category = Category.objects.create(name='Benchmark')
+    products = Product.objects.bulk_create([
+        Product(
+            name=f'Benchmark Product {i}',
+            product_unique_code=f'BENCH-{i:05d}',
+            category=category,
+            default_sale_price=Decimal('10.00'),
+            stock_quantity=100000
+        )
+        for i in range(50)
+    ])
+
+    sales = [
+        {
+            'status': 'SOLD',
+            'payment_method': 'CASH',
+            'items': [
+                {'product': products[(i + line) % len(products)].id, 'quantity': 1}
+                for line in range(lines_per_sale)
+            ],
+        }
+        for i in range(sale_count)
+    ]
+    response, queries, elapsed_ms = measure(client.post, '/api/transactions/batch/', sales, format='json')
+    return {
+        'sales': sale_count,
+        'lines_per_sale': lines_per_sale,
+        'status': response.status_code,
+        'created': response.data.get('created'),
+        'queries': queries,
+        'ms': elapsed_ms,
+        'sales_per_second': round(sale_count / (elapsed_ms / 1000), 1),
+    }
+
+
+@scenario('pagination')
+def pagination_scenario(row_count=1_000_000, deep_page=5000):
+    """Compare page 1 against a deep page of GET /api/notifications/, keyset versus OFFSET"""
+    client = api_client()
+    for start in range(0, row_count, 10000):
+        Notification.objects.bulk_create([
+            Notification(message=f'Benchmark notice {i}', notification_type='GENERAL')
+            for i in range(start, min(start + 10000, row_count))
+        ])
+
+    paginator = TimestampCursorPagination()
+    paginator.base_url = '/api/notifications/'
+    ordered = Notification.objects.order_by(*paginator.ordering)
+    offset = (deep_page - 1) * paginator.page_size
+
+    # A client reaches the deep page by following next links; build that cursor directly
+    before_page = ordered[offset - 1]
+    deep_url = paginator.encode_cursor(Cursor(
+        offset=0, reverse=False, position=paginator._get_position_from_instance(before_page, paginator.ordering)
+    ))
+
+    client.get(paginator.base_url)  # warm up URL resolution and auth
+    rows = []
+    for label, url in [('page_1', paginator.base_url), (f'page_{deep_page}', deep_url)]:
+        response, queries, elapsed_ms = measure(client.get, url)
+        rows.append({'pagination': 'cursor', 'page': label, 'status': response.status_code, 'queries': queries, 'ms': elapsed_ms})
+
+    # What PageNumberPagination did for the same pages: COUNT(*) plus an OFFSET scan
+    for label, page_offset in [('page_1', 0), (f'page_{deep_page}', offset)]:
+        _, queries, elapsed_ms = measure(lambda: (ordered.count(), list(ordered[page_offset:page_offset + paginator.page_size])))
+        rows.append({'pagination': 'offset', 'page': label, 'queries': queries, 'ms': elapsed_ms})
+
+    return {'rows': row_count, 'results': rows}
+
+
+@scenario('export')
+def export_scenario(row_counts=(10_000, 100_000)):
+    """Time to first byte, total time and peak memory of GET /api/exports/transactions/"""
+    client = api_client()
+    category = Category.objects.create(name='Benchmark')
+    product = Product.objects.create(name='Benchmark Product', product_unique_code='BENCH-EXPORT', category=category)
+
+    client.get('/api/exports/transactions/')  # warm up URL resolution and auth
+    rows, created = [], 0
+    for row_count in row_counts:
+        while created < row_count:
+            batch = min(10000, row_count - created)
+            Transaction.objects.bulk_create([
+                Transaction(status='SOLD', product=product, quantity=1, total_amount=Decimal('10.00'))
+                for _ in range(batch)
+            ])
+            created += batch
+
+        start = time.perf_counter()
+        stream = iter(client.get('/api/exports/transactions/').streaming_content)
+        next(stream)
+        first_byte_ms = (time.perf_counter() - start) * 1000
+        lines = 1 + sum(1 for _ in stream)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        # Trace allocations on a second pass so tracing does not skew the timings
+        tracemalloc.start()
+        for _ in client.get('/api/exports/transactions/').streaming_content:
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        rows.append({
+            'rows': row_count,
+            'lines': lines,
+            'first_byte_ms': round(first_byte_ms, 2),
+            'total_ms': round(total_ms, 2),
+            'peak_python_kb': peak // 1024,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        })
+    return rows
+
+
+@scenario('excel_report')
+def excel_report_scenario(sale_count=50_000, items_per_sale=2):
+    """Time and peak memory of ReportGenerator.generate_excel_report over a year of sales"""
+    category = Category.objects.create(name='Benchmark')
+    products = Product.objects.bulk_create([
+        Product(name=f'Benchmark Product {i}', product_unique_code=f'BENCH-{i:05d}', category=category)
+        for i in range(items_per_sale)
+    ])
+    for start in range(0, sale_count, 5000):
+        sales = Transaction.objects.bulk_create([
+            Transaction(status='SOLD', total_amount=Decimal('20.00')) for _ in range(min(5000, sale_count - start))
+        ])
+        TransactionItem.objects.bulk_create([
+            TransactionItem(transaction=sale, product=product, quantity=1, unit_price=Decimal('10.00'))
+            for sale in sales
+            for product in products
+        ])
+
+    content, queries, elapsed_ms = measure(ReportGenerator.generate_excel_report)
+
+    tracemalloc.start()
+    ReportGenerator.generate_excel_report()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'sales': sale_count,
+        'items': sale_count * items_per_sale,
+        'bytes': len(content),
+        'queries': queries,
+        'ms': elapsed_ms,
+        'peak_python_kb': peak // 1024,
+    }
+
+
+def legacy_profit_loss(start, end):
+    """The pre-rollup P&L computation, kept here as the benchmark baseline"""
+    transactions = Transaction.objects.filter(
+        timestamp__date__range=[start, end],
+        status__in=SALE_STATUSES
+    )
+    return {
+        'total_sales': transactions.aggregate(Sum('total_amount'))['total_amount__sum'] or 0,
+        'total_tax_collected': transactions.aggregate(Sum('tax_amount'))['tax_amount__sum'] or 0,
+        'cost_of_goods_sold': sum(t.dealership_price * t.quantity for t in transactions),
+        'total_expenses': Expense.objects.filter(date__date__range=[start, end]).aggregate(Sum('amount'))['amount__sum'] or 0,
+        'total_losses': Loss.objects.filter(date__date__range=[start, end]).aggregate(Sum('total_loss_amount'))['total_loss_amount__sum'] or 0,
+    }
+
+
+@scenario('profit_loss')
+def profit_loss_scenario(sale_count=100_000, days=365):
+    """Year-range P&L generation: row-by-row baseline versus DailySummary rollups"""
+    category = Category.objects.create(name='Benchmark')
+    product = Product.objects.create(
+        name='Benchmark Product', product_unique_code='BENCH-PL', category=category, cost_price_avg=Decimal('6.00')
+    )
+    today = timezone.localdate()
+    per_day = sale_count // days
+    for day in range(days):
+        sales = Transaction.objects.bulk_create([
+            Transaction(status='SOLD', total_amount=Decimal('20.00'), quantity=2) for _ in range(per_day)
+        ])
+        TransactionItem.objects.bulk_create([
+            TransactionItem(transaction=sale, product=product, quantity=2, unit_price=Decimal('10.00')) for sale in sales
+        ])
+        Transaction.objects.filter(pk__in=[sale.pk for sale in sales]).update(
+            timestamp=timezone.now() - timedelta(days=day)
+        )
+    start = today - timedelta(days=days - 1)
+    _, rebuild_queries, rebuild_ms = measure(RollupService.rebuild, start, today)
+
+    _, legacy_queries, legacy_ms = measure(legacy_profit_loss, start, today)
+    totals, queries, elapsed_ms = measure(ReportEngine.profit_loss, start, today)
+    return {
+        'sales': per_day * days,
+        'days': days,
+        'legacy': {'queries': legacy_queries, 'ms': legacy_ms},
+        'rollup': {'queries': queries, 'ms': elapsed_ms},
+        'one_time_rebuild': {'queries': rebuild_queries, 'ms': rebuild_ms},
+        'total_sales': str(totals['total_sales']),
+    }
+
+
+def legacy_reseller_balances():
+    """The pre-annotation reseller balances: one Python loop over each reseller's transactions"""
+    balances = {}
+    for reseller in Reseller.objects.all():
+        total_balance = Decimal('0')
+        for sale in Transaction.objects.filter(reseller=reseller):
+            if sale.total_amount:
+                if sale.dealership_price and sale.dealership_price > 0:
+                    system_sale_price = sale.dealership_price * sale.quantity
+                else:
+                    system_sale_price = sale.total_amount * Decimal('0.75')
+                total_balance += sale.total_amount - system_sale_price
+        balances[reseller.pk] = total_balance
+    return balances
+
+
+@scenario('reseller_balances')
+def reseller_balances_scenario(reseller_count=500, transaction_count=100_000):
+    """Reseller balances for every reseller: per-row Python loop versus Reseller.objects.with_balances()"""
+    client = api_client()
+    resellers = Reseller.objects.bulk_create([
+        Reseller(name=f'Benchmark Reseller {i}', account_code=f'BENCH-RESL-{i:05d}') for i in range(reseller_count)
+    ])
+    for start in range(0, transaction_count, 5000):
+        Transaction.objects.bulk_create([
+            Transaction(
+                reseller=resellers[i % reseller_count],
+                status='SOLD',
+                quantity=1,
+                dealership_price=Decimal('75.00') if i % 2 else Decimal('0'),
+                total_amount=Decimal('100.00')
+            )
+            for i in range(start, min(start + 5000, transaction_count))
+        ])
+
+    legacy, legacy_queries, legacy_ms = measure(legacy_reseller_balances)
+    annotated, queries, elapsed_ms = measure(
+        lambda: {reseller.pk: reseller.computed_balance for reseller in Reseller.objects.with_balances()}
+    )
+    _, api_queries, api_ms = measure(client.get, '/api/resellers/')
+    return {
+        'resellers': reseller_count,
+        'transactions': transaction_count,
+        'legacy': {'queries': legacy_queries, 'ms': legacy_ms},
+        'annotated': {'queries': queries, 'ms': elapsed_ms},
+        'api_list': {'queries': api_queries, 'ms': api_ms},
+        'balances_match': legacy == annotated,
+    }
+
+
+def latency_summary(samples_ms):
+    """p50/p95/max of a list of latencies in milliseconds"""
+    # Inclusive: the default exclusive method extrapolates past the largest sample on small runs
+    cuts = statistics.quantiles(samples_ms, n=20, method='inclusive')
+    return {'p50_ms': round(cuts[9], 3), 'p95_ms': round(cuts[18], 3), 'max_ms': round(max(samples_ms), 3)}
+
+
+@scenario('scan')
+def scan_scenario(product_count=20_000, hot_codes=500, tills=(1, 4, 8), scans_per_till=200):
+    """Scan-to-price latency: icontains list search versus GET /api/products/scan/, cold and under concurrent tills"""
+    client = api_client()
+    category = Category.objects.create(name='Benchmark')
+    for start in range(0, product_count, 5000):
+        Product.objects.bulk_create([
+            Product(
+                name=f'Benchmark Product {i}',
+                product_unique_code=f'BENCH-{i:06d}',
+                barcode=f'600{i:010d}',
+                category=category,
+                default_sale_price=Decimal('10.00')
+            )
+            for i in range(start, min(start + 5000, product_count))
+        ])
+    codes = [f'600{i:010d}' for i in range(0, product_count, product_count // hot_codes)][:hot_codes]
+    client.get('/api/products/scan/', {'code': codes[0]})  # warm up URL resolution and auth
+
+    def timed(path, params):
+        start = time.perf_counter()
+        response = client.get(path, params)
+        assert response.status_code == 200, response.status_code
+        return (time.perf_counter() - start) * 1000
+
+    # What a till did before: a paginated icontains search across name, code and barcode
+    legacy = [timed('/api/products/', {'search': code}) for code in codes[:50]]
+    cold = []
+    for code in codes[:200]:
+        ProductLookupService.clear()
+        cold.append(timed('/api/products/scan/', {'code': code}))
+    ProductLookupService.resolve(codes)
+
+    # Warm lookups only read stock by primary key. The benchmark rows are uncommitted, so the
+    # till threads share this connection to see them
+    user = User.objects.get(username='benchmark')
+    shared = connections['default']
+    shared.inc_thread_sharing()
+    concurrent = []
+    for till_count in tills:
+        samples = []
+
+        def till(offset):
+            connections['default'] = shared
+            till_client = APIClient()
+            till_client.force_authenticate(user)
+            for i in range(scans_per_till):
+                start = time.perf_counter()
+                response = till_client.get('/api/products/scan/', {'code': codes[(offset + i) % len(codes)]})
+                samples.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.status_code
+        threads = [threading.Thread(target=till, args=(n * 37,)) for n in range(till_count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        concurrent.append({'tills': till_count, 'scans_per_s': round(len(samples) / elapsed), **latency_summary(samples)})
+    shared.dec_thread_sharing()
+
+    return {
+        'products': product_count,
+        'legacy_search': latency_summary(legacy),
+        'scan_cold': latency_summary(cold),
+        'scan_warm': concurrent,
+    }
+
+
+@scenario('catalog_sync')
+def catalog_sync_scenario(product_count=20_000, changed=25):
+    """Till startup: paging GET /api/products/ versus one catalog snapshot, then a delta after a few price changes"""
+    client = api_client()
+    category = Category.objects.create(name='Benchmark')
+    version = CatalogService.next_version()
+    for start in range(0, product_count, 5000):
+        Product.objects.bulk_create([
+            Product(
+                name=f'Benchmark Product {i}',
+                product_unique_code=f'BENCH-{i:06d}',
+                barcode=f'600{i:010d}',
+                category=category,
+                default_sale_price=Decimal('10.00'),
+                stock_quantity=100,
+                catalog_version=version
+            )
+            for i in range(start, min(start + 5000, product_count))
+        ])
+
+    def page_through():
+        requests, size, url = 0, 0, '/api/products/'
+        while url:
+            response = client.get(url)
+            requests += 1
+            size += len(response.content)
+            url = response.data['next']
+        return requests, size
+
+    (legacy_requests, legacy_bytes), legacy_queries, legacy_ms = measure(page_through)
+    snapshot, snapshot_queries, snapshot_ms = measure(client.get, '/api/catalog/', HTTP_ACCEPT_ENCODING='gzip')
+    since = int(snapshot['ETag'].strip('"').split('-')[1])
+
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:changed])
+    Product.objects.filter(pk__in=product_ids).update(
+        default_sale_price=Decimal('11.00'), catalog_version=CatalogService.next_version()
+    )
+    delta, delta_queries, delta_ms = measure(client.get, '/api/catalog/', {'since': since}, HTTP_ACCEPT_ENCODING='gzip')
+
+    return {
+        'products': product_count,
+        'paged_list': {'requests': legacy_requests, 'bytes': legacy_bytes, 'queries': legacy_queries, 'ms': legacy_ms},
+        'snapshot': {'requests': 1, 'gzip_bytes': len(snapshot.content), 'queries': snapshot_queries, 'ms': snapshot_ms},
+        'delta': {'changed': changed, 'gzip_bytes': len(delta.content), 'queries': delta_queries, 'ms': delta_ms},
+    }
+
+
+@scenario('hot_endpoints')
+def hot_endpoints_scenario(sales_counts=(10_000, 100_000, 1_000_000), samples=20):
+    """Checkout, transaction list, dashboard, reports, P&L and receipt PDF against a growing sales history"""
+    client = api_client()
+    user = User.objects.get(username='benchmark')
+    catalog = seed_catalog()
+    products = catalog['products']
+    today = timezone.localdate()
+    rng = random.Random(2)
+
+    def timed(request):
+        """Query count of the first call and latency over samples calls"""
+        latencies, queries = [], None
+        for _ in range(samples):
+            response, query_count, elapsed_ms = measure(request)
+            assert response.status_code in (200, 201), response.status_code
+            queries = query_count if queries is None else queries
+            latencies.append(elapsed_ms)
+        return {'queries': queries, **latency_summary(latencies)}
+
+    def checkout():
+        return client.post('/api/transactions/', {
+            'status': 'SOLD',
+            'payment_method': 'CASH',
+            'items': [{'product': product.id, 'quantity': 1} for product in rng.sample(products, 3)],
+        }, format='json')
+
+    def dashboard_cold():
+        cache.delete(DashboardService.CACHE_KEY)
+        return client.get('/api/dashboard/')
+
+    def profit_loss():
+        return client.post('/api/profit-loss-reports/generate/', {
+            'start_date': str(today - timedelta(days=364)), 'end_date': str(today),
+        }, format='json')
+
+    rows, seeded = [], 0
+    for sales_count in sales_counts:
+        start = time.perf_counter()
+        added = seed_sales(catalog, sales_count - seeded, user=user)
+        seeded = sales_count
+        seed_s = round(time.perf_counter() - start, 1)
+        receipt = Receipt.objects.order_by('-id').first()
+
+        rows.append({
+            'sales': sales_count,
+            'seeded': added,
+            'seed_s': seed_s,
+            'checkout': timed(checkout),
+            'transaction_list': timed(lambda: client.get('/api/transactions/')),
+            'dashboard_cold': timed(dashboard_cold),
+            'dashboard_warm': timed(lambda: client.get('/api/dashboard/')),
+            'reports': timed(lambda: client.get('/api/reports/', {'type': 'all'})),
+            'profit_loss': timed(profit_loss),
+            'receipt_pdf': timed(lambda: client.get(f'/api/receipts/{receipt.id}/download_pdf/')),
+        })
+    return rows
+
+
+def contention_worker(settings_dict, user_id, basket, sale_count, barrier, results):
+    """Post sale_count checkouts from a forked process against the database in settings_dict"""
+    # The parent's connection came across the fork mid-transaction: keep it referenced so it is
+    # never closed (and rolled back) from here, and give this process its own
+    inherited = connections['default']
+    connections.settings['default'] = settings_dict
+    connections['default'] = connections.create_connection('default')
+    # Locked-database tracebacks and request logs from every worker would bury the report
+    sys.stdout = open(os.devnull, 'w')
+    logging.disable(logging.CRITICAL)
+
+    client = APIClient()
+    client.force_authenticate(User.objects.get(pk=user_id))
+    payload = {'status': 'SOLD', 'payment_method': 'CASH', 'items': [{'product': pk, 'quantity': 1} for pk in basket]}
+    latencies, errors = [], []
+    barrier.wait()
+    for _ in range(sale_count):
+        start = time.perf_counter()
+        try:
+            response = client.post('/api/transactions/', payload, format='json')
+            if response.status_code != 201:
+                errors.append(f'HTTP {response.status_code}')
+        except Exception as e:
+            errors.append(f'{type(e).__name__}: {e}')
+        latencies.append((time.perf_counter() - start) * 1000)
+        # What the request_finished signal does after every real request
+        close_old_connections()
+    results.put((latencies, errors))
+    assert inherited
+
+
+@scenario('write_contention')
+def write_contention_scenario(workers=(1, 4, 8), sales_per_worker=100):
+    """Checkouts from several processes at once on one SQLite file: Django's defaults versus the configured profile"""
+    if connection.vendor != 'sqlite':
+        return {'skipped': 'SQLite only'}
+    configured = dict(connection.settings_dict)
+    profiles = {
+        'django_defaults': {**configured, 'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+        'configured': configured,
+    }
+    context = multiprocessing.get_context('fork')
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        # A copy of the current database, back in the default rollback journal, is the template
+        # every run starts from
+        template = os.path.join(directory, 'template.sqlite3')
+        # (read through a connection of its own: this one is inside run()'s transaction)
+        source, target = sqlite3.connect(connection.settings_dict['NAME']), sqlite3.connect(template)
+        source.backup(target)
+        target.execute('PRAGMA journal_mode=DELETE')
+        source.close()
+        target.close()
+        connections.settings['contention'] = {**profiles['django_defaults'], 'NAME': template}
+        try:
+            user = User.objects.db_manager('contention').create_superuser(
+                f'contention-{uuid.uuid4().hex[:8]}', 'benchmark@example.com', 'benchmark'
+            )
+            basket = [
+                product.pk for product in Product.objects.using('contention').bulk_create([
+                    Product(name=f'Benchmark Product {i}', product_unique_code=f'CONTENTION-{uuid.uuid4().hex[:8]}',
+                            default_sale_price=Decimal('10.00'), stock_quantity=1_000_000)
+                    for i in range(3)
+                ])
+            ]
+        finally:
+            connections['contention'].close()
+            del connections['contention']
+            del connections.settings['contention']
+
+        for profile, settings_dict in profiles.items():
+            for worker_count in workers:
+                path = os.path.join(directory, f'{profile}-{worker_count}.sqlite3')
+                shutil.copy(template, path)
+                if profile == 'configured':
+                    # What migration 0058 does to the real file
+                    wal = sqlite3.connect(path)
+                    wal.execute('PRAGMA journal_mode=WAL')
+                    wal.close()
+                barrier = context.Barrier(worker_count + 1)
+                results = context.Queue()
+                processes = [
+                    context.Process(target=contention_worker, args=(
+                        {**settings_dict, 'NAME': path}, user.pk, basket, sales_per_worker, barrier, results
+                    ))
+                    for _ in range(worker_count)
+                ]
+                for process in processes:
+                    process.start()
+                barrier.wait()
+                start = time.perf_counter()
+                outcomes = [results.get() for _ in processes]
+                elapsed = time.perf_counter() - start
+                for process in processes:
+                    process.join()
+
+                latencies = [ms for samples, _ in outcomes for ms in samples]
+                errors = [error for _, worker_errors in outcomes for error in worker_errors]
+                rows.append({
+                    'profile': profile,
+                    'workers': worker_count,
+                    'sales': len(latencies) - len(errors),
+                    'failed': len(errors),
+                    'sales_per_s': round((len(latencies) - len(errors)) / elapsed, 1),
+                    **latency_summary(latencies),
+                    'errors': sorted(set(errors))[:3],
+                })
+    return rows
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from pos_app.services import InventoryService
+
+
+class Command(BaseCommand):
+    help = 'Report products whose stock quantity disagrees with the stock movement ledger'
+
+    def handle(self, *args, **options):
+        drifted = list(InventoryService.check_drift())
+        
+        for product in drifted:
+            self.stdout.write(
+                f'- {product.name}: {product.stock_quantity} on hand, ledger says {product.ledger_quantity} (drift {product.drift:+d})'
+            )
+        
+        if drifted:
+            self.stdout.write(self.style.WARNING(f'{len(drifted)} products have drifted; run rebuild_stock to correct them'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Stock matches the ledger'))
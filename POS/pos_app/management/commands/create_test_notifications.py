@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from pos_app.models import *
 from django.contrib.auth.models import User
 from datetime import datetime
+from django.utils import timezone
 
 
 class Command(BaseCommand):
@@ -25,7 +26,9 @@ class Command(BaseCommand):
             Notification.objects.create(
                 message=f'Test low stock alert: {product.name} has only 2 units remaining',
                 notification_type='LOW_STOCK',
-                related_product=product
+                related_product=product,
+                # Display-only sample; it must not take the product's single open-alert slot
+                resolved_at=timezone.now()
             )
             self.stdout.write('Created LOW_STOCK notification')
         
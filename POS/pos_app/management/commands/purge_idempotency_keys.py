@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from pos_app.tasks import purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys (schedule alongside send_scheduled_reports)'
+    
+    def handle(self, *args, **options):
+        deleted = purge_expired_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} expired idempotency keys'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from pos_app.services import NotificationService
+from pos_app.tasks import purge_expired_notifications
+
+
+class Command(BaseCommand):
+    help = 'Delete notifications past their retention period (schedule alongside purge_idempotency_keys)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-archive', action='store_true', help='Delete without adding to the per-day NotificationArchive counts')
+        parser.add_argument('--batch-size', type=int, default=NotificationService.PURGE_BATCH, help='Rows deleted per statement')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many notifications would be deleted')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = NotificationService.expired().count()
+            self.stdout.write(f'{count} notifications are past their retention period')
+            return
+
+        archive = False if options['no_archive'] else None
+        deleted = purge_expired_notifications(archive=archive, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} notifications'))
@@ -0,0 +1,35 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from pos_app.models import Customer, Expense, Loss, Payment, Transaction
+from pos_app.services import RollupService
+
+
+class Command(BaseCommand):
+    help = 'Recompute DailySummary rollups from the underlying sales, payments, expenses and losses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day to rebuild (default: earliest record)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day to rebuild (default: today)')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start'] or self.earliest_day() or end
+        if start > end:
+            raise CommandError('--start must not be after --end')
+
+        days = RollupService.rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {days} daily summaries from {start} to {end}'))
+
+    @staticmethod
+    def earliest_day():
+        firsts = [
+            Transaction.objects.aggregate(first=Min('timestamp'))['first'],
+            Payment.objects.aggregate(first=Min('date'))['first'],
+            Expense.objects.aggregate(first=Min('date'))['first'],
+            Loss.objects.aggregate(first=Min('date'))['first'],
+            Customer.objects.aggregate(first=Min('date_created'))['first'],
+        ]
+        firsts = [timezone.localdate(first) for first in firsts if first]
+        return min(firsts) if firsts else None
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from pos_app.services import InventoryService
+
+
+class Command(BaseCommand):
+    help = 'Recompute every product stock quantity from the stock movement ledger'
+
+    def handle(self, *args, **options):
+        corrected = InventoryService.rebuild_stock()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stock from the ledger; corrected {corrected} products'))
@@ -0,0 +1,80 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from pos_app.benchmarks import SCENARIOS, run
+
+
+class Command(BaseCommand):
+    help = 'Run benchmark scenarios for hot API paths (all writes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f'Scenarios to run (default: all). Available: {", ".join(SCENARIOS)}')
+        parser.add_argument(
+            '--sales', type=lambda value: tuple(int(count) for count in value.split(',')),
+            help='Comma-separated sales history sizes for hot_endpoints (default: 10000,100000,1000000)'
+        )
+        parser.add_argument('--output', help='Also write the results, with the git commit and database, to this JSON file')
+        parser.add_argument('--compare', help='A previous --output file; print how every timing changed against it')
+
+    def handle(self, *args, **options):
+        unknown = [name for name in options['scenarios'] if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)['results']
+
+        params = {}
+        if options['sales']:
+            params['hot_endpoints'] = {'sales_counts': options['sales']}
+        results = run(options['scenarios'], params)
+        self.stdout.write(json.dumps(results, indent=2, default=str))
+
+        if options['output']:
+            report = {
+                'commit': self.git_commit(),
+                'database': connection.vendor,
+                'ran_at': timezone.now().isoformat(),
+                'results': results,
+            }
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, default=str)
+        if baseline is not None:
+            self.compare(baseline, json.loads(json.dumps(results, default=str)))
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, baseline, results):
+        before, after = self.timings(baseline), self.timings(results)
+        for path in after:
+            if path not in before:
+                continue
+            old, new = before[path], after[path]
+            change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+            self.stdout.write(f'{path}: {old} -> {new} ms ({change})')
+
+    def timings(self, value, path=''):
+        """Flatten every *ms field of a result tree into {path: value}"""
+        found = {}
+        if isinstance(value, dict):
+            for key, child in value.items():
+                child_path = f'{path}.{key}' if path else key
+                if key.endswith('ms') and isinstance(child, (int, float)):
+                    found[child_path] = child
+                else:
+                    found.update(self.timings(child, child_path))
+        elif isinstance(value, list):
+            for index, child in enumerate(value):
+                found.update(self.timings(child, f'{path}[{index}]'))
+        return found
@@ -0,0 +1,37 @@
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from pos_app.benchmarks import seed_catalog, seed_sales
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a synthetic store history for benchmarking (rows are kept; use a scratch database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=10_000, help='Sales to generate')
+        parser.add_argument('--items-per-sale', type=int, default=3, help='Average lines per sale')
+        parser.add_argument('--days', type=int, default=365, help='Days of history the sales are spread over')
+        parser.add_argument('--products', type=int, default=2_000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--customers', type=int, default=5_000)
+        parser.add_argument('--resellers', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for repeatable data')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user = User.objects.filter(is_superuser=True).order_by('id').first()
+
+        with transaction.atomic():
+            catalog = seed_catalog(
+                products=options['products'], categories=options['categories'],
+                customers=options['customers'], resellers=options['resellers'], rng=rng
+            )
+            added = seed_sales(catalog, options['sales'], items_per_sale=options['items_per_sale'], days=options['days'], user=user, rng=rng)
+
+        counts = {name: len(rows) for name, rows in catalog.items()}
+        counts.update(added)
+        self.stdout.write(self.style.SUCCESS(
+            'Seeded ' + ', '.join(f'{count} {name}' for name, count in counts.items())
+        ))
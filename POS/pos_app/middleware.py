@@ -0,0 +1,127 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger('pos_app.requests')
+
+
+class QueryRecorder:
+    """Database execute wrapper that counts, times and fingerprints every query"""
+    # Collapses IN (%s, %s, ...) so lookups of different sizes share a fingerprint
+    IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[self.IN_LIST.sub('IN (...)', sql)] += 1
+
+    def duplicates(self, limit=5):
+        """The most repeated query shapes; a shape repeated per row is an N+1"""
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in self.fingerprints.most_common(limit) if count > 1
+        ]
+
+
+class RequestProfiler:
+    """Ring buffer of the slowest recent requests in this worker"""
+    SLOW_MS = 500
+    SLOW_QUERIES = 50
+    BUFFER_SIZE = 100
+
+    _requests = deque(maxlen=BUFFER_SIZE)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def is_slow(record):
+        return (
+            record['ms'] >= getattr(settings, 'REQUEST_PROFILING_SLOW_MS', RequestProfiler.SLOW_MS)
+            or record['queries'] >= getattr(settings, 'REQUEST_PROFILING_SLOW_QUERIES', RequestProfiler.SLOW_QUERIES)
+        )
+
+    @staticmethod
+    def add(record):
+        with RequestProfiler._lock:
+            RequestProfiler._requests.append(record)
+
+    @staticmethod
+    def slow_requests():
+        """Sampled requests, newest first"""
+        with RequestProfiler._lock:
+            return list(reversed(RequestProfiler._requests))
+
+    @staticmethod
+    def clear():
+        with RequestProfiler._lock:
+            RequestProfiler._requests.clear()
+
+
+class RequestProfilingMiddleware:
+    """Record query count, database time, duplicated queries and wall time per request.
+
+    The numbers go out as a JSON log line on the pos_app.requests logger and,
+    for staff or with DEBUG on, as a Server-Timing header. Slow requests are
+    kept in RequestProfiler for superusers to inspect. With REQUEST_PROFILING off Django drops the
+    middleware at startup, so it costs nothing. Streaming responses are
+    measured up to the point the view returns, not while the body is sent.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.seconds * 1000
+
+        duplicates = recorder.duplicates()
+        # Timings tell a client how the server works, so only staff see them outside DEBUG
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'is_staff', False):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={db_ms:.1f};desc="{recorder.count} queries"',
+                f'dup;desc="{sum(duplicate["count"] - 1 for duplicate in duplicates)} repeated"',
+                f'total;dur={elapsed_ms:.1f}',
+            ])
+
+        match = request.resolver_match
+        record = {
+            'at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'ms': round(elapsed_ms, 1),
+            'db_ms': round(db_ms, 1),
+            'queries': recorder.count,
+            'duplicates': duplicates,
+        }
+        slow = RequestProfiler.is_slow(record)
+        if slow:
+            RequestProfiler.add(record)
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps(record))
+        return response
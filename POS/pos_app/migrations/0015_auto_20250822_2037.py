@@ -4,6 +4,10 @@ def link_transactions_to_products(apps, schema_editor):
     Transaction = apps.get_model('pos_app', 'Transaction')
     Product = apps.get_model('pos_app', 'Product')
     
+    # Nothing to link on a fresh database
+    if not Transaction.objects.filter(product__isnull=True).exists():
+        return
+    
     # Get first product or create a default one
     first_product = Product.objects.first()
     if not first_product:
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:07
+
+import re
+
+from django.db import migrations, models
+
+CODE_FIELDS = [
+    ('Product', 'product_unique_code'),
+    ('Customer', 'account_code'),
+    ('Reseller', 'account_code'),
+    ('Invoice', 'invoice_number'),
+    ('Receipt', 'receipt_number'),
+]
+
+
+def seed_sequences(apps, schema_editor):
+    """Start every PREFIX-NUMBER sequence after the highest code already issued"""
+    Sequence = apps.get_model('pos_app', 'Sequence')
+    pattern = re.compile(r'^(?P<prefix>.+)-(?P<number>\d+)$')
+    
+    last_values = {}
+    for model_name, field in CODE_FIELDS:
+        model = apps.get_model('pos_app', model_name)
+        for code in model.objects.exclude(**{f'{field}__isnull': True}).values_list(field, flat=True).iterator():
+            match = pattern.match(code or '')
+            if match:
+                prefix, number = match.group('prefix'), int(match.group('number'))
+                last_values[prefix] = max(last_values.get(prefix, 0), number)
+    
+    Sequence.objects.bulk_create([Sequence(name=name, last_value=value) for name, value in last_values.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_app', '0048_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
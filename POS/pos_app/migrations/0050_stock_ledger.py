@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:15
+
+from django.db import migrations, models
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+IN_TYPES = ['RECEIPT', 'ADJUSTMENT_IN', 'RETURN_IN']
+OUT_TYPES = ['SALE', 'ADJUSTMENT_OUT', 'RETURN_OUT']
+
+
+def open_ledger(apps, schema_editor):
+    """Make the ledger reproduce current stock so it can become the source of truth"""
+    Product = apps.get_model('pos_app', 'Product')
+    StockMovement = apps.get_model('pos_app', 'StockMovement')
+
+    # Loss and stock take adjustments used to store signed quantities
+    StockMovement.objects.filter(quantity__lt=0).update(quantity=-F('quantity'))
+
+    ledger = dict(
+        StockMovement.objects.filter(product__isnull=False)
+        .order_by()
+        .values('product')
+        .annotate(on_hand=Sum(Case(
+            When(movement_type__in=IN_TYPES, then=F('quantity')),
+            When(movement_type__in=OUT_TYPES, then=-F('quantity')),
+            default=Value(0),
+            output_field=IntegerField()
+        )))
+        .values_list('product', 'on_hand')
+    )
+
+    openings = []
+    for product in Product.objects.only('id', 'stock_quantity', 'cost_price_avg'):
+        drift = product.stock_quantity - (ledger.get(product.id) or 0)
+        if drift:
+            openings.append(StockMovement(
+                movement_type='ADJUSTMENT_IN' if drift > 0 else 'ADJUSTMENT_OUT',
+                product_id=product.id,
+                quantity=abs(drift),
+                unit_cost=product.cost_price_avg,
+                reference_doc_type='OPENING',
+                reason='OPENING',
+                notes='Opening balance'
+            ))
+    StockMovement.objects.bulk_create(openings, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_app', '0049_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.CharField(choices=[('SALE', 'Sale'), ('PURCHASE', 'Purchase'), ('DAMAGE', 'Damage'), ('THEFT', 'Theft'), ('COUNT_DIFFERENCE', 'Count Difference'), ('RETURN', 'Return'), ('OPENING', 'Opening Balance'), ('OTHER', 'Other')], default='OTHER', max_length=20),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_app', '0050_stock_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['timestamp', 'id'], name='notification_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['date', 'id'], name='payment_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentcollection',
+            index=models.Index(fields=['created_at', 'id'], name='paymentcollection_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['timestamp', 'id'], name='stockmovement_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['timestamp', 'id'], name='transaction_cursor_idx'),
+        ),
+    ]
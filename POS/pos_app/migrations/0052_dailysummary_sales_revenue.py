@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_app', '0051_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailysummary',
+            name='sales_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_app', '0052_dailysummary_sales_revenue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['barcode'], name='product_barcode_idx'),
+        ),
+    ]
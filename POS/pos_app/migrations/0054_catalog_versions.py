@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_app', '0053_product_barcode_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('PRODUCT', 'Product'), ('CATEGORY', 'Category')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('catalog_version', models.BigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['catalog_version'],
+            },
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='catalog_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='catalog_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['catalog_version'], name='category_catalog_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['catalog_version'], name='product_catalog_version_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def resolve_duplicate_alerts(apps, schema_editor):
+    """Keep only each product's latest low stock alert open so the constraint can be added"""
+    Notification = apps.get_model('pos_app', 'Notification')
+    alerts = Notification.objects.filter(notification_type='LOW_STOCK', related_product__isnull=False)
+    latest = alerts.order_by().values('related_product').annotate(latest=Max('id')).values_list('latest', flat=True)
+    alerts.exclude(id__in=list(latest)).update(resolved_at=F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_app', '0054_catalog_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(resolve_duplicate_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('notification_type', 'LOW_STOCK'), ('resolved_at__isnull', True)), fields=('related_product',), name='one_open_low_stock_alert'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_app', '0055_low_stock_alerts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('notification_type', models.CharField(choices=[('STOCK_ALERT', 'Stock Alert'), ('PAYMENT_DUE', 'Payment Due'), ('LOW_STOCK', 'Low Stock'), ('GENERAL', 'General')], max_length=15)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date', 'notification_type'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['notification_type', 'timestamp'], name='notification_retention_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationarchive',
+            constraint=models.UniqueConstraint(fields=('date', 'notification_type'), name='one_archive_row_per_day_and_type'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_app', '0056_notification_retention'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['outstanding_balance'], name='customer_balance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['timestamp'], name='notification_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentcollection',
+            index=models.Index(fields=['status', 'due_date'], name='paymentcollection_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock_quantity', 'low_stock_threshold'], name='product_stock_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock_quantity__lte', models.F('low_stock_threshold'))), fields=['low_stock_threshold'], name='product_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'timestamp'], name='stockmovement_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', 'timestamp'], name='transaction_status_idx'),
+        ),
+    ]
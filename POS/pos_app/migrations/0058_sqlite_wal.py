@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def enable_wal(apps, schema_editor):
+    """Switch the SQLite file to write-ahead logging; the mode is stored in the file, so once is enough"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+
+
+class Migration(migrations.Migration):
+    # The journal mode cannot change inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('pos_app', '0057_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(enable_wal, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    """Rebuild every day's rollup: sales_revenue was added empty and P&L reads closed days from it.
+
+    Runs the rebuild command on the current models, so the rows match what
+    ReportEngine.profit_loss expects.
+    """
+    call_command('rebuild_daily_summaries', stdout=StringIO())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_app', '0058_sqlite_wal'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
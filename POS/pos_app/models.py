@@ -1,9 +1,19 @@
-from django.db import models
+import threading
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from django.utils import timezone
-from django.db.models import F
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan
+
+# Transaction statuses that count as a sale: they take stock out, earn revenue and reseller commission
+SALE_STATUSES = ('SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY')
 
 
 class BusinessProfile(models.Model):
@@ -85,14 +95,24 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True, default='General')
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+    # Catalog sequence value of the last write, for till delta syncs
+    catalog_version = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['catalog_version'], name='category_catalog_version_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The catalog version stamped in pre_save commits with the row
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
 
 class Supplier(models.Model):
     name = models.CharField(max_length=200, default='Supplier Name')
@@ -128,9 +148,23 @@ class Product(models.Model):
     warranty_months = models.IntegerField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Catalog sequence value of the last metadata write, for till delta syncs; stock changes bypass save()
+    catalog_version = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Till scans resolve exact barcodes; product_unique_code is already indexed as unique
+            models.Index(fields=['barcode'], name='product_barcode_idx'),
+            models.Index(fields=['catalog_version'], name='product_catalog_version_idx'),
+            models.Index(fields=['stock_quantity', 'low_stock_threshold'], name='product_stock_level_idx'),
+            # Compares two columns, so only a partial index keeps the low stock list off a table scan
+            models.Index(
+                fields=['low_stock_threshold'],
+                condition=Q(stock_quantity__lte=F('low_stock_threshold')),
+                name='product_low_stock_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.product_unique_code})"
@@ -140,12 +174,15 @@ class Product(models.Model):
         return self.stock_quantity <= self.low_stock_threshold
     
     def save(self, *args, **kwargs):
-        if not self.product_unique_code:
-            self.product_unique_code = self.generate_product_code()
-        # Fix barcode unique constraint - set to None if empty
-        if self.barcode == '':
-            self.barcode = None
-        super().save(*args, **kwargs)
+        # The code and the catalog version (stamped in pre_save) commit with the row, so a
+        # sync never sees a version whose row is still unwritten
+        with transaction.atomic(savepoint=False):
+            if not self.product_unique_code:
+                self.product_unique_code = self.generate_product_code()
+            # Fix barcode unique constraint - set to None if empty
+            if self.barcode == '':
+                self.barcode = None
+            super().save(*args, **kwargs)
     
     def generate_product_code(self):
         """Generate automatic product unique code"""
@@ -157,11 +194,8 @@ class Product(models.Model):
         # Get current year
         year = datetime.now().year
         
-        # Count existing products in this category
-        existing_count = Product.objects.filter(category=self.category).count() + 1
-        
         # Generate code: CATEGORY-YEAR-NUMBER
-        return f"{category_prefix}-{year}-{existing_count:04d}"
+        return Sequence.objects.next_code(f"{category_prefix}-{year}")
 
 
 class Customer(models.Model):
@@ -180,11 +214,15 @@ class Customer(models.Model):
 
     class Meta:
         ordering = ['-date_created']
+        indexes = [
+            models.Index(fields=['outstanding_balance'], name='customer_balance_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.account_code:
-            self.account_code = self.generate_account_code()
-        super().save(*args, **kwargs)
+        with Sequence.objects.numbering():
+            if not self.account_code:
+                self.account_code = self.generate_account_code()
+            super().save(*args, **kwargs)
     
     def generate_account_code(self):
         """Generate automatic customer account code"""
@@ -193,16 +231,44 @@ class Customer(models.Model):
         # Get current year
         year = datetime.now().year
         
-        # Count existing customers
-        existing_count = Customer.objects.count() + 1
-        
         # Generate code: CUST-YEAR-NUMBER
-        return f"CUST-{year}-{existing_count:04d}"
+        return Sequence.objects.next_code(f"CUST-{year}")
 
     def __str__(self):
         return self.name
 
 
+class ResellerQuerySet(models.QuerySet):
+    def with_balances(self):
+        """Annotate computed_balance, commission_owed and sale_count in one grouped query.
+
+        computed_balance follows Transaction.reseller_balance over every
+        transaction; commission_owed only counts the positive margins of
+        sales, as SalePostingService does when it credits the reseller.
+        """
+        amount = DecimalField(max_digits=12, decimal_places=2)
+        margin = Case(
+            When(transaction__total_amount=0, then=Value(Decimal('0'))),
+            When(
+                transaction__dealership_price__gt=0,
+                then=F('transaction__total_amount') - F('transaction__dealership_price') * F('transaction__quantity')
+            ),
+            # Assume 75% of total is system price
+            default=F('transaction__total_amount') * Value(Decimal('0.25')),
+            output_field=amount
+        )
+        sold = Q(transaction__status__in=SALE_STATUSES)
+        return self.annotate(
+            computed_balance=Coalesce(Sum(margin), Value(Decimal('0')), output_field=amount),
+            commission_owed=Coalesce(
+                Sum(margin, filter=sold & Q(transaction__total_amount__gt=0) & Q(GreaterThan(margin, 0))),
+                Value(Decimal('0')),
+                output_field=amount
+            ),
+            sale_count=Count('transaction', filter=sold),
+        )
+
+
 class Reseller(models.Model):
     SETTLEMENT_CHOICES = [
         ('PRICE_DIFFERENCE', 'Price Difference'),
@@ -226,13 +292,16 @@ class Reseller(models.Model):
     bank_details = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
 
+    objects = ResellerQuerySet.as_manager()
+
     class Meta:
         ordering = ['-id']
 
     def save(self, *args, **kwargs):
-        if not self.account_code:
-            self.account_code = self.generate_account_code()
-        super().save(*args, **kwargs)
+        with Sequence.objects.numbering():
+            if not self.account_code:
+                self.account_code = self.generate_account_code()
+            super().save(*args, **kwargs)
     
     def generate_account_code(self):
         """Generate automatic reseller account code"""
@@ -241,30 +310,16 @@ class Reseller(models.Model):
         # Get current year
         year = datetime.now().year
         
-        # Count existing resellers
-        existing_count = Reseller.objects.count() + 1
-        
         # Generate code: RESL-YEAR-NUMBER
-        return f"RESL-{year}-{existing_count:04d}"
+        return Sequence.objects.next_code(f"RESL-{year}")
     
     @property
     def calculated_reseller_balance(self):
-        """Calculate total reseller balance from all transactions"""
-        from django.db.models import Sum
-        transactions = Transaction.objects.filter(reseller=self)
-        total_balance = Decimal('0')
-        
-        for transaction in transactions:
-            if transaction.total_amount:
-                # Use dealership_price as system price if available
-                if transaction.dealership_price and transaction.dealership_price > 0:
-                    system_sale_price = transaction.dealership_price * transaction.quantity
-                else:
-                    # Assume 75% of total is system price
-                    system_sale_price = transaction.total_amount * Decimal('0.75')
-                total_balance += transaction.total_amount - system_sale_price
-        
-        return total_balance
+        """Total reseller balance from all transactions"""
+        # Listings load this through Reseller.objects.with_balances()
+        if hasattr(self, 'computed_balance'):
+            return self.computed_balance
+        return Reseller.objects.filter(pk=self.pk).with_balances().values_list('computed_balance', flat=True).get()
 
     def __str__(self):
         return self.name
@@ -297,6 +352,11 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Cursor pagination walks (timestamp, id)
+            models.Index(fields=['timestamp', 'id'], name='transaction_cursor_idx'),
+            models.Index(fields=['status', 'timestamp'], name='transaction_status_idx'),
+        ]
 
     @property
     def product_names(self):
@@ -324,6 +384,12 @@ class Transaction(models.Model):
         return 0
 
     def save(self, *args, **kwargs):
+        business = BusinessProfile.objects.first() if self.is_taxed else None
+        self.calculate_amounts(business)
+        super().save(*args, **kwargs)
+
+    def calculate_amounts(self, business=None):
+        """Fill in sale price, total and tax; bulk writers call this with a preloaded business profile"""
         # Set sale_price to product's default price if not set and product exists
         if self.product and not self.sale_price:
             self.sale_price = self.product.default_sale_price
@@ -332,13 +398,9 @@ class Transaction(models.Model):
         if not self.total_amount and self.sale_price:
             self.total_amount = self.sale_price * self.quantity
         
-        if self.is_taxed:
-            business = BusinessProfile.objects.first()
-            if business:
-                from decimal import Decimal
-                tax_rate = business.zimra_tax_rate / Decimal('100')
-                self.tax_amount = Decimal(str(self.total_amount)) * tax_rate
-        super().save(*args, **kwargs)
+        if self.is_taxed and business:
+            tax_rate = business.zimra_tax_rate / Decimal('100')
+            self.tax_amount = Decimal(str(self.total_amount)) * tax_rate
 
     def __str__(self):
         product_name = self.product.name if self.product else "No Product"
@@ -400,10 +462,16 @@ class Invoice(models.Model):
     notes = models.TextField(blank=True)
 
     def save(self, *args, **kwargs):
-        if not self.invoice_number:
-            from datetime import datetime
-            self.invoice_number = f"INV-{datetime.now().strftime('%Y%m%d')}-{Invoice.objects.count() + 1:04d}"
-        super().save(*args, **kwargs)
+        with Sequence.objects.numbering():
+            if not self.invoice_number:
+                self.invoice_number = self.generate_invoice_number()
+            super().save(*args, **kwargs)
+
+    @staticmethod
+    def generate_invoice_number():
+        """Generate automatic invoice number: INV-YYYYMMDD-NUMBER"""
+        from datetime import datetime
+        return Sequence.objects.next_code(f"INV-{datetime.now().strftime('%Y%m%d')}")
 
     def __str__(self):
         customer_name = self.customer.name if self.customer else "No Customer"
@@ -448,6 +516,11 @@ class Payment(models.Model):
     recorded_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     notes = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='payment_cursor_idx'),
+        ]
+
     def __str__(self):
         if self.customer:
             return f"Payment from {self.customer.name} - ${self.amount}"
@@ -473,6 +546,7 @@ class StockMovement(models.Model):
         ('THEFT', 'Theft'),
         ('COUNT_DIFFERENCE', 'Count Difference'),
         ('RETURN', 'Return'),
+        ('OPENING', 'Opening Balance'),
         ('OTHER', 'Other'),
     ]
 
@@ -489,6 +563,10 @@ class StockMovement(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='stockmovement_cursor_idx'),
+            models.Index(fields=['product', 'timestamp'], name='stockmovement_product_idx'),
+        ]
 
     def __str__(self):
         product_name = self.product.name if self.product else "No Product"
@@ -535,14 +613,46 @@ class Notification(models.Model):
     related_customer = models.ForeignKey(Customer, on_delete=models.CASCADE, null=True, blank=True)
     related_reseller = models.ForeignKey(Reseller, on_delete=models.CASCADE, null=True, blank=True)
     created_for = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    # Set when the condition behind an alert clears, e.g. stock back above the threshold
+    resolved_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='notification_cursor_idx'),
+            models.Index(fields=['notification_type', 'timestamp'], name='notification_retention_idx'),
+            # Only unread rows, which is all the unread list and count ever read; SQLite cannot
+            # seek a (is_read, timestamp) index on the NOT is_read that Django generates
+            models.Index(fields=['timestamp'], condition=Q(is_read=False), name='notification_unread_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['related_product'],
+                condition=Q(notification_type='LOW_STOCK', resolved_at__isnull=True),
+                name='one_open_low_stock_alert'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.notification_type} - {self.timestamp.date()}"
 
 
+class NotificationArchive(models.Model):
+    """Per-day notification counts kept after the notifications themselves are purged"""
+    date = models.DateField()
+    notification_type = models.CharField(max_length=15, choices=Notification.TYPE_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date', 'notification_type']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'notification_type'], name='one_archive_row_per_day_and_type'),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_type} - {self.date}: {self.count}"
+
+
 class CashDrawer(models.Model):
     opened_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     opening_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -574,6 +684,21 @@ class Receipt(models.Model):
     def __str__(self):
         return f"Receipt {self.receipt_number or 'No Number'}"
 
+    def save(self, *args, **kwargs):
+        # The number comes from the pre_save signal
+        with Sequence.objects.numbering():
+            super().save(*args, **kwargs)
+
+    @staticmethod
+    def receipt_prefix():
+        from datetime import datetime
+        return f"RCP-{datetime.now().strftime('%Y%m%d')}"
+
+    @staticmethod
+    def generate_receipt_number():
+        """Generate automatic receipt number: RCP-YYYYMMDD-NUMBER"""
+        return Sequence.objects.next_code(Receipt.receipt_prefix())
+
 
 class ExpenseCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -695,6 +820,27 @@ class ProfitLossReport(models.Model):
         return f"{self.get_period_type_display()} P&L: {self.start_date or 'N/A'} to {self.end_date or 'N/A'}"
 
 
+class DailySummaryManager(models.Manager):
+    def add(self, day, **deltas):
+        """Add deltas to the day's summary row, creating it if needed.
+
+        Each field moves with a single F() UPDATE in the caller's transaction,
+        so concurrent postings to the same day never overwrite each other.
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        updates = {field: F(field) + delta for field, delta in deltas.items()}
+        with transaction.atomic(using=self.db, savepoint=False):
+            if self.filter(date=day).update(updated_at=timezone.now(), **updates):
+                return
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(date=day, **deltas)
+            except IntegrityError:
+                self.filter(date=day).update(updated_at=timezone.now(), **updates)
+
+
 class DailySummary(models.Model):
     date = models.DateField(unique=True)
     
@@ -715,6 +861,8 @@ class DailySummary(models.Model):
     # Financial metrics
     total_expenses = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_losses = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Item revenue with reseller sales at the default price; profit is measured against this
+    sales_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     cost_of_goods_sold = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     gross_profit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     net_profit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -726,6 +874,8 @@ class DailySummary(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DailySummaryManager()
+
     def __str__(self):
         return f"Daily Summary - {self.date}"
 
@@ -761,6 +911,10 @@ class PaymentCollection(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='paymentcollection_cursor_idx'),
+            models.Index(fields=['status', 'due_date'], name='paymentcollection_status_idx'),
+        ]
 
     @property
     def customer_name(self):
@@ -802,4 +956,120 @@ class ReportSchedule(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.email} - {self.frequency} {self.format} reports"
\ No newline at end of file
+        return f"{self.email} - {self.frequency} {self.format} reports"
+
+
+class IdempotencyKey(models.Model):
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key_per_scope'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} - {self.key}"
+
+
+class SequenceManager(models.Manager):
+    # Per-process blocks handed out by next_value(): {name: [next, last]}
+    _blocks = {}
+    _blocks_lock = threading.Lock()
+
+    def allocate(self, name, count=1):
+        """Reserve count consecutive values of the named sequence and return the first one.
+
+        The increment is a single UPDATE, so concurrent writers queue on the
+        counter row instead of reading the same value. When called inside a
+        transaction the reservation rolls back with it, which keeps the
+        sequence gap-free.
+        """
+        # No savepoint of its own: the only error path is rolled back by the inner one
+        with transaction.atomic(using=self.db, savepoint=False):
+            # Write before reading so SQLite takes the write lock up front
+            if not self.filter(name=name).update(last_value=F('last_value') + count):
+                try:
+                    with transaction.atomic(using=self.db):
+                        self.create(name=name, last_value=count)
+                    return 1
+                except IntegrityError:
+                    self.filter(name=name).update(last_value=F('last_value') + count)
+            last_value = self.filter(name=name).values_list('last_value', flat=True).get()
+        return last_value - count + 1
+
+    def next_value(self, name):
+        """Return the next value of the named sequence.
+
+        With settings.SEQUENCE_BLOCK_SIZE above 1 each worker process reserves
+        a block of values at a time and hands them out from memory. Values
+        stay unique but are no longer gap-free across workers. Inside an
+        atomic block a single value is always allocated, so a rollback
+        cannot leave a cached block that other workers will reuse.
+        """
+        block_size = getattr(settings, 'SEQUENCE_BLOCK_SIZE', 1)
+        if block_size <= 1 or transaction.get_connection(self.db).in_atomic_block:
+            return self.allocate(name)
+
+        with self._blocks_lock:
+            block = self._blocks.get(name)
+            if not block or block[0] > block[1]:
+                first = self.allocate(name, block_size)
+                block = self._blocks[name] = [first, first + block_size - 1]
+            value = block[0]
+            block[0] += 1
+        return value
+
+    def numbering(self):
+        """Transaction for a save that allocates a code, so a failed insert gives its number back.
+
+        Inside an outer transaction it adds no savepoint: the number already
+        rolls back with the caller. Worker blocks are not gap-free anyway, so
+        with SEQUENCE_BLOCK_SIZE above 1 the save keeps drawing from them.
+        """
+        if getattr(settings, 'SEQUENCE_BLOCK_SIZE', 1) > 1:
+            return nullcontext()
+        return transaction.atomic(using=self.db, savepoint=False)
+
+    def next_code(self, prefix, width=4):
+        """Return the next PREFIX-NUMBER code, zero-padded to width digits"""
+        return f"{prefix}-{self.next_value(prefix):0{width}d}"
+
+
+class Sequence(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    objects = SequenceManager()
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.last_value})"
+
+
+class CatalogTombstone(models.Model):
+    """A deleted product or category, kept so delta syncs can tell tills to drop it"""
+    KIND_CHOICES = [
+        ('PRODUCT', 'Product'),
+        ('CATEGORY', 'Category'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    catalog_version = models.BigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['catalog_version']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.object_id} deleted at version {self.catalog_version}"
@@ -0,0 +1,139 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.response import Response
+
+
+class TimestampCursorPagination(CursorPagination):
+    """Keyset pagination for append-heavy tables.
+
+    Pages are fetched with a WHERE on the (timestamp, id) pair instead of an
+    OFFSET scan, so deep pages cost the same as the first one. DRF's
+    CursorPagination keys on the first ordering column only and pages
+    through equal timestamps with an OFFSET; here the id tiebreaker is part
+    of the cursor position, so rows sharing a timestamp (bulk imports,
+    batch ingestion) are skipped by the same WHERE. The total count is only
+    computed when the client asks for it with ?count=true.
+    """
+    ordering = ('-timestamp', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    count_query_param = 'count'
+    position_separator = '|'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = queryset.count()
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(self.position_filter(current_position, reverse))
+            except (ValidationError, ValueError):
+                # A tampered cursor is a 404, as for DRF's own invalid cursors, not a 500
+                raise NotFound(self.invalid_cursor_message)
+
+        # Positions are unique, so the links issued below never carry an offset
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def position_filter(self, position, reverse):
+        """Rows strictly after position in the direction being read: (value, id) compared as a pair"""
+        field, tiebreaker = (order.lstrip('-') for order in self.ordering[:2])
+        value, separator, pk = position.rpartition(self.position_separator)
+        if not separator:
+            raise NotFound(self.invalid_cursor_message)
+        lookup = 'lt' if reverse != self.ordering[0].startswith('-') else 'gt'
+        return Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'{tiebreaker}__{lookup}': pk})
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering[:2]:
+            field_name = order.lstrip('-')
+            values.append(str(instance[field_name] if isinstance(instance, dict) else getattr(instance, field_name)))
+        return self.position_separator.join(values)
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        paginated_schema = super().get_paginated_response_schema(schema)
+        paginated_schema['properties'] = {
+            'count': {'type': 'integer', 'example': 123, 'description': f'Only present with ?{self.count_query_param}=true'},
+            **paginated_schema['properties'],
+        }
+        return paginated_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Include the total number of results',
+            'schema': {'type': 'boolean'},
+        })
+        return parameters
+
+
+class CreatedAtCursorPagination(TimestampCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class DateCursorPagination(TimestampCursorPagination):
+    ordering = ('-date', '-id')
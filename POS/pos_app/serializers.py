@@ -57,6 +57,16 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+    
+    def validate_stock_quantity(self, value):
+        # Stock only changes through stock movements and stock takes after creation;
+        # sending back the current value (a full PUT) is fine
+        if self.instance is not None and value != self.instance.stock_quantity:
+            raise serializers.ValidationError(
+                'Stock cannot be edited on the product. Post a stock take (/api/stock-takes/) '
+                'or an adjustment (/api/stock-movements/) instead.'
+            )
+        return value
 
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -91,6 +101,9 @@ class CustomerSerializer(serializers.ModelSerializer):
 
 class ResellerSerializer(serializers.ModelSerializer):
     calculated_reseller_balance = serializers.ReadOnlyField()
+    # Annotated by Reseller.objects.with_balances()
+    commission_owed = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    sale_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Reseller
@@ -149,11 +162,18 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('sale_by', 'timestamp')
     
+    @staticmethod
+    def _items(obj):
+        # all() reads the prefetch cache set up by TransactionViewSet, so the
+        # display fields below cost no queries per row
+        return list(obj.items.all()) if obj.pk else []
+    
     def get_display_sale_price(self, obj):
+        items = self._items(obj)
         if obj.reseller:
             # For reseller: calculate system price from items or product default prices
-            if hasattr(obj, 'items') and obj.items.exists():
-                return sum(float(item.product.default_sale_price) * item.quantity for item in obj.items.all())
+            if items:
+                return sum(float(item.product.default_sale_price) * item.quantity for item in items)
             elif obj.product:
                 return float(obj.product.default_sale_price) * obj.quantity
             # Fallback: if dealership_price exists, use it
@@ -176,14 +196,13 @@ class TransactionSerializer(serializers.ModelSerializer):
         return 0
     
     def get_display_product_names(self, obj):
+        items = self._items(obj)
         # Check if transaction has items
-        if hasattr(obj, 'items') and obj.items.exists():
-            items = list(obj.items.all())
-            if len(items) == 1:
-                return f"{items[0].product.name} (x{items[0].quantity})"
-            elif len(items) > 1:
-                product_list = [f"{item.product.name} (x{item.quantity})" for item in items]
-                return "; ".join(product_list)
+        if len(items) == 1:
+            return f"{items[0].product.name} (x{items[0].quantity})"
+        elif len(items) > 1:
+            product_list = [f"{item.product.name} (x{item.quantity})" for item in items]
+            return "; ".join(product_list)
         # Check if transaction has a single product
         elif obj.product:
             return f"{obj.product.name} (x{obj.quantity})"
@@ -192,9 +211,10 @@ class TransactionSerializer(serializers.ModelSerializer):
             return "No Products"
     
     def get_display_total_quantity(self, obj):
+        items = self._items(obj)
         # Check if transaction has items
-        if hasattr(obj, 'items') and obj.items.exists():
-            return sum(item.quantity for item in obj.items.all())
+        if items:
+            return sum(item.quantity for item in items)
         # Check if transaction has a single product
         elif obj.product:
             return obj.quantity
@@ -203,6 +223,34 @@ class TransactionSerializer(serializers.ModelSerializer):
             return 0
 
 
+class BatchSaleItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+
+class BatchSaleSerializer(serializers.ModelSerializer):
+    """One queued sale in POST /transactions/batch/.
+
+    Related objects are plain ids here; the service resolves them for the
+    whole batch at once instead of one query per field per sale.
+    """
+    product = serializers.IntegerField(required=False, allow_null=True)
+    customer = serializers.IntegerField(required=False, allow_null=True)
+    reseller = serializers.IntegerField(required=False, allow_null=True)
+    supplier = serializers.IntegerField(required=False, allow_null=True)
+    items = BatchSaleItemSerializer(many=True, required=False)
+    idempotency_key = serializers.CharField(max_length=255, required=False)
+    
+    class Meta:
+        model = Transaction
+        fields = [
+            'product', 'customer', 'reseller', 'supplier', 'quantity', 'status', 'dealership_price',
+            'sale_price', 'total_amount', 'tax_amount', 'is_taxed', 'zimra_receipt_no', 'notes',
+            'payment_method', 'items', 'idempotency_key',
+        ]
+
+
 class ResellerSaleSerializer(serializers.ModelSerializer):
     class Meta:
         model = ResellerSale
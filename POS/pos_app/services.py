@@ -1,30 +1,57 @@
 import csv
+import gzip
+import hashlib
 import json
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
 from io import StringIO, BytesIO
 from datetime import datetime, timedelta
+from django.core.cache import cache
 from django.core.mail import EmailMessage
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import (
+    Case, Count, DecimalField, Exists, ExpressionWrapper, F, IntegerField, Max, OuterRef, Prefetch, Q, Subquery, Sum, Value, When,
+    prefetch_related_objects
+)
+from django.db.models.functions import Coalesce, TruncDate
 from django.template.loader import render_to_string
 from django.utils import timezone
-from .models import Transaction, Product, Customer, Reseller, Expense, ReportSchedule
+from rest_framework.exceptions import ValidationError
+from django.contrib.auth.models import User
+from .models import (
+    BusinessProfile, Transaction, TransactionItem, Product, Category, CatalogTombstone, StockMovement, Customer,
+    Reseller, Supplier,
+    Expense, Loss, DailySummary, Invoice, Notification, NotificationArchive, Payment, Receipt, PaymentCollection, IdempotencyKey, Sequence, ReportSchedule,
+    SALE_STATUSES,
+)
+from .serializers import BatchSaleItemSerializer, BatchSaleSerializer, NotificationSerializer, ProductSerializer
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill
 
+logger = logging.getLogger(__name__)
+
 
 class ReportGenerator:
+    EXCEL_SHEETS = ('items', 'payments', 'expenses')
+    
     @staticmethod
-    def generate_business_report():
-        """Generate comprehensive business report data"""
-        transactions = Transaction.objects.all().order_by('-timestamp')
+    def generate_business_report(start=None, end=None):
+        """Generate comprehensive business report data, optionally bounded to [start, end] dates"""
+        transactions = ExportService.date_bounded(Transaction.objects.all(), 'timestamp', start, end).order_by('-timestamp')
         products = Product.objects.all()
         customers = Customer.objects.all()
         resellers = Reseller.objects.all()
-        expenses = Expense.objects.all()
+        expenses = ExportService.date_bounded(Expense.objects.all(), 'date', start, end)
         
         # Financial summary
-        sold_transactions = transactions.filter(status='SOLD')
-        total_revenue = sum(t.total_amount for t in sold_transactions)
-        total_expenses = sum(e.amount for e in expenses)
+        total_revenue = transactions.filter(status='SOLD').aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
+        total_expenses = expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0')
         net_profit = total_revenue - total_expenses
         
         return {
@@ -44,23 +71,22 @@ class ReportGenerator:
         }
     
     @staticmethod
-    def generate_excel_report():
-        """Generate Excel report"""
-        data = ReportGenerator.generate_business_report()
+    def generate_excel_report(start=None, end=None, sheets=EXCEL_SHEETS):
+        """Generate Excel report.
+
+        The workbook is written in openpyxl's write-only mode from streamed
+        querysets, so memory stays flat however many rows are written.
+        sheets picks extra ledgers to add after Transactions: any of
+        items, payments and expenses.
+        """
+        data = ReportGenerator.generate_business_report(start, end)
         
         # Create workbook
-        wb = openpyxl.Workbook()
+        wb = openpyxl.Workbook(write_only=True)
         
         # Summary sheet
-        ws_summary = wb.active
-        ws_summary.title = "Summary"
-        
-        # Headers
-        headers = ['Metric', 'Value']
-        for col, header in enumerate(headers, 1):
-            cell = ws_summary.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        ws_summary = wb.create_sheet("Summary")
+        ws_summary.append(ReportGenerator.header_row(ws_summary, ['Metric', 'Value'], fill=True))
         
         # Summary data
         summary_data = [
@@ -71,52 +97,79 @@ class ReportGenerator:
             ['Active Products', data['summary']['active_products']],
             ['Active Customers', data['summary']['active_customers']],
         ]
-        
-        for row, (metric, value) in enumerate(summary_data, 2):
-            ws_summary.cell(row=row, column=1, value=metric)
-            ws_summary.cell(row=row, column=2, value=value)
+        for row in summary_data:
+            ws_summary.append(row)
         
         # Transactions sheet
         ws_trans = wb.create_sheet("Transactions")
         trans_headers = ['Date', 'Receipt#', 'Product', 'Customer', 'Amount', 'Status', 'Payment Method']
+        ws_trans.append(ReportGenerator.header_row(ws_trans, trans_headers))
         
-        for col, header in enumerate(trans_headers, 1):
-            cell = ws_trans.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-        
-        for row, transaction in enumerate(data['transactions'][:1000], 2):  # Limit to 1000 rows
+        transactions = data['transactions'].select_related('customer', 'reseller', 'product').prefetch_related(
+            Prefetch('items', queryset=TransactionItem.objects.select_related('product'))
+        )
+        for sale in transactions.iterator(chunk_size=ExportService.CHUNK_SIZE):
             # Get customer/reseller name properly
-            if transaction.customer:
-                customer_name = transaction.customer.name
-            elif transaction.reseller:
-                customer_name = f"{transaction.reseller.name} (Reseller)"
+            if sale.customer:
+                customer_name = sale.customer.name
+            elif sale.reseller:
+                customer_name = f"{sale.reseller.name} (Reseller)"
             else:
                 customer_name = 'Walk-in Customer'
             
             # Get all product names properly
-            product_names = []
-            if hasattr(transaction, 'items') and transaction.items.exists():
-                items = list(transaction.items.all())
+            items = list(sale.items.all())
+            if items:
                 product_names = [f"{item.product.name} (x{item.quantity})" for item in items]
-            elif transaction.product:
-                product_names = [f"{transaction.product.name} (x{transaction.quantity})"]
-            
-            product_name = "; ".join(product_names) if product_names else 'N/A'
+            elif sale.product:
+                product_names = [f"{sale.product.name} (x{sale.quantity})"]
+            else:
+                product_names = []
             
-            ws_trans.cell(row=row, column=1, value=transaction.timestamp.strftime('%Y-%m-%d'))
-            ws_trans.cell(row=row, column=2, value=transaction.zimra_receipt_no or f'RCP-{transaction.id}')
-            ws_trans.cell(row=row, column=3, value=product_name)
-            ws_trans.cell(row=row, column=4, value=customer_name)
-            ws_trans.cell(row=row, column=5, value=float(transaction.total_amount))
-            ws_trans.cell(row=row, column=6, value=transaction.status)
-            ws_trans.cell(row=row, column=7, value=transaction.payment_method)
+            ws_trans.append([
+                sale.timestamp.strftime('%Y-%m-%d'),
+                sale.zimra_receipt_no or f'RCP-{sale.id}',
+                "; ".join(product_names) if product_names else 'N/A',
+                customer_name,
+                float(sale.total_amount),
+                sale.status,
+                sale.payment_method,
+            ])
+        
+        # Extra ledger sheets share the streaming exports
+        for dataset in sheets:
+            ws = wb.create_sheet(dataset.replace('-', ' ').title())
+            headers, rows = ExportService.rows(dataset, start, end)
+            ws.append(ReportGenerator.header_row(ws, [header.replace('_', ' ').title() for header in headers]))
+            for row in rows:
+                ws.append([ReportGenerator.excel_value(value) for value in row])
         
         # Save to BytesIO
         buffer = BytesIO()
         wb.save(buffer)
-        buffer.seek(0)
         return buffer.getvalue()
     
+    @staticmethod
+    def header_row(ws, headers, fill=False):
+        """Bold header cells for a write-only sheet"""
+        cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.font = Font(bold=True)
+            if fill:
+                cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+            cells.append(cell)
+        return cells
+    
+    @staticmethod
+    def excel_value(value):
+        # Excel has no timezone-aware datetimes or decimals
+        if isinstance(value, datetime):
+            return timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+        if isinstance(value, Decimal):
+            return float(value)
+        return value
+    
     @staticmethod
     def generate_pdf_report():
         """Generate PDF report (HTML for now)"""
@@ -152,32 +205,32 @@ class ReportGenerator:
                 </tr>
         """
         
-        for transaction in data['transactions'][:50]:  # Limit to 50 rows
+        for sale in data['transactions'][:50]:  # Limit to 50 rows
             # Get customer/reseller name properly
-            if transaction.customer:
-                customer_name = transaction.customer.name
-            elif transaction.reseller:
-                customer_name = f"{transaction.reseller.name} (Reseller)"
+            if sale.customer:
+                customer_name = sale.customer.name
+            elif sale.reseller:
+                customer_name = f"{sale.reseller.name} (Reseller)"
             else:
                 customer_name = 'Walk-in Customer'
             
             # Get all product names properly
             product_names = []
-            if hasattr(transaction, 'items') and transaction.items.exists():
-                items = list(transaction.items.all())
+            if hasattr(sale, 'items') and sale.items.exists():
+                items = list(sale.items.all())
                 product_names = [f"{item.product.name} (x{item.quantity})" for item in items]
-            elif transaction.product:
-                product_names = [f"{transaction.product.name} (x{transaction.quantity})"]
+            elif sale.product:
+                product_names = [f"{sale.product.name} (x{sale.quantity})"]
             
             product_name = "; ".join(product_names) if product_names else 'N/A'
             
             html_content += f"""
                 <tr>
-                    <td>{transaction.timestamp.strftime('%Y-%m-%d')}</td>
+                    <td>{sale.timestamp.strftime('%Y-%m-%d')}</td>
                     <td>{product_name}</td>
                     <td>{customer_name}</td>
-                    <td>${transaction.total_amount:.2f}</td>
-                    <td>{transaction.status}</td>
+                    <td>${sale.total_amount:.2f}</td>
+                    <td>{sale.status}</td>
                 </tr>
             """
         
@@ -190,6 +243,623 @@ class ReportGenerator:
         return html_content.encode('utf-8')
 
 
+class ExportService:
+    """Stream date-bounded ledgers as CSV or NDJSON.
+
+    Every dataset is one values_list() query with the related names joined
+    in SQL, read through iterator(), so memory stays flat however many rows
+    are exported.
+    """
+    CHUNK_SIZE = 2000
+    FORMATS = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+    # dataset: (model, date field, [(column, field lookup), ...])
+    DATASETS = {
+        'transactions': (Transaction, 'timestamp', [
+            ('id', 'id'),
+            ('timestamp', 'timestamp'),
+            ('status', 'status'),
+            ('product', 'product__name'),
+            ('quantity', 'quantity'),
+            ('customer', 'customer__name'),
+            ('reseller', 'reseller__name'),
+            ('sale_price', 'sale_price'),
+            ('dealership_price', 'dealership_price'),
+            ('total_amount', 'total_amount'),
+            ('tax_amount', 'tax_amount'),
+            ('payment_method', 'payment_method'),
+            ('zimra_receipt_no', 'zimra_receipt_no'),
+            ('sale_by', 'sale_by__username'),
+        ]),
+        'items': (TransactionItem, 'transaction__timestamp', [
+            ('id', 'id'),
+            ('transaction', 'transaction_id'),
+            ('timestamp', 'transaction__timestamp'),
+            ('status', 'transaction__status'),
+            ('product', 'product__name'),
+            ('product_code', 'product__product_unique_code'),
+            ('quantity', 'quantity'),
+            ('unit_price', 'unit_price'),
+            ('total_price', 'total_price'),
+        ]),
+        'payments': (Payment, 'date', [
+            ('id', 'id'),
+            ('date', 'date'),
+            ('customer', 'customer__name'),
+            ('reseller', 'reseller__name'),
+            ('invoice', 'invoice__invoice_number'),
+            ('amount', 'amount'),
+            ('payment_method', 'payment_method'),
+            ('reference_number', 'reference_number'),
+            ('recorded_by', 'recorded_by__username'),
+        ]),
+        'stock-movements': (StockMovement, 'timestamp', [
+            ('id', 'id'),
+            ('timestamp', 'timestamp'),
+            ('movement_type', 'movement_type'),
+            ('product', 'product__name'),
+            ('quantity', 'quantity'),
+            ('unit_cost', 'unit_cost'),
+            ('reason', 'reason'),
+            ('reference_doc_type', 'reference_doc_type'),
+            ('reference_doc_id', 'reference_doc_id'),
+            ('performed_by', 'performed_by__username'),
+        ]),
+        'expenses': (Expense, 'date', [
+            ('id', 'id'),
+            ('date', 'date'),
+            ('category', 'category__name'),
+            ('expense_type', 'expense_type'),
+            ('description', 'description'),
+            ('amount', 'amount'),
+            ('receipt_reference', 'receipt_reference'),
+            ('recorded_by', 'recorded_by__username'),
+        ]),
+    }
+
+    class Echo:
+        """File-like object whose write() hands the line back to csv.writer's caller"""
+        def write(self, value):
+            return value
+
+    @staticmethod
+    def rows(dataset, start=None, end=None):
+        """Return the column names and a lazy iterator of row tuples.
+
+        start and end are dates; both are inclusive.
+        """
+        model, date_field, columns = ExportService.DATASETS[dataset]
+        queryset = ExportService.date_bounded(model.objects.all(), date_field, start, end)
+        queryset = queryset.order_by(date_field, 'id').values_list(*[lookup for _, lookup in columns])
+        return [name for name, _ in columns], queryset.iterator(chunk_size=ExportService.CHUNK_SIZE)
+
+    @staticmethod
+    def date_bounded(queryset, date_field, start=None, end=None):
+        """Filter queryset to the inclusive [start, end] date range"""
+        # Compare against datetime bounds so the cursor indexes stay usable
+        if start:
+            queryset = queryset.filter(**{f'{date_field}__gte': ExportService.day_start(start)})
+        if end:
+            queryset = queryset.filter(**{f'{date_field}__lt': ExportService.day_start(end + timedelta(days=1))})
+        return queryset
+
+    @staticmethod
+    def day_start(day):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    @staticmethod
+    def stream(dataset, output='csv', start=None, end=None):
+        """Yield the export line by line in the given output format"""
+        headers, rows = ExportService.rows(dataset, start, end)
+        if output == 'ndjson':
+            for row in rows:
+                yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+        else:
+            writer = csv.writer(ExportService.Echo())
+            yield writer.writerow(headers)
+            for row in rows:
+                yield writer.writerow(row)
+
+
+class ReportEngine:
+    """Headline report metrics computed with conditional aggregation.
+
+    Each method answers every question about one table in a single SQL
+    statement using Count/Sum with filter=, instead of one query per number.
+    """
+
+    @staticmethod
+    def sales(today):
+        """Daily, weekly (last 7 days) and month-to-date sales in one query"""
+        today_start = ExportService.day_start(today)
+        week_start = ExportService.day_start(today - timedelta(days=7))
+        month_start = ExportService.day_start(today.replace(day=1))
+        in_day = Q(timestamp__gte=today_start)
+        in_week = Q(timestamp__gte=week_start)
+        in_month = Q(timestamp__gte=month_start)
+
+        totals = Transaction.objects.filter(
+            status__in=SALE_STATUSES,
+            timestamp__gte=min(week_start, month_start),
+            timestamp__lt=ExportService.day_start(today + timedelta(days=1))
+        ).aggregate(
+            daily_count=Count('id', filter=in_day),
+            daily_amount=Sum('total_amount', filter=in_day),
+            daily_tax=Sum('tax_amount', filter=in_day),
+            weekly_count=Count('id', filter=in_week),
+            weekly_amount=Sum('total_amount', filter=in_week),
+            monthly_count=Count('id', filter=in_month),
+            monthly_amount=Sum('total_amount', filter=in_month),
+        )
+        return {key: value or 0 for key, value in totals.items()}
+
+    @staticmethod
+    def stock():
+        return Product.objects.filter(is_active=True).aggregate(
+            total_products=Count('id'),
+            low_stock_products=Count('id', filter=Q(stock_quantity__lte=F('low_stock_threshold'))),
+            out_of_stock_products=Count('id', filter=Q(stock_quantity=0)),
+        )
+
+    @staticmethod
+    def customer_balances():
+        totals = Customer.objects.filter(outstanding_balance__gt=0).aggregate(
+            total_customers_with_balance=Count('id'),
+            total_outstanding=Sum('outstanding_balance'),
+        )
+        return {key: value or 0 for key, value in totals.items()}
+
+    @staticmethod
+    def reseller_balances():
+        totals = Reseller.objects.filter(current_balance__gt=0).aggregate(
+            total_resellers_owed=Count('id'),
+            total_amount_owed=Sum('current_balance'),
+        )
+        return {key: value or 0 for key, value in totals.items()}
+
+    @staticmethod
+    def grouped_totals(model, type_field, amount_field, today):
+        """Today's totals by type plus the month-to-date total, from one grouped query"""
+        today_start = ExportService.day_start(today)
+        rows = model.objects.filter(
+            date__gte=ExportService.day_start(today.replace(day=1)),
+            date__lt=ExportService.day_start(today + timedelta(days=1))
+        ).order_by().values(type_field).annotate(
+            today=Sum(amount_field, filter=Q(date__gte=today_start)),
+            month=Sum(amount_field),
+        )
+
+        by_type, month_total = [], 0
+        for row in rows:
+            month_total += row['month'] or 0
+            if row['today'] is not None:
+                by_type.append({type_field: row[type_field], 'total': row['today']})
+        return {
+            'today_total': sum(row['total'] for row in by_type),
+            'by_type': by_type,
+            'month_total': month_total,
+        }
+
+    @staticmethod
+    def line_cost():
+        """Cost of goods of a TransactionItem, or of a sale's single product, at the product's average cost"""
+        return ExpressionWrapper(
+            F('product__cost_price_avg') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+
+    @staticmethod
+    def profit_loss(start, end):
+        """P&L totals for the inclusive [start, end] date range.
+
+        Closed days are summed from their DailySummary rollups in one query;
+        only today, which is still taking postings, is read from raw rows.
+        """
+        totals = dict.fromkeys(
+            ['total_sales', 'total_tax_collected', 'cost_of_goods_sold', 'total_expenses', 'total_losses'], Decimal('0')
+        )
+        today = timezone.localdate()
+
+        closed_end = min(end, today - timedelta(days=1))
+        if start <= closed_end:
+            rollups = DailySummary.objects.filter(date__range=[start, closed_end]).aggregate(
+                total_sales=Sum('sales_revenue'),
+                total_tax_collected=Sum('total_tax_amount'),
+                cost_of_goods_sold=Sum('cost_of_goods_sold'),
+                total_expenses=Sum('total_expenses'),
+                total_losses=Sum('total_losses'),
+            )
+            for key, value in rollups.items():
+                totals[key] += value or 0
+
+        if start <= today <= end:
+            without_items = ReportEngine.without_items()
+            sales = ExportService.date_bounded(
+                Transaction.objects.filter(status__in=SALE_STATUSES), 'timestamp', today, today
+            ).aggregate(
+                total_tax_collected=Sum('tax_amount'),
+                total_sales=Sum(ReportEngine.sale_revenue(), filter=without_items),
+                cost_of_goods_sold=Sum(ReportEngine.line_cost(), filter=without_items),
+            )
+            margin = ExportService.date_bounded(
+                TransactionItem.objects.filter(transaction__status__in=SALE_STATUSES),
+                'transaction__timestamp', today, today
+            ).aggregate(total_sales=Sum(ReportEngine.line_revenue()), cost_of_goods_sold=Sum(ReportEngine.line_cost()))
+            expenses = ExportService.date_bounded(Expense.objects.all(), 'date', today, today).aggregate(
+                total_expenses=Sum('amount')
+            )
+            losses = ExportService.date_bounded(Loss.objects.all(), 'date', today, today).aggregate(
+                total_losses=Sum('total_loss_amount')
+            )
+            for aggregates in (sales, margin, expenses, losses):
+                for key, value in aggregates.items():
+                    totals[key] += value or 0
+
+        return totals
+
+    @staticmethod
+    def line_revenue():
+        """Revenue of a TransactionItem excluding reseller markup.
+
+        Reseller sales count at the product's default price and direct sales
+        at the price charged. Reports, DailySummary rollups and P&L reports
+        all measure profit against this, so they agree with each other.
+        """
+        return Case(
+            When(transaction__reseller__isnull=False, then=F('product__default_sale_price') * F('quantity')),
+            default=F('unit_price') * F('quantity'),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+
+    @staticmethod
+    def sale_revenue():
+        """Revenue of a Transaction posted without items, from its single product and total.
+
+        Sales saved outside checkout (admin, scripts) carry one product and
+        quantity on the header instead of TransactionItem rows. They follow
+        the same rule as line_revenue(): reseller sales at the default price.
+        """
+        return Case(
+            When(reseller__isnull=False, product__isnull=False, then=F('product__default_sale_price') * F('quantity')),
+            default=F('total_amount'),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+
+    @staticmethod
+    def without_items():
+        """Filter for Transactions that have no TransactionItem rows"""
+        return Q(~Exists(TransactionItem.objects.filter(transaction=OuterRef('pk'))))
+
+    @staticmethod
+    def sales_margin(month_start, today):
+        """Month-to-date revenue excluding reseller markup and its cost of goods.
+
+        One query over items and one over the single-product sales that have none.
+        """
+        start, end = ExportService.day_start(month_start), ExportService.day_start(today + timedelta(days=1))
+        items = TransactionItem.objects.filter(
+            transaction__status__in=SALE_STATUSES,
+            transaction__timestamp__gte=start,
+            transaction__timestamp__lt=end
+        ).aggregate(
+            revenue=Sum(ReportEngine.line_revenue()),
+            cost_of_goods=Sum(ReportEngine.line_cost()),
+        )
+        single_product = Transaction.objects.filter(
+            ReportEngine.without_items(), status__in=SALE_STATUSES, timestamp__gte=start, timestamp__lt=end
+        ).aggregate(
+            revenue=Sum(ReportEngine.sale_revenue()),
+            cost_of_goods=Sum(ReportEngine.line_cost()),
+        )
+        return tuple(
+            (items[key] or Decimal('0')) + (single_product[key] or Decimal('0')) for key in ('revenue', 'cost_of_goods')
+        )
+
+
+class DashboardService:
+    """Dashboard counters served from the Django cache.
+
+    The snapshot is computed once and reused until a write to one of the
+    counted tables invalidates it, so steady-state polling never reaches
+    the database. The ETag lets unchanged polls be answered with a 304.
+    Invalidation only reaches every worker when the cache is shared between
+    them, which is why settings_production requires Redis; the development
+    LocMemCache is private to one process.
+    """
+    CACHE_KEY = 'dashboard:snapshot'
+    # Upper bound on staleness should an invalidation ever be missed
+    CACHE_TIMEOUT = 300
+
+    @staticmethod
+    def snapshot():
+        """Return (data, etag) for today's dashboard"""
+        today = timezone.localdate()
+        cached = cache.get(DashboardService.CACHE_KEY)
+        if cached and cached['date'] == today:
+            return cached['data'], cached['etag']
+
+        data = DashboardService.compute(today)
+        digest = hashlib.sha256(json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()).hexdigest()
+        etag = f'"{digest[:32]}"'
+        cache.set(DashboardService.CACHE_KEY, {'date': today, 'data': data, 'etag': etag}, DashboardService.CACHE_TIMEOUT)
+        return data, etag
+
+    @staticmethod
+    def compute(today):
+        today_sales = ExportService.date_bounded(
+            Transaction.objects.filter(status__in=SALE_STATUSES), 'timestamp', today, today
+        ).aggregate(total=Sum('total_amount'), count=Count('id'))
+        return {
+            'today_sales': today_sales,
+            'low_stock_count': Product.objects.filter(stock_quantity__lte=F('low_stock_threshold')).count(),
+            'pending_invoices': Invoice.objects.filter(status='PENDING').count(),
+            'customers_with_balance': Customer.objects.filter(outstanding_balance__gt=0).count(),
+            'unread_notifications': Notification.objects.filter(is_read=False).count(),
+            'pending_collections': PaymentCollection.objects.filter(status='PENDING').count(),
+        }
+
+    @staticmethod
+    def invalidate():
+        """Drop the snapshot once the current transaction commits"""
+        transaction.on_commit(lambda: cache.delete(DashboardService.CACHE_KEY))
+
+
+class NotificationBroker:
+    """In-process pub/sub that wakes notification streams when notifications change.
+
+    Streams in this worker wake at once through a Condition. Streams in
+    other workers notice the version counter in the shared cache on their
+    next check, without querying the database until something changed.
+    When the cache is private to each process (LocMemCache, DummyCache) the
+    counter cannot cross workers, so the version is read from the
+    notifications table instead, at two indexed queries per check.
+    """
+    VERSION_KEY = 'notifications:version'
+    # How often a waiting stream looks for changes made by other workers
+    CHECK_INTERVAL = 2
+    _condition = threading.Condition()
+    # Bumped under _condition by every local notify, so a wait cannot miss one that
+    # lands between reading the version and going to sleep
+    _wakeups = 0
+
+    @staticmethod
+    def publish():
+        """Wake streams once the current transaction commits"""
+        transaction.on_commit(NotificationBroker._notify)
+
+    @staticmethod
+    def shared():
+        """Whether the cache counter is visible to every worker"""
+        from django.core.cache import caches
+        from django.core.cache.backends.dummy import DummyCache
+        from django.core.cache.backends.locmem import LocMemCache
+
+        return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+    @staticmethod
+    def version():
+        if NotificationBroker.shared():
+            return cache.get(NotificationBroker.VERSION_KEY, 0)
+        # Everything a stream sends moves one of these: new rows raise the
+        # last id, reads lower the unread count
+        return (
+            Notification.objects.aggregate(last=Max('id'))['last'],
+            Notification.objects.filter(is_read=False).count(),
+        )
+
+    @staticmethod
+    def wait(seen, timeout):
+        """Block until the version moves past seen or timeout expires; returns the current version"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with NotificationBroker._condition:
+                wakeups = NotificationBroker._wakeups
+            # Read outside the lock: a slow cache or database must not hold up other streams
+            current = NotificationBroker.version()
+            remaining = deadline - time.monotonic()
+            if current != seen or remaining <= 0:
+                return current
+            with NotificationBroker._condition:
+                if NotificationBroker._wakeups == wakeups:
+                    NotificationBroker._condition.wait(min(remaining, NotificationBroker.CHECK_INTERVAL))
+
+    @staticmethod
+    def _notify():
+        try:
+            cache.incr(NotificationBroker.VERSION_KEY)
+        except ValueError:
+            cache.set(NotificationBroker.VERSION_KEY, 1, None)
+        with NotificationBroker._condition:
+            NotificationBroker._wakeups += 1
+            NotificationBroker._condition.notify_all()
+
+
+class StreamSlot:
+    """Iterates a stream and calls release once when closed, even if it never started"""
+
+    def __init__(self, events, release):
+        self.events = events
+        self.release = release
+        self.released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.events)
+
+    def close(self):
+        self.events.close()
+        if not self.released:
+            self.released = True
+            self.release()
+
+
+class NotificationService:
+    # Backlog sent per query when a client resumes far behind
+    STREAM_BATCH = 100
+    # Days each notification type is kept; None keeps it forever.
+    # Override per type with the NOTIFICATION_RETENTION_DAYS setting.
+    RETENTION_DAYS = {
+        'GENERAL': 30,
+        'STOCK_ALERT': 30,
+        'LOW_STOCK': 30,
+        'PAYMENT_DUE': 90,
+    }
+    # Rows removed per DELETE when purging
+    PURGE_BATCH = 1000
+    # Streams open in this worker; each one holds a server thread until it ends
+    _open_streams = 0
+    _streams_lock = threading.Lock()
+
+    @staticmethod
+    def open_stream(last_event_id=None):
+        """Claim a stream slot in this worker and return the events, or None when every slot is taken.
+
+        NOTIFICATION_STREAM_MAX_PER_WORKER keeps streams below the worker's
+        thread count so the remaining threads stay free for API requests.
+        The slot is given back when the response is closed.
+        """
+        with NotificationService._streams_lock:
+            if NotificationService._open_streams >= getattr(settings, 'NOTIFICATION_STREAM_MAX_PER_WORKER', 8):
+                return None
+            NotificationService._open_streams += 1
+        return StreamSlot(NotificationService.stream(last_event_id), NotificationService._release_stream)
+
+    @staticmethod
+    def _release_stream():
+        with NotificationService._streams_lock:
+            NotificationService._open_streams -= 1
+
+    @staticmethod
+    def stream(last_event_id=None):
+        """Yield Server-Sent Events for new notifications and unread count changes.
+
+        Notification ids are the event ids, so a client that reconnects with
+        Last-Event-ID gets everything it missed. Without one the stream starts
+        at the newest notification. While nothing changes only keepalive
+        comments are sent; the stream ends after NOTIFICATION_STREAM_MAX_SECONDS
+        and EventSource reconnects on its own.
+        """
+        heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+        deadline = time.monotonic() + getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300)
+
+        yield 'retry: 3000\n\n'
+        # Read the version before the rows, so a change in between wakes the next wait
+        version = NotificationBroker.version()
+        if last_event_id is None:
+            last_event_id = Notification.objects.aggregate(last=Max('id'))['last'] or 0
+        unread = None
+
+        while True:
+            notifications = list(Notification.objects.filter(id__gt=last_event_id).order_by('id')[:NotificationService.STREAM_BATCH])
+            for notification in notifications:
+                last_event_id = notification.id
+                yield NotificationService.event('notification', NotificationSerializer(notification).data, notification.id)
+            count = Notification.objects.filter(is_read=False).count()
+            if count != unread:
+                unread = count
+                yield NotificationService.event('unread', {'unread': count})
+            if len(notifications) == NotificationService.STREAM_BATCH:
+                continue
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                current = NotificationBroker.wait(version, min(heartbeat, remaining))
+                if current != version:
+                    version = current
+                    break
+                # A comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+
+    @staticmethod
+    def event(name, data, event_id=None):
+        lines = [f'event: {name}']
+        if event_id is not None:
+            lines.append(f'id: {event_id}')
+        lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder)}')
+        return '\n'.join(lines) + '\n\n'
+
+    @staticmethod
+    def expired(now=None):
+        """Notifications past their type's retention period"""
+        now = now or timezone.now()
+        retention = {**NotificationService.RETENTION_DAYS, **getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {})}
+        conditions = [
+            Q(notification_type=notification_type, timestamp__lt=now - timedelta(days=days))
+            for notification_type, days in retention.items() if days is not None
+        ]
+        if not conditions:
+            return Notification.objects.none()
+        condition = conditions[0]
+        for other in conditions[1:]:
+            condition |= other
+        # An open low stock alert stays until the stock recovers, however old it is
+        return Notification.objects.filter(condition).exclude(notification_type='LOW_STOCK', resolved_at__isnull=True)
+
+    @staticmethod
+    def purge(now=None, archive=None, batch_size=None):
+        """Delete expired notifications, archiving their per-day counts unless disabled"""
+        if archive is None:
+            archive = getattr(settings, 'NOTIFICATION_ARCHIVE', True)
+        return NotificationService.delete(NotificationService.expired(now), archive=archive, batch_size=batch_size)
+
+    @staticmethod
+    def delete(queryset, archive=False, batch_size=None):
+        """Delete the notifications in queryset in primary key chunks; returns the number deleted.
+
+        Each chunk is one range DELETE on the primary key, so no rows are
+        loaded into Python and no transaction holds the table for long.
+        Nothing references a notification, so skipping the ORM collector
+        loses no cascades; the receivers it would have fired are replaced
+        by one publish and one dashboard invalidation at the end.
+        """
+        batch_size = batch_size or NotificationService.PURGE_BATCH
+        deleted = 0
+        last_id = 0
+        while True:
+            ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            chunk = queryset.filter(id__gt=last_id, id__lte=ids[-1]).order_by()
+            last_id = ids[-1]
+            with transaction.atomic():
+                if archive:
+                    NotificationService.archive(chunk)
+                # Private, but safe while nothing references a notification
+                # (pinned by NotificationRetentionTests)
+                deleted += chunk._raw_delete(chunk.db)
+
+        if deleted:
+            NotificationBroker.publish()
+            DashboardService.invalidate()
+        return deleted
+
+    @staticmethod
+    def archive(queryset):
+        """Add the notifications in queryset to the per-day counts"""
+        counts = {
+            (row['day'], row['notification_type']): row['count']
+            for row in queryset.annotate(day=TruncDate('timestamp')).values('day', 'notification_type').annotate(count=Count('id'))
+        }
+        if not counts:
+            return
+        existing = dict(
+            ((row.date, row.notification_type), row.count)
+            for row in NotificationArchive.objects.filter(date__in={day for day, _ in counts})
+        )
+        NotificationArchive.objects.bulk_create(
+            [
+                NotificationArchive(date=day, notification_type=notification_type, count=existing.get((day, notification_type), 0) + count)
+                for (day, notification_type), count in counts.items()
+            ],
+            update_conflicts=True, unique_fields=['date', 'notification_type'], update_fields=['count']
+        )
+
+
 class EmailService:
     @staticmethod
     def send_scheduled_report(schedule_id):
@@ -252,4 +922,854 @@ class EmailService:
             
         except Exception as e:
             print(f"Error sending scheduled report: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+class RollupService:
+    """Keep DailySummary rows current as sales, payments, expenses and losses are posted.
+
+    New rows add their contribution to their business-local day with F()
+    upserts in the same transaction. Edits and deletes recompute the affected
+    day, and rebuild() recomputes any date range with one grouped query per
+    source table.
+    """
+    STATUS_COUNTS = {
+        'RECEIVED': 'products_received',
+        'SOLD': 'products_sold',
+        'PAID_TO_COLLECT': 'products_to_collect',
+        'COLLECTED_TO_PAY': 'products_to_pay',
+    }
+    PAYMENT_METHODS = {
+        'CASH': 'cash_sales',
+        'CARD': 'card_sales',
+        'ECOCASH': 'ecocash_sales',
+    }
+    FIELDS = [
+        'total_transactions', 'total_sales_amount', 'total_tax_amount', 'cash_sales', 'card_sales', 'ecocash_sales',
+        'products_received', 'products_sold', 'products_to_collect', 'products_to_pay', 'total_expenses',
+        'total_losses', 'sales_revenue', 'cost_of_goods_sold', 'gross_profit', 'net_profit', 'new_customers', 'payments_received',
+    ]
+
+    @staticmethod
+    def record_sales(prepared):
+        """Add freshly posted (sale, lines) pairs to their days"""
+        days = defaultdict(lambda: defaultdict(Decimal))
+        for sale, lines in prepared:
+            deltas = days[timezone.localdate(sale.timestamp)]
+            if sale.status in RollupService.STATUS_COUNTS:
+                deltas[RollupService.STATUS_COUNTS[sale.status]] += 1
+            if sale.status in SALE_STATUSES:
+                # Mirrors ReportEngine.line_revenue(), sale_revenue() and line_cost() for rows not yet aggregated in SQL
+                if lines:
+                    revenue = sum((
+                        (product.default_sale_price if sale.reseller_id else unit_price) * quantity
+                        for product, quantity, unit_price in lines
+                    ), Decimal('0'))
+                    cost = sum((product.cost_price_avg * quantity for product, quantity, _ in lines), Decimal('0'))
+                elif sale.product:
+                    revenue = sale.product.default_sale_price * sale.quantity if sale.reseller_id else sale.total_amount
+                    cost = sale.product.cost_price_avg * sale.quantity
+                else:
+                    revenue, cost = sale.total_amount, Decimal('0')
+                margin = revenue - cost
+                deltas['total_transactions'] += 1
+                deltas['total_sales_amount'] += sale.total_amount
+                deltas['total_tax_amount'] += sale.tax_amount
+                deltas['sales_revenue'] += revenue
+                deltas['cost_of_goods_sold'] += cost
+                deltas['gross_profit'] += margin
+                deltas['net_profit'] += margin
+        for day, deltas in days.items():
+            DailySummary.objects.add(day, **deltas)
+
+    @staticmethod
+    def record_payment(payment):
+        deltas = {}
+        if payment.payment_method in RollupService.PAYMENT_METHODS:
+            deltas[RollupService.PAYMENT_METHODS[payment.payment_method]] = payment.amount
+        if payment.customer_id:
+            deltas['payments_received'] = payment.amount
+        DailySummary.objects.add(timezone.localdate(payment.date), **deltas)
+
+    @staticmethod
+    def record_expense(expense):
+        DailySummary.objects.add(timezone.localdate(expense.date), total_expenses=expense.amount, net_profit=-expense.amount)
+
+    @staticmethod
+    def record_loss(loss):
+        DailySummary.objects.add(
+            timezone.localdate(loss.date), total_losses=loss.total_loss_amount, net_profit=-loss.total_loss_amount
+        )
+
+    @staticmethod
+    def record_customer(customer):
+        DailySummary.objects.add(timezone.localdate(customer.date_created), new_customers=1)
+
+    @staticmethod
+    def refresh_day(moment):
+        """Recompute the day containing the given datetime after an edit or delete"""
+        day = timezone.localdate(moment)
+        RollupService.rebuild(day, day)
+
+    @staticmethod
+    def rebuild(start, end):
+        """Recompute DailySummary rows for every day in [start, end]; returns the number of days written"""
+        def grouped(queryset, date_field, **aggregates):
+            rows = (
+                ExportService.date_bounded(queryset, date_field, start, end)
+                .annotate(day=TruncDate(date_field))
+                .order_by()
+                .values('day')
+                .annotate(**aggregates)
+            )
+            for row in rows:
+                metrics = days.setdefault(row.pop('day'), dict.fromkeys(RollupService.FIELDS, 0))
+                for field, value in row.items():
+                    metrics[field] += value or 0
+
+        days = {}
+        sale = Q(status__in=SALE_STATUSES)
+        single_product_sale = sale & ReportEngine.without_items()
+        grouped(
+            Transaction.objects.all(), 'timestamp',
+            total_transactions=Count('id', filter=sale),
+            total_sales_amount=Sum('total_amount', filter=sale),
+            total_tax_amount=Sum('tax_amount', filter=sale),
+            sales_revenue=Sum(ReportEngine.sale_revenue(), filter=single_product_sale),
+            cost_of_goods_sold=Sum(ReportEngine.line_cost(), filter=single_product_sale),
+            **{field: Count('id', filter=Q(status=status)) for status, field in RollupService.STATUS_COUNTS.items()}
+        )
+        grouped(
+            TransactionItem.objects.filter(transaction__status__in=SALE_STATUSES), 'transaction__timestamp',
+            sales_revenue=Sum(ReportEngine.line_revenue()),
+            cost_of_goods_sold=Sum(ReportEngine.line_cost())
+        )
+        grouped(
+            Payment.objects.all(), 'date',
+            payments_received=Sum('amount', filter=Q(customer__isnull=False)),
+            **{field: Sum('amount', filter=Q(payment_method=method)) for method, field in RollupService.PAYMENT_METHODS.items()}
+        )
+        grouped(Expense.objects.all(), 'date', total_expenses=Sum('amount'))
+        grouped(Loss.objects.all(), 'date', total_losses=Sum('total_loss_amount'))
+        grouped(Customer.objects.all(), 'date_created', new_customers=Count('id'))
+
+        # Days that no longer have any activity are reset rather than left stale
+        for day in DailySummary.objects.filter(date__range=[start, end]).values_list('date', flat=True):
+            days.setdefault(day, dict.fromkeys(RollupService.FIELDS, 0))
+
+        summaries = []
+        for day, metrics in days.items():
+            metrics['gross_profit'] = metrics['sales_revenue'] - metrics['cost_of_goods_sold']
+            metrics['net_profit'] = metrics['gross_profit'] - metrics['total_expenses'] - metrics['total_losses']
+            summaries.append(DailySummary(date=day, **metrics))
+        DailySummary.objects.bulk_create(
+            summaries, update_conflicts=True, unique_fields=['date'], update_fields=RollupService.FIELDS + ['updated_at']
+        )
+        return len(summaries)
+
+
+class ProductLookupService:
+    """Exact barcode / product code lookups through a per-worker LRU cache.
+
+    Scans resolve the same few thousand codes all day, so each worker keeps
+    the serialized product (or the fact that a code is unknown) in memory.
+    Product writes drop the affected codes once committed; the TTL bounds
+    how long another worker can serve details that were changed elsewhere.
+    Stock moves with every sale in every worker, so it is never served from
+    memory: cached hits get stock_quantity from one primary key query.
+    """
+    # {code: (product data or None, stored_at)}, least recently used first
+    _entries = OrderedDict()
+    # {product id: codes cached for it}, so a product write can find codes it no longer has
+    _codes_by_product = defaultdict(set)
+    # Bumped by every eviction so a lookup racing a write does not store what it read before the write
+    _generation = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def resolve(codes):
+        """Return {code: product data or None} for the given codes with live stock.
+
+        Cache hits cost one query for their stock; misses one query for the products.
+        """
+        max_size = getattr(settings, 'PRODUCT_LOOKUP_CACHE_SIZE', 4096)
+        ttl = getattr(settings, 'PRODUCT_LOOKUP_CACHE_TTL', 60)
+        now = time.monotonic()
+        results, misses = {}, []
+        with ProductLookupService._lock:
+            generation = ProductLookupService._generation
+            for code in codes:
+                entry = ProductLookupService._entries.get(code)
+                if entry and now - entry[1] < ttl:
+                    ProductLookupService._entries.move_to_end(code)
+                    results[code] = entry[0]
+                else:
+                    misses.append(code)
+
+        cached_ids = {data['id'] for data in results.values() if data}
+        if cached_ids:
+            stock = dict(Product.objects.filter(pk__in=cached_ids).values_list('id', 'stock_quantity'))
+            for code, data in results.items():
+                if data:
+                    # A product deleted in another worker is gone, not stale
+                    results[code] = {**data, 'stock_quantity': stock[data['id']]} if data['id'] in stock else None
+        if not misses:
+            return results
+
+        # Barcodes win over product codes when a value is both
+        found = {}
+        products = Product.objects.select_related('category').filter(
+            Q(barcode__in=misses) | Q(product_unique_code__in=misses)
+        )
+        for product in products:
+            data = ProductSerializer(product).data
+            if product.product_unique_code in misses:
+                found.setdefault(product.product_unique_code, (product.pk, data))
+            if product.barcode in misses:
+                found[product.barcode] = (product.pk, data)
+
+        with ProductLookupService._lock:
+            for code in misses:
+                product_id, data = found.get(code, (None, None))
+                results[code] = data
+                if generation != ProductLookupService._generation:
+                    continue
+                ProductLookupService._entries[code] = (data, now)
+                ProductLookupService._entries.move_to_end(code)
+                if product_id:
+                    ProductLookupService._codes_by_product[product_id].add(code)
+            while len(ProductLookupService._entries) > max_size:
+                ProductLookupService._entries.popitem(last=False)
+        return results
+
+    @staticmethod
+    def invalidate_product(product):
+        """Drop a saved or deleted product's codes, including ones it no longer has"""
+        codes = {product.barcode, product.product_unique_code} - {None, ''}
+        transaction.on_commit(lambda: ProductLookupService._evict(codes, [product.pk]))
+
+    @staticmethod
+    def clear():
+        with ProductLookupService._lock:
+            ProductLookupService._entries.clear()
+            ProductLookupService._codes_by_product.clear()
+
+    @staticmethod
+    def _evict(codes, product_ids):
+        with ProductLookupService._lock:
+            ProductLookupService._generation += 1
+            codes = set(codes)
+            for product_id in product_ids:
+                codes |= ProductLookupService._codes_by_product.pop(product_id, set())
+            for code in codes:
+                ProductLookupService._entries.pop(code, None)
+
+
+class CatalogService:
+    """Versioned product catalog for till sync.
+
+    Every product or category metadata write stamps the row with the next
+    value of the catalog sequence. The sequence row stays locked until the
+    writing transaction commits, so versions become visible in order and
+    "everything after version N" never skips a row. Stock movements do not
+    take a version: that would put every sale behind the same row lock.
+    stock_quantity in a sync is the level at sync time; tills read live
+    stock from the scan endpoint.
+    """
+    SEQUENCE = 'catalog'
+    PRODUCT_COLUMNS = [
+        'id', 'name', 'product_unique_code', 'barcode', 'category_id', 'unit',
+        'default_sale_price', 'tax_group', 'stock_quantity',
+    ]
+    CATEGORY_COLUMNS = ['id', 'name']
+
+    @staticmethod
+    def next_version():
+        return Sequence.objects.allocate(CatalogService.SEQUENCE)
+
+    @staticmethod
+    def current_version():
+        return Sequence.objects.filter(name=CatalogService.SEQUENCE).values_list('last_value', flat=True).first() or 0
+
+    @staticmethod
+    def snapshot():
+        """Every active product and category as of the returned version"""
+        # Read the version first: rows written meanwhile are simply sent again next sync
+        version = CatalogService.current_version()
+        return {
+            'version': version,
+            'full': True,
+            'categories': CatalogService.rows(Category.objects.filter(is_active=True), CatalogService.CATEGORY_COLUMNS),
+            'products': CatalogService.rows(Product.objects.filter(is_active=True), CatalogService.PRODUCT_COLUMNS),
+        }
+
+    @staticmethod
+    def changes(since):
+        """Rows written after version since; deactivated and deleted rows are listed as removed"""
+        version = CatalogService.current_version()
+        products = Product.objects.filter(catalog_version__gt=since)
+        categories = Category.objects.filter(catalog_version__gt=since)
+        tombstones = defaultdict(list)
+        for kind, object_id in CatalogTombstone.objects.filter(catalog_version__gt=since).values_list('kind', 'object_id'):
+            tombstones[kind].append(object_id)
+        return {
+            'version': version,
+            'full': False,
+            'categories': CatalogService.rows(categories.filter(is_active=True), CatalogService.CATEGORY_COLUMNS),
+            'products': CatalogService.rows(products.filter(is_active=True), CatalogService.PRODUCT_COLUMNS),
+            'removed_categories': list(categories.filter(is_active=False).values_list('id', flat=True)) + tombstones['CATEGORY'],
+            'removed_products': list(products.filter(is_active=False).values_list('id', flat=True)) + tombstones['PRODUCT'],
+        }
+
+    @staticmethod
+    def rows(queryset, columns):
+        # Column names once plus positional rows keeps a 20k-product snapshot small
+        return {'columns': columns, 'rows': list(queryset.order_by('id').values_list(*columns))}
+
+    @staticmethod
+    def encode(payload):
+        """Gzipped JSON body; snapshots are cached per version since every till asks for the same one"""
+        key = f"catalog:snapshot:{payload['version']}" if payload['full'] else None
+        body = cache.get(key) if key else None
+        if body is None:
+            body = gzip.compress(json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode(), compresslevel=6)
+            if key:
+                cache.set(key, body, 3600)
+        return body
+
+
+class InventoryService:
+    """Keep Product.stock_quantity in step with the StockMovement ledger.
+
+    The ledger is the source of truth. Movement quantities are unsigned and
+    the movement type gives the direction. Every write that adds, edits or
+    removes movements applies the net change with F() in the same database
+    transaction, so concurrent tills never overwrite each other.
+    """
+    IN_TYPES = ['RECEIPT', 'ADJUSTMENT_IN', 'RETURN_IN']
+    OUT_TYPES = ['SALE', 'ADJUSTMENT_OUT', 'RETURN_OUT']
+    # Products waiting for a low stock check, per thread
+    _low_stock_local = threading.local()
+
+    @staticmethod
+    def signed_quantity(movement):
+        if movement.movement_type in InventoryService.IN_TYPES:
+            return movement.quantity
+        if movement.movement_type in InventoryService.OUT_TYPES:
+            return -movement.quantity
+        return 0
+
+    @staticmethod
+    def ledger_delta():
+        """Signed quantity of a StockMovement row as a database expression"""
+        return Case(
+            When(movement_type__in=InventoryService.IN_TYPES, then=F('quantity')),
+            When(movement_type__in=InventoryService.OUT_TYPES, then=-F('quantity')),
+            default=Value(0),
+            output_field=IntegerField()
+        )
+
+    @staticmethod
+    def ledger_quantity():
+        """On-hand quantity of the outer Product according to the ledger"""
+        ledger = (
+            StockMovement.objects.filter(product=OuterRef('pk'))
+            .order_by()
+            .values('product')
+            .annotate(on_hand=Sum(InventoryService.ledger_delta()))
+            .values('on_hand')
+        )
+        return Coalesce(Subquery(ledger), Value(0), output_field=IntegerField())
+
+    @staticmethod
+    def post_movements(movements):
+        """Insert new movements and apply them to stock; returns the movements"""
+        # No savepoint: callers already inside a transaction roll back as a whole
+        with transaction.atomic(savepoint=False):
+            StockMovement.objects.bulk_create(movements)
+            InventoryService.apply(movements)
+        return movements
+
+    @staticmethod
+    def apply(movements, reverse=False):
+        """Apply saved movements to stock, or take them back out with reverse=True"""
+        sign = -1 if reverse else 1
+        deltas = defaultdict(int)
+        for movement in movements:
+            if movement.product_id:
+                deltas[movement.product_id] += sign * InventoryService.signed_quantity(movement)
+        InventoryService.apply_deltas(deltas)
+
+    @staticmethod
+    def apply_deltas(deltas):
+        """Add {product_id: signed quantity} to stock in one UPDATE"""
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        Product.objects.filter(pk__in=deltas).update(
+            stock_quantity=F('stock_quantity') + Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        )
+        DashboardService.invalidate()
+
+        # Falling stock may raise an alert and rising stock may resolve one
+        InventoryService.schedule_low_stock_check(deltas)
+
+    @staticmethod
+    def schedule_low_stock_check(product_ids):
+        """Evaluate these products once the current transaction commits.
+
+        Everything touched by the transaction (or request, outside one) is
+        collected per thread and checked together by the first callback
+        that runs; the rest find nothing left to do.
+        """
+        pending = InventoryService._pending_low_stock()
+        pending.update(product_ids)
+        transaction.on_commit(InventoryService.flush_low_stock_checks)
+
+    @staticmethod
+    def flush_low_stock_checks():
+        pending = InventoryService._pending_low_stock()
+        if pending:
+            product_ids = list(pending)
+            pending.clear()
+            InventoryService.check_low_stock(product_ids)
+
+    @staticmethod
+    def _pending_low_stock():
+        if not hasattr(InventoryService._low_stock_local, 'pending'):
+            InventoryService._low_stock_local.pending = set()
+        return InventoryService._low_stock_local.pending
+
+    @staticmethod
+    def check_low_stock(product_ids=None):
+        """Raise and resolve low stock alerts for the given products (all active ones by default).
+
+        One query finds the products whose alert state is wrong: low without
+        an open alert, or recovered with one. Writes only happen for those.
+        The one_open_low_stock_alert constraint keeps a product to a single
+        open alert, so concurrent checks cannot duplicate it. Returns the
+        number of alerts raised.
+        """
+        products = Product.objects.filter(is_active=True)
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        open_alerts = Notification.objects.filter(notification_type='LOW_STOCK', resolved_at__isnull=True)
+        is_low = Q(stock_quantity__lte=F('low_stock_threshold'))
+
+        stale = products.annotate(
+            has_alert=Exists(open_alerts.filter(related_product=OuterRef('pk')))
+        ).filter((is_low & Q(has_alert=False)) | (~is_low & Q(has_alert=True))).values_list(
+            'id', 'name', 'stock_quantity', 'low_stock_threshold', 'has_alert'
+        )
+
+        alerts, recovered = [], []
+        for pk, name, stock, threshold, has_alert in stale:
+            if has_alert:
+                recovered.append(pk)
+            else:
+                alerts.append(Notification(
+                    message=f"⚠️ Low Stock Alert: {name} has only {stock} units remaining (reorder at {threshold})",
+                    notification_type='LOW_STOCK',
+                    related_product_id=pk
+                ))
+        if recovered:
+            open_alerts.filter(related_product__in=recovered).update(resolved_at=timezone.now())
+        if alerts:
+            Notification.objects.bulk_create(alerts, ignore_conflicts=True)
+        if alerts or recovered:
+            DashboardService.invalidate()
+        if alerts:
+            NotificationBroker.publish()
+        return len(alerts)
+
+    @staticmethod
+    def record_opening_balance(product, user=None):
+        """Record the stock a product was created with without applying it again"""
+        if not product.stock_quantity:
+            return None
+        movement = StockMovement(
+            movement_type='ADJUSTMENT_IN' if product.stock_quantity > 0 else 'ADJUSTMENT_OUT',
+            product=product,
+            quantity=abs(product.stock_quantity),
+            unit_cost=product.cost_price_avg,
+            reference_doc_type='OPENING',
+            reason='OPENING',
+            notes='Opening balance',
+            performed_by=user
+        )
+        StockMovement.objects.bulk_create([movement])
+        return movement
+
+    @staticmethod
+    def check_drift():
+        """Products whose stock_quantity disagrees with the ledger, in one query"""
+        return (
+            Product.objects.annotate(ledger_quantity=InventoryService.ledger_quantity())
+            .exclude(stock_quantity=F('ledger_quantity'))
+            .annotate(drift=F('stock_quantity') - F('ledger_quantity'))
+            .order_by('id')
+        )
+
+    @staticmethod
+    def rebuild_stock():
+        """Recompute every product's stock_quantity from the ledger; returns the number corrected"""
+        with transaction.atomic():
+            corrected = InventoryService.check_drift().count()
+            Product.objects.update(stock_quantity=InventoryService.ledger_quantity())
+            DashboardService.invalidate()
+            transaction.on_commit(ProductLookupService.clear)
+        return corrected
+
+
+class SalePostingService:
+    """Compute and write every side effect of a sale in one pass.
+
+    Items, stock movements, receipts and reseller balances are written
+    in bulk inside the caller's transaction. Payment collections and low
+    stock alerts are deferred with transaction.on_commit, so they only
+    happen for sales that were committed.
+    """
+
+    @staticmethod
+    def post_new_sales(prepared, user):
+        """Insert and post unsaved sales.
+
+        prepared is a list of (unsaved Transaction, lines) pairs whose amounts
+        are already calculated, where lines are (product, quantity, unit_price)
+        tuples. No signals are sent. Returns (sale, receipt) pairs; receipt is
+        None for non-sales.
+        """
+        Transaction.objects.bulk_create([sale for sale, _ in prepared])
+        return SalePostingService._post(prepared, user, create_receipts=True)
+
+    @staticmethod
+    def post_saved_sale(sale):
+        """Post a sale that was saved through Transaction.save() (admin, scripts).
+
+        Such a sale has no items yet, so only its single product is posted,
+        and no receipt is issued.
+        """
+        user = sale.sale_by or User.objects.filter(is_superuser=True).first()
+        SalePostingService._post([(sale, [])], user, create_receipts=False)
+
+    @staticmethod
+    def _post(prepared, user, create_receipts):
+        today = datetime.now().date()
+        items, movements, receipts, collections = [], [], {}, []
+        commissions = defaultdict(Decimal)
+
+        for sale, lines in prepared:
+            sold = sale.status in SALE_STATUSES
+            stock_lines = [(product, quantity) for product, quantity, _ in lines]
+            if lines:
+                items.extend(
+                    TransactionItem(
+                        transaction=sale,
+                        product=product,
+                        quantity=quantity,
+                        unit_price=unit_price,
+                        total_price=unit_price * quantity
+                    )
+                    for product, quantity, unit_price in lines
+                )
+            elif not lines and sale.product:
+                stock_lines = [(sale.product, sale.quantity)]
+
+            product_names = "; ".join(f"{product.name} (x{quantity})" for product, quantity in stock_lines) or "No Product"
+
+            if sold:
+                for product, quantity in stock_lines:
+                    movements.append(SalePostingService.sale_movement(sale, product, quantity, user))
+
+                if create_receipts:
+                    receipts[sale.id] = Receipt(
+                        transaction=sale,
+                        customer=sale.customer,
+                        total_amount=sale.total_amount,
+                        tax_amount=sale.tax_amount,
+                        payment_method=sale.payment_method,
+                        printed_by=user,
+                        zimra_receipt_no=sale.zimra_receipt_no
+                    )
+
+            if sale.total_amount > 0 and sale.status == 'PAID_TO_COLLECT':
+                collections.append(PaymentCollection(
+                    collection_type='ITEM_TO_COLLECT',
+                    customer=sale.customer,
+                    transaction=sale,
+                    amount=sale.total_amount,
+                    due_date=today + timedelta(days=7),
+                    description=f"Item to collect: {product_names}",
+                    created_by=user
+                ))
+            elif sale.total_amount > 0 and sale.status == 'COLLECTED_TO_PAY':
+                collections.append(PaymentCollection(
+                    collection_type='CUSTOMER_DEBT',
+                    customer=sale.customer,
+                    transaction=sale,
+                    amount=sale.total_amount,
+                    due_date=today + timedelta(days=30),
+                    description=f"Payment due for: {product_names}",
+                    created_by=user
+                ))
+
+            if sale.reseller and sold and sale.total_amount > 0:
+                commission = Decimal(sale.reseller_balance)
+                if commission > 0:
+                    commissions[sale.reseller.id] += commission
+                    collections.append(PaymentCollection(
+                        collection_type='RESELLER_PAYMENT',
+                        reseller=sale.reseller,
+                        transaction=sale,
+                        amount=commission,
+                        due_date=today + timedelta(days=sale.reseller.payment_terms_days),
+                        description=f"Commission for sale: {product_names}",
+                        created_by=user
+                    ))
+
+        TransactionItem.objects.bulk_create(items)
+        InventoryService.post_movements(movements)
+
+        if receipts:
+            # bulk_create skips the numbering signal, so reserve one block of numbers
+            prefix = Receipt.receipt_prefix()
+            first = Sequence.objects.allocate(prefix, len(receipts))
+            for number, receipt in enumerate(receipts.values(), first):
+                receipt.receipt_number = f"{prefix}-{number:04d}"
+            Receipt.objects.bulk_create(receipts.values())
+
+        if commissions:
+            Reseller.objects.filter(pk__in=commissions).update(
+                current_balance=F('current_balance') + Case(
+                    *[When(pk=pk, then=Value(amount)) for pk, amount in commissions.items()],
+                    default=Value(Decimal('0')),
+                    output_field=DecimalField(max_digits=10, decimal_places=2)
+                )
+            )
+
+        RollupService.record_sales(prepared)
+
+        if collections:
+            transaction.on_commit(lambda: PaymentCollection.objects.bulk_create(collections))
+        # Registered after the collections so the snapshot is dropped once they exist
+        DashboardService.invalidate()
+
+        return [(sale, receipts.get(sale.id)) for sale, _ in prepared]
+
+    @staticmethod
+    def sale_movement(sale, product, quantity, user):
+        return StockMovement(
+            movement_type='SALE',
+            product=product,
+            quantity=quantity,
+            unit_cost=product.cost_price_avg,
+            reference_doc_type='TRANSACTION',
+            reference_doc_id=sale.id,
+            reason='SALE',
+            notes=f'Sale transaction {sale.id}',
+            performed_by=user
+        )
+
+
+class CheckoutService:
+    BATCH_SCOPE = 'transactions-batch'
+    BATCH_CHUNK_SIZE = 200
+    BATCH_MAX_SALES = 5000
+
+    @staticmethod
+    def resolve_lines(items_data):
+        """Resolve basket lines against a single product query.
+
+        Lines are validated with the same rules as batch ingestion. Returns a
+        list of (product, quantity, unit_price) tuples and the basket total.
+        """
+        serializer = BatchSaleItemSerializer(data=items_data, many=True)
+        if not serializer.is_valid():
+            raise ValidationError({'items': serializer.errors})
+        items_data = serializer.validated_data
+
+        product_ids = {item_data['product'] for item_data in items_data}
+        products = Product.objects.in_bulk(product_ids)
+        missing = sorted(product_ids - set(products))
+        if missing:
+            raise ValidationError({'items': [f"Product {pk} does not exist" for pk in missing]})
+
+        lines = []
+        total_amount = Decimal('0')
+        for item_data in items_data:
+            product = products[item_data['product']]
+            quantity = item_data['quantity']
+            unit_price = item_data.get('unit_price', product.default_sale_price)
+            lines.append((product, quantity, unit_price))
+            total_amount += unit_price * quantity
+        return lines, total_amount
+
+    @staticmethod
+    def checkout(validated_data, items_data, user):
+        """Create and post one sale from validated TransactionSerializer data and raw basket lines.
+
+        The caller is expected to wrap this in transaction.atomic(). Returns
+        the sale, with its items loaded for the response, and its receipt.
+        """
+        lines, total_amount = CheckoutService.resolve_lines(items_data) if items_data else ([], None)
+        sale = Transaction(sale_by=user, **validated_data)
+        if lines:
+            sale.total_amount = total_amount
+        sale.calculate_amounts(BusinessProfile.objects.first() if sale.is_taxed else None)
+
+        [(sale, receipt)] = SalePostingService.post_new_sales([(sale, lines)], user)
+
+        # Load the items once so the receipt printout and response serializer read from cache
+        prefetch_related_objects([sale], Prefetch('items', queryset=TransactionItem.objects.select_related('product')))
+        return sale, receipt
+
+    @staticmethod
+    def ingest_batch(sales_data, user, chunk_size=None):
+        """Validate and write a batch of queued offline sales, returning one result per sale.
+
+        Sales are validated together with one query per related model, then
+        written in chunks, each in its own transaction.atomic() block so a
+        failing chunk does not lose the others. A sale carrying an
+        idempotency_key that was already ingested is reported as a duplicate
+        and not written again.
+        """
+        chunk_size = chunk_size or CheckoutService.BATCH_CHUNK_SIZE
+        results = [None] * len(sales_data)
+
+        validated = []
+        for index, sale_data in enumerate(sales_data):
+            serializer = BatchSaleSerializer(data=sale_data)
+            if serializer.is_valid():
+                validated.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+
+        related = CheckoutService._load_batch_related([data for _, data in validated])
+        stored_keys = CheckoutService._load_batch_keys([data for _, data in validated])
+        business = BusinessProfile.objects.first() if any(data.get('is_taxed') for _, data in validated) else None
+
+        prepared = []
+        seen_keys = set()
+        for index, data in validated:
+            key = data.get('idempotency_key')
+            request_hash = hashlib.sha256(
+                f"{user.pk}:".encode() + json.dumps(sales_data[index], sort_keys=True, default=str).encode()
+            ).hexdigest() if key else None
+            if key in stored_keys:
+                record = stored_keys[key]
+                if record.request_hash != request_hash:
+                    results[index] = {'index': index, 'status': 'error', 'errors': {
+                        'idempotency_key': ['Idempotency key was already used for a different sale']
+                    }}
+                else:
+                    results[index] = {**record.response_body, 'index': index, 'status': 'duplicate'}
+                continue
+            if key and key in seen_keys:
+                results[index] = {'index': index, 'status': 'error', 'errors': {
+                    'idempotency_key': ['Idempotency key is repeated within the batch']
+                }}
+                continue
+            seen_keys.add(key)
+
+            sale, lines, errors = CheckoutService._build_batch_sale(data, related, business, user)
+            if errors:
+                results[index] = {'index': index, 'status': 'error', 'errors': errors}
+            else:
+                prepared.append((index, key, request_hash, sale, lines))
+
+        expires_at = timezone.now() + timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+        for start in range(0, len(prepared), chunk_size):
+            chunk = prepared[start:start + chunk_size]
+            try:
+                with transaction.atomic():
+                    written = SalePostingService.post_new_sales([(sale, lines) for _, _, _, sale, lines in chunk], user)
+                    chunk_results = []
+                    for (index, key, request_hash, _, _), (sale, receipt) in zip(chunk, written):
+                        result = {
+                            'index': index,
+                            'status': 'created',
+                            'id': sale.id,
+                            'total_amount': str(sale.total_amount),
+                            'receipt_number': receipt.receipt_number if receipt else None,
+                        }
+                        chunk_results.append((index, key, request_hash, result))
+                    IdempotencyKey.objects.bulk_create([
+                        IdempotencyKey(
+                            scope=CheckoutService.BATCH_SCOPE,
+                            key=key,
+                            request_hash=request_hash,
+                            user=user,
+                            response_status=201,
+                            response_body={k: v for k, v in result.items() if k not in ('index', 'status')},
+                            expires_at=expires_at
+                        )
+                        for _, key, request_hash, result in chunk_results if key
+                    ])
+            except DatabaseError as e:
+                logger.error(f"Error writing offline sale batch chunk: {e}")
+                for index, *_ in chunk:
+                    results[index] = {'index': index, 'status': 'error', 'errors': {'non_field_errors': [str(e)]}}
+            else:
+                for index, _, _, result in chunk_results:
+                    results[index] = result
+
+        return results
+
+    @staticmethod
+    def _load_batch_related(validated):
+        """Fetch every product, customer, reseller and supplier the batch refers to, one query per model"""
+        ids = defaultdict(set)
+        for data in validated:
+            for field in ('product', 'customer', 'reseller', 'supplier'):
+                if data.get(field):
+                    ids[field].add(data[field])
+            ids['product'].update(item['product'] for item in data.get('items', []))
+
+        models = {'product': Product, 'customer': Customer, 'reseller': Reseller, 'supplier': Supplier}
+        return {field: models[field].objects.in_bulk(ids[field]) if ids[field] else {} for field in models}
+
+    @staticmethod
+    def _load_batch_keys(validated):
+        """Return the live idempotency records for keys in the batch, clearing expired ones"""
+        keys = {data['idempotency_key'] for data in validated if data.get('idempotency_key')}
+        if not keys:
+            return {}
+        records = IdempotencyKey.objects.filter(scope=CheckoutService.BATCH_SCOPE, key__in=keys)
+        records.filter(expires_at__lte=timezone.now()).delete()
+        return {record.key: record for record in records.filter(expires_at__gt=timezone.now())}
+
+    @staticmethod
+    def _build_batch_sale(data, related, business, user):
+        """Build an unsaved Transaction and its lines from validated batch data"""
+        errors = {}
+        fields = {k: v for k, v in data.items() if k not in ('product', 'customer', 'reseller', 'supplier', 'items', 'idempotency_key')}
+        sale = Transaction(sale_by=user, **fields)
+
+        for field in ('product', 'customer', 'reseller', 'supplier'):
+            pk = data.get(field)
+            if pk:
+                if pk not in related[field]:
+                    errors[field] = [f"{field.title()} {pk} does not exist"]
+                else:
+                    setattr(sale, field, related[field][pk])
+
+        lines = []
+        for item_data in data.get('items', []):
+            product = related['product'].get(item_data['product'])
+            if product is None:
+                errors.setdefault('items', []).append(f"Product {item_data['product']} does not exist")
+                continue
+            unit_price = item_data.get('unit_price', product.default_sale_price)
+            lines.append((product, item_data['quantity'], unit_price))
+
+        if errors:
+            return None, None, errors
+
+        if lines:
+            sale.total_amount = sum(unit_price * quantity for _, quantity, unit_price in lines)
+        sale.calculate_amounts(business)
+        return sale, lines, None
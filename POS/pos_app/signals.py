@@ -1,4 +1,4 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from datetime import datetime, timedelta
@@ -6,20 +6,13 @@ from .models import *
 
 
 @receiver(post_save, sender=Transaction)
-def handle_transaction_stock_update(sender, instance, created, **kwargs):
-    """Automatically update stock and create stock movements when transactions are created"""
-    if created:
-        # Handle single product transactions
-        if instance.product:
-            product = instance.product
-            quantity = instance.quantity
-            
-            if instance.status in ['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']:
-                product.stock_quantity -= quantity
-                product.save()
-                
-                # Check for low stock and create notification
-                check_and_create_low_stock_notification(product)
+def post_sale(sender, instance, created, raw=False, **kwargs):
+    """Post stock, payment collections and reseller commission for sales saved outside the checkout pipeline"""
+    if created and not raw:
+        # Checkout and batch ingestion bulk insert their sales and post them
+        # directly, so this only runs for Transaction.save() callers (admin, scripts)
+        from .services import SalePostingService
+        SalePostingService.post_saved_sale(instance)
 
 
 @receiver(post_save, sender=Payment)
@@ -43,94 +36,56 @@ def update_reseller_balance(sender, instance, created, **kwargs):
 @receiver(post_save, sender=StockTake)
 def handle_stock_take_adjustment(sender, instance, created, **kwargs):
     """Automatically adjust stock based on stock take results"""
-    if created and instance.difference != 0:
-        product = instance.product
-        
-        # Update product stock quantity
-        product.stock_quantity = instance.counted_quantity
-        product.save()
+    if created and instance.product and instance.difference != 0:
+        from .services import InventoryService
         
-        # Create stock movement for the adjustment
+        # Post the difference to the ledger; stock follows from the movement
         movement_type = 'ADJUSTMENT_IN' if instance.difference > 0 else 'ADJUSTMENT_OUT'
-        StockMovement.objects.create(
+        InventoryService.post_movements([StockMovement(
             movement_type=movement_type,
-            product=product,
-            quantity=instance.difference,
+            product=instance.product,
+            quantity=abs(instance.difference),
+            unit_cost=instance.product.cost_price_avg,
             reference_doc_type='STOCK_TAKE',
             reference_doc_id=instance.id,
             performed_by=instance.performed_by,
             reason='COUNT_DIFFERENCE',
             notes=f"Stock take adjustment: {instance.difference} units"
-        )
+        )])
 
 
 @receiver(pre_save, sender=Invoice)
 def generate_invoice_number(sender, instance, **kwargs):
     """Generate automatic invoice number if not provided"""
     if not instance.invoice_number:
-        from datetime import datetime
-        year = datetime.now().year
-        month = datetime.now().month
-        
-        # Get last invoice number for this month
-        last_invoice = Invoice.objects.filter(
-            invoice_number__startswith=f"INV-{year}{month:02d}"
-        ).order_by('-invoice_number').first()
-        
-        if last_invoice:
-            last_num = int(last_invoice.invoice_number.split('-')[-1])
-            new_num = last_num + 1
-        else:
-            new_num = 1
-            
-        instance.invoice_number = f"INV-{year}{month:02d}-{new_num:04d}"
+        instance.invoice_number = Invoice.generate_invoice_number()
 
 
 @receiver(pre_save, sender=Receipt)
 def generate_receipt_number(sender, instance, **kwargs):
     """Generate automatic receipt number if not provided"""
     if not instance.receipt_number:
-        from datetime import datetime
-        
-        today = datetime.now().date()
-        date_str = today.strftime("%Y%m%d")
-        
-        # Get last receipt number for today
-        last_receipt = Receipt.objects.filter(
-            receipt_number__startswith=f"RCP-{date_str}"
-        ).order_by('-receipt_number').first()
-        
-        if last_receipt:
-            last_num = int(last_receipt.receipt_number.split('-')[-1])
-            new_num = last_num + 1
-        else:
-            new_num = 1
-            
-        instance.receipt_number = f"RCP-{date_str}-{new_num:04d}"
+        instance.receipt_number = Receipt.generate_receipt_number()
 
 
 @receiver(post_save, sender=Loss)
 def handle_loss_stock_adjustment(sender, instance, created, **kwargs):
     """Automatically adjust stock when loss is recorded"""
     if created and instance.product and instance.quantity > 0:
-        product = instance.product
+        from .services import InventoryService
         
-        # Deduct from stock
-        product.stock_quantity -= instance.quantity
-        product.save()
-        
-        # Create stock movement for the loss
-        StockMovement.objects.create(
+        # Post the loss to the ledger; stock follows from the movement
+        InventoryService.post_movements([StockMovement(
             movement_type='ADJUSTMENT_OUT',
-            product=product,
-            quantity=-instance.quantity,
+            product=instance.product,
+            quantity=instance.quantity,
             unit_cost=instance.unit_cost,
             reference_doc_type='LOSS',
             reference_doc_id=instance.id,
             performed_by=instance.recorded_by,
             reason=instance.loss_type,
             notes=f"Loss recorded: {instance.description}"
-        )
+        )])
 
 
 @receiver(post_save, sender=Customer)
@@ -230,97 +185,20 @@ def create_expense_notification(sender, instance, created, **kwargs):
         )
 
 
-@receiver(post_save, sender=StockMovement)
-def check_low_stock_after_movement(sender, instance, created, **kwargs):
-    """Check for low stock after any stock movement"""
-    if created and instance.product and instance.movement_type in ['SALE', 'ADJUSTMENT_OUT', 'RETURN_OUT']:
-        check_and_create_low_stock_notification(instance.product)
-
-
-def check_and_create_low_stock_notification(product):
-    """Helper function to check and create low stock notifications"""
-    if product.stock_quantity <= product.low_stock_threshold:
-        # Check if low stock notification already exists for this product (within last 24 hours)
-        from datetime import datetime, timedelta
-        yesterday = datetime.now() - timedelta(days=1)
-        existing_low_stock = Notification.objects.filter(
-            notification_type='LOW_STOCK',
-            related_product=product,
-            timestamp__gte=yesterday
-        ).exists()
-        
-        if not existing_low_stock:
-            Notification.objects.create(
-                message=f"⚠️ Low Stock Alert: {product.name} has only {product.stock_quantity} units remaining (reorder at {product.low_stock_threshold})",
-                notification_type='LOW_STOCK',
-                related_product=product
-            )
-            print(f"Low stock notification created for {product.name}")
-
-
 @receiver(post_save, sender=Product)
-def check_product_stock_on_save(sender, instance, **kwargs):
-    """Check for low stock when product is saved/updated"""
-    check_and_create_low_stock_notification(instance)
-
-
-@receiver(post_save, sender=Transaction)
-def create_payment_collection_record(sender, instance, created, **kwargs):
-    """Create payment collection records for transactions that need follow-up"""
-    if created and instance.status in ['PAID_TO_COLLECT', 'COLLECTED_TO_PAY'] and instance.total_amount > 0:
-        from datetime import datetime, timedelta
-        
-        product_name = instance.product_names
-        created_by_user = instance.sale_by or User.objects.filter(is_superuser=True).first()
-        
-        if instance.status == 'PAID_TO_COLLECT':
-            PaymentCollection.objects.create(
-                collection_type='ITEM_TO_COLLECT',
-                customer=instance.customer,
-                transaction=instance,
-                amount=float(instance.total_amount),
-                due_date=datetime.now().date() + timedelta(days=7),
-                description=f"Item to collect: {product_name}",
-                created_by=created_by_user
-            )
-        elif instance.status == 'COLLECTED_TO_PAY':
-            PaymentCollection.objects.create(
-                collection_type='CUSTOMER_DEBT',
-                customer=instance.customer,
-                transaction=instance,
-                amount=float(instance.total_amount),
-                due_date=datetime.now().date() + timedelta(days=30),
-                description=f"Payment due for: {product_name}",
-                created_by=created_by_user
-            )
+def record_opening_stock(sender, instance, created, raw=False, **kwargs):
+    """Record the stock a product is created with as its opening ledger balance"""
+    if created and not raw:
+        from .services import InventoryService
+        InventoryService.record_opening_balance(instance)
 
 
-@receiver(post_save, sender=Transaction)
-def handle_reseller_commission(sender, instance, created, **kwargs):
-    """Handle reseller commission and balance updates"""
-    if created and instance.reseller and instance.status in ['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY'] and instance.total_amount > 0:
-        from datetime import datetime, timedelta
-        
-        reseller = instance.reseller
-        
-        # Calculate commission based on reseller balance field
-        commission_amount = float(instance.reseller_balance) if instance.reseller_balance else 0
-        
-        # Update reseller balance
-        if commission_amount > 0:
-            reseller.current_balance += commission_amount
-            reseller.save()
-            
-            # Create payment collection for reseller commission
-            PaymentCollection.objects.create(
-                collection_type='RESELLER_PAYMENT',
-                reseller=reseller,
-                transaction=instance,
-                amount=commission_amount,
-                due_date=datetime.now().date() + timedelta(days=reseller.payment_terms_days),
-                description=f"Commission for sale: {instance.product_names}",
-                created_by=instance.sale_by or User.objects.filter(is_superuser=True).first()
-            )
+@receiver(post_save, sender=Product)
+def check_product_stock_on_save(sender, instance, raw=False, **kwargs):
+    """Check for low stock once the transaction that saved the product commits"""
+    if not raw:
+        from .services import InventoryService
+        InventoryService.schedule_low_stock_check([instance.pk])
 
 
 @receiver(post_save, sender=Invoice)
@@ -378,4 +256,111 @@ def create_loss_notification(sender, instance, created, **kwargs):
             message=f"Loss recorded: {instance.loss_type} - ${instance.total_loss_amount}{product_info}",
             notification_type='STOCK_ALERT',
             related_product=instance.product
-        )
\ No newline at end of file
+        )
+
+
+# The business-local day each rolled-up record belongs to
+ROLLUP_DATE_FIELDS = {
+    Transaction: 'timestamp',
+    Payment: 'date',
+    Expense: 'date',
+    Loss: 'date',
+    Customer: 'date_created',
+}
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Loss)
+@receiver(post_save, sender=Customer)
+def roll_up_daily_summary(sender, instance, created, raw=False, **kwargs):
+    """Add new payments, expenses, losses and customers to their DailySummary row"""
+    if created and not raw:
+        from .services import RollupService
+        {
+            Payment: RollupService.record_payment,
+            Expense: RollupService.record_expense,
+            Loss: RollupService.record_loss,
+            Customer: RollupService.record_customer,
+        }[sender](instance)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Loss)
+def refresh_daily_summary_on_edit(sender, instance, created, raw=False, **kwargs):
+    """Recompute the DailySummary row of an edited record; deltas only cover inserts"""
+    if not created and not raw:
+        from .services import RollupService
+        RollupService.refresh_day(getattr(instance, ROLLUP_DATE_FIELDS[sender]))
+
+
+@receiver(post_delete, sender=Transaction)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Loss)
+@receiver(post_delete, sender=Customer)
+def refresh_daily_summary_on_delete(sender, instance, **kwargs):
+    """Recompute the DailySummary row a deleted record contributed to"""
+    from .services import RollupService
+    RollupService.refresh_day(getattr(instance, ROLLUP_DATE_FIELDS[sender]))
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Notification)
+@receiver(post_save, sender=PaymentCollection)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Notification)
+@receiver(post_delete, sender=PaymentCollection)
+def invalidate_dashboard(sender, **kwargs):
+    """Drop the cached dashboard snapshot when a counted table changes"""
+    from .services import DashboardService
+    DashboardService.invalidate()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_lookup(sender, instance, **kwargs):
+    """Drop the product's scan codes from this worker's lookup cache"""
+    from .services import ProductLookupService
+    ProductLookupService.invalidate_product(instance)
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Category)
+def stamp_catalog_version(sender, instance, raw=False, **kwargs):
+    """Give every product and category save the next catalog version; stock updates bypass save().
+
+    Product.save and Category.save run in a transaction, so the sequence row
+    stays locked until the row carrying the version commits.
+    """
+    if not raw:
+        from .services import CatalogService
+        instance.catalog_version = CatalogService.next_version()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def record_catalog_tombstone(sender, instance, **kwargs):
+    """Remember deletions so delta syncs can drop them from tills"""
+    from .services import CatalogService
+    CatalogTombstone.objects.create(
+        kind='PRODUCT' if sender is Product else 'CATEGORY',
+        object_id=instance.pk,
+        catalog_version=CatalogService.next_version()
+    )
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def publish_notification_change(sender, **kwargs):
+    """Wake notification streams for new, read or deleted notifications"""
+    from .services import NotificationBroker
+    NotificationBroker.publish()
@@ -1,8 +1,8 @@
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.core.management.base import BaseCommand
-from .models import ReportSchedule
-from .services import EmailService
+from .models import IdempotencyKey, ReportSchedule
+from .services import EmailService, NotificationService
 
 
 def check_and_send_scheduled_reports():
@@ -44,6 +44,17 @@ def check_and_send_scheduled_reports():
             print(f"❌ Error processing schedule {schedule.id}: {e}")
 
 
+def purge_expired_idempotency_keys():
+    """Delete idempotency keys whose replay window has passed"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def purge_expired_notifications(archive=None, batch_size=None):
+    """Delete notifications past their retention period, archiving per-day counts"""
+    return NotificationService.purge(archive=archive, batch_size=batch_size)
+
+
 class Command(BaseCommand):
     help = 'Check and send scheduled reports'
     
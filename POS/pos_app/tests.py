@@ -1,3 +1,1682 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import re
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
 
-# Create your tests here.
+import openpyxl
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.db import IntegrityError, close_old_connections, connection, connections, transaction
+from django.db.models import F
+from django.db.models.signals import pre_delete, pre_save
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from POS import database
+
+from .benchmarks import latency_summary
+from .middleware import QueryRecorder, RequestProfiler
+from .services import (
+    CatalogService, InventoryService, NotificationBroker, NotificationService, ProductLookupService, ReportEngine, ReportGenerator, RollupService
+)
+from .tasks import purge_expired_idempotency_keys
+from .views import ReportsAPIView
+
+from .models import *
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('cashier', 'cashier@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Solar')
+        self.products = Product.objects.bulk_create([
+            Product(
+                name=f'Panel {i}',
+                product_unique_code=f'PNL-{i:04d}',
+                category=category,
+                default_sale_price=Decimal('10.00'),
+                stock_quantity=1000
+            )
+            for i in range(200)
+        ])
+
+    def checkout(self, line_count, **extra):
+        payload = {
+            'status': 'SOLD',
+            'payment_method': 'CASH',
+            'items': [
+                {'product': product.id, 'quantity': 2, 'unit_price': '10.00'}
+                for product in self.products[:line_count]
+            ],
+            **extra,
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/transactions/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_is_flat_across_basket_sizes(self):
+        # The first sale of the day creates the receipt counter
+        self.checkout(1)
+        _, single_line = self.checkout(1)
+        _, fifty_lines = self.checkout(50)
+        _, two_hundred_lines = self.checkout(200)
+        self.assertEqual(single_line, fifty_lines)
+        # SQLite splits bulk inserts to stay under its bound-parameter limit
+        self.assertLessEqual(two_hundred_lines, single_line + 4)
+
+    def test_checkout_writes_items_movements_and_stock(self):
+        response, _ = self.checkout(3)
+        sale = Transaction.objects.get(pk=response.data['id'])
+
+        self.assertEqual(sale.total_amount, Decimal('60.00'))
+        self.assertEqual(sale.items.count(), 3)
+        self.assertEqual(StockMovement.objects.filter(reference_doc_id=sale.id, movement_type='SALE').count(), 3)
+        self.assertEqual(Receipt.objects.filter(transaction=sale).count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock_quantity, 998)
+        self.assertEqual(Product.objects.get(pk=self.products[3].pk).stock_quantity, 1000)
+
+    def test_unknown_product_rolls_back(self):
+        payload = {'status': 'SOLD', 'items': [
+            {'product': self.products[0].id, 'quantity': 1},
+            {'product': 999999, 'quantity': 1},
+        ]}
+        response = self.client.post('/api/transactions/', payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock_quantity, 1000)
+
+    def test_malformed_lines_are_rejected(self):
+        product = self.products[0].id
+        for line in (
+            {'product': product},
+            {'product': product, 'quantity': 1, 'unit_price': 'ten'},
+            {'product': 'first', 'quantity': 1},
+            {'product': product, 'quantity': 0},
+            {'product': product, 'quantity': -5},
+        ):
+            response = self.client.post('/api/transactions/', {'status': 'SOLD', 'items': [line]}, format='json')
+            self.assertEqual(response.status_code, 400, line)
+            self.assertIn('items', response.data)
+
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(Product.objects.get(pk=product).stock_quantity, 1000)
+
+
+class SalePostingTests(APITestCase):
+    # Every side effect of a sale, including its DailySummary rollup, is posted in a fixed number of
+    # queries; how long that takes is measured by the checkout scenario in benchmarks.py
+    API_QUERIES = 17
+    SAVED_QUERIES = 7
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('cashier', 'cashier@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Inverter', default_sale_price=Decimal('200.00'), stock_quantity=20)
+        self.customer = Customer.objects.create(name='Tendai', phone_no='0771000000')
+        self.reseller = Reseller.objects.create(name='Solar Hub', phone_no='0772000000')
+        # The first sale of the day creates the receipt counter
+        Sequence.objects.allocate(Receipt.receipt_prefix())
+
+    def assertWithinBudget(self, post, queries):
+        with self.assertNumQueries(queries), self.captureOnCommitCallbacks(execute=True):
+            return post()
+
+    def assertPosted(self, sale):
+        self.product.refresh_from_db()
+        self.reseller.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 18)
+        self.assertEqual(StockMovement.objects.filter(reference_doc_id=sale.id, movement_type='SALE').count(), 1)
+        self.assertEqual(self.reseller.current_balance, Decimal('100.00'))
+        self.assertEqual(
+            sorted(PaymentCollection.objects.filter(transaction=sale).values_list('collection_type', flat=True)),
+            ['CUSTOMER_DEBT', 'RESELLER_PAYMENT']
+        )
+
+    def test_api_sale_is_posted_within_budget(self):
+        payload = {
+            'status': 'COLLECTED_TO_PAY',
+            'product': self.product.id,
+            'quantity': 2,
+            'customer': self.customer.id,
+            'reseller': self.reseller.id,
+        }
+        response = self.assertWithinBudget(lambda: self.client.post('/api/transactions/', payload, format='json'), self.API_QUERIES)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        sale = Transaction.objects.get(pk=response.data['id'])
+        self.assertPosted(sale)
+        self.assertEqual(Receipt.objects.filter(transaction=sale).count(), 1)
+
+    def test_saved_sale_is_posted_within_budget(self):
+        sale = self.assertWithinBudget(lambda: Transaction.objects.create(
+            status='COLLECTED_TO_PAY',
+            product=self.product,
+            quantity=2,
+            customer=self.customer,
+            reseller=self.reseller,
+            sale_by=self.user
+        ), self.SAVED_QUERIES)
+
+        self.assertPosted(sale)
+        self.assertFalse(Receipt.objects.filter(transaction=sale).exists())
+
+    def test_rolled_back_sale_leaves_no_collections(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Transaction.objects.create(status='COLLECTED_TO_PAY', product=self.product, quantity=2, customer=self.customer)
+                raise RuntimeError
+
+        self.assertFalse(PaymentCollection.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 20)
+
+
+class TransactionListTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('cashier', 'cashier@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(name=f'Panel {i}', default_sale_price=Decimal('10.00'), stock_quantity=100)
+            for i in range(5)
+        ]
+        self.customer = Customer.objects.create(name='Tendai', phone_no='0771000000')
+        self.reseller = Reseller.objects.create(name='Solar Hub', phone_no='0772000000')
+
+    def create_sales(self, count, items_per_sale, status='SOLD'):
+        sales = Transaction.objects.bulk_create([
+            Transaction(status=status, customer=self.customer, reseller=self.reseller, total_amount=Decimal('50.00'))
+            for _ in range(count)
+        ])
+        TransactionItem.objects.bulk_create([
+            TransactionItem(transaction=sale, product=product, quantity=2, unit_price=product.default_sale_price)
+            for sale in sales
+            for product in self.products[:items_per_sale]
+        ])
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_page_query_count_does_not_depend_on_items(self):
+        self.create_sales(20, 1)
+        _, single_item = self.queries('/api/transactions/')
+        self.create_sales(20, 5)
+        response, five_items = self.queries('/api/transactions/')
+
+        # Page, items with their products
+        self.assertEqual(single_item, 2)
+        self.assertEqual(five_items, 2)
+        self.assertEqual(response.data['results'][0]['display_total_quantity'], 10)
+        self.assertEqual(response.data['results'][0]['customer_name'], 'Tendai')
+
+    def test_status_actions_use_the_prefetched_queryset(self):
+        self.create_sales(10, 5, status='PAID_TO_COLLECT')
+        self.create_sales(10, 5, status='COLLECTED_TO_PAY')
+
+        for url in ['/api/transactions/daily_sales/', '/api/transactions/to_collect/', '/api/transactions/to_pay/']:
+            response, count = self.queries(url)
+            self.assertEqual(count, 2, url)
+            self.assertTrue(response.data)
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('clerk', 'clerk@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        Notification.objects.bulk_create([
+            Notification(message=f'Notice {i}', notification_type='GENERAL') for i in range(45)
+        ])
+
+    def test_pages_walk_every_row_once_without_counting(self):
+        seen, url = [], '/api/notifications/'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in ctx.captured_queries))
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+
+        expected = list(Notification.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_count_is_opt_in(self):
+        response = self.client.get('/api/notifications/', {'count': 'true', 'page_size': 10})
+
+        self.assertEqual(response.data['count'], 45)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_identical_timestamps_page_by_id_not_offset(self):
+        # A bulk import stamps every row with the same moment
+        Notification.objects.update(timestamp=timezone.now())
+        pages, url = [], '/api/notifications/?page_size=10'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertFalse(any('OFFSET' in query['sql'] for query in ctx.captured_queries))
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data['next']
+            previous = response.data['previous']
+
+        expected = list(Notification.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual([pk for page in pages for pk in page], expected)
+        self.assertEqual(len(pages), 5)
+
+        # And back again through the previous links
+        for page in reversed(pages[:-1]):
+            response = self.client.get(previous)
+            self.assertEqual([row['id'] for row in response.data['results']], page)
+            previous = response.data['previous']
+        self.assertIsNone(previous)
+
+    def test_tampered_cursor_is_not_found(self):
+        cursor = base64.b64encode(b'p=yesterday%7C12').decode()
+
+        self.assertEqual(self.client.get('/api/notifications/', {'cursor': cursor}).status_code, 404)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('accountant', 'accounts@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.panel = Product.objects.create(name='Panel', default_sale_price=Decimal('100.00'), stock_quantity=50)
+        customer = Customer.objects.create(name='Tendai', phone_no='0771000000')
+        self.sales = Transaction.objects.bulk_create([
+            Transaction(status='SOLD', product=self.panel, customer=customer, quantity=1, total_amount=Decimal('100.00'))
+            for _ in range(30)
+        ])
+        # Push a third of the sales back beyond the export window
+        Transaction.objects.filter(pk__in=[sale.pk for sale in self.sales[:10]]).update(
+            timestamp=timezone.now() - timedelta(days=40)
+        )
+
+    def export(self, dataset, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/exports/{dataset}/', params)
+            body = b''.join(response.streaming_content).decode() if response.status_code == 200 else None
+        return response, body, len(ctx.captured_queries)
+
+    def test_csv_export_streams_the_date_range_in_one_query(self):
+        start = (timezone.now() - timedelta(days=7)).date().isoformat()
+        response, body, queries = self.export('transactions', start=start)
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = body.splitlines()
+        self.assertTrue(lines[0].startswith('id,timestamp,status,product'))
+        self.assertEqual(len(lines), 21)
+        self.assertIn('Panel', lines[1])
+        self.assertIn('Tendai', lines[1])
+        self.assertEqual(queries, 1)
+
+    def test_ndjson_export(self):
+        response, body, _ = self.export('stock-movements', output='ndjson')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(rows[0]['reason'], 'OPENING')
+        self.assertEqual(rows[0]['product'], 'Panel')
+
+    def test_bad_requests(self):
+        self.assertEqual(self.export('customers')[0].status_code, 404)
+        self.assertEqual(self.export('payments', output='xml')[0].status_code, 400)
+        self.assertEqual(self.export('payments', start='last week')[0].status_code, 400)
+
+
+class ExcelReportTests(APITestCase):
+    def setUp(self):
+        panel = Product.objects.create(name='Panel', default_sale_price=Decimal('100.00'))
+        battery = Product.objects.create(name='Battery', default_sale_price=Decimal('40.00'))
+        customer = Customer.objects.create(name='Tendai', phone_no='0771000000')
+        sales = Transaction.objects.bulk_create([
+            Transaction(status='SOLD', customer=customer, total_amount=Decimal('140.00')) for _ in range(1005)
+        ])
+        TransactionItem.objects.bulk_create([
+            TransactionItem(transaction=sale, product=product, quantity=1, unit_price=product.default_sale_price)
+            for sale in sales
+            for product in (panel, battery)
+        ])
+        Expense.objects.create(description='Rent', amount=Decimal('300.00'))
+
+    def test_workbook_has_every_row_and_the_extra_sheets(self):
+        with CaptureQueriesContext(connection) as ctx:
+            content = ReportGenerator.generate_excel_report()
+        workbook = openpyxl.load_workbook(BytesIO(content), read_only=True)
+
+        self.assertEqual(workbook.sheetnames, ['Summary', 'Transactions', 'Items', 'Payments', 'Expenses'])
+        rows = list(workbook['Transactions'].values)
+        self.assertEqual(len(rows), 1006)
+        self.assertEqual(rows[1][2], 'Panel (x1); Battery (x1)')
+        self.assertEqual(len(list(workbook['Items'].values)), 2011)
+        summary = dict(workbook['Summary'].values)
+        self.assertEqual(summary['Net Profit'], '$140400.00')
+        # Transactions and their items are read in chunks, not row by row
+        self.assertLess(len(ctx.captured_queries), 20)
+
+    def test_date_range_bounds_every_sheet(self):
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        content = ReportGenerator.generate_excel_report(start=tomorrow, sheets=('expenses',))
+        workbook = openpyxl.load_workbook(BytesIO(content), read_only=True)
+
+        self.assertEqual(workbook.sheetnames, ['Summary', 'Transactions', 'Expenses'])
+        self.assertEqual(len(list(workbook['Transactions'].values)), 1)
+        self.assertEqual(len(list(workbook['Expenses'].values)), 1)
+
+
+class ReportsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('manager', 'manager@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.today = timezone.now()
+        panel = Product.objects.create(name='Panel', default_sale_price=Decimal('100.00'), cost_price_avg=Decimal('60.00'), stock_quantity=10)
+        reseller = Reseller.objects.create(name='Solar Hub', phone_no='0772000000')
+        direct, resold, older, stale = Transaction.objects.bulk_create([
+            Transaction(status='SOLD', total_amount=Decimal('200.00'), tax_amount=Decimal('30.00')),
+            Transaction(status='SOLD', reseller=reseller, total_amount=Decimal('130.00')),
+            Transaction(status='SOLD', total_amount=Decimal('70.00')),
+            Transaction(status='SOLD', total_amount=Decimal('500.00')),
+        ])
+        TransactionItem.objects.bulk_create([
+            TransactionItem(transaction=direct, product=panel, quantity=2, unit_price=Decimal('100.00')),
+            TransactionItem(transaction=resold, product=panel, quantity=1, unit_price=Decimal('130.00')),
+        ])
+        self.three_days_ago = self.today - timedelta(days=3)
+        Transaction.objects.filter(pk=older.pk).update(timestamp=self.three_days_ago)
+        Transaction.objects.filter(pk=stale.pk).update(timestamp=self.today - timedelta(days=40))
+        Expense.objects.create(description='Fuel', expense_type='OPERATIONAL', amount=Decimal('50.00'))
+        Loss.objects.create(loss_type='DAMAGE', product=panel, quantity=2, unit_cost=Decimal('10.00'))
+
+    def report(self, report_type):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/reports/', {'type': report_type})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data, len(ctx.captured_queries)
+
+    def test_each_report_is_a_single_statement(self):
+        for report_type in ['daily', 'weekly', 'monthly', 'stock', 'customers', 'resellers', 'expenses', 'losses']:
+            self.assertEqual(self.report(report_type)[1], 1, report_type)
+        # Item and single-product sales margin, expenses and losses
+        self.assertEqual(self.report('profit_loss')[1], 4)
+
+    def test_sales_and_profit_figures(self):
+        daily, _ = self.report('daily')
+        weekly, _ = self.report('weekly')
+        monthly, _ = self.report('monthly')
+        profit_loss, _ = self.report('profit_loss')
+        same_month = self.three_days_ago.month == self.today.month
+
+        self.assertEqual((daily['total_transactions'], daily['total_amount'], daily['total_tax']), (2, Decimal('330.00'), Decimal('30.00')))
+        self.assertEqual((weekly['total_transactions'], weekly['total_amount']), (3, Decimal('400.00')))
+        self.assertEqual(monthly['total_transactions'], 3 if same_month else 2)
+        # The reseller line counts at the default price: 2 x 100 + 1 x 100, plus the
+        # item-less sale from three days ago at its total when it falls in this month
+        single_product = Decimal('70.00') if same_month else Decimal('0')
+        self.assertEqual(profit_loss['total_sales'], Decimal('300.00') + single_product)
+        self.assertEqual(profit_loss['cost_of_goods_sold'], Decimal('180.00'))
+        self.assertEqual(profit_loss['net_profit'], Decimal('50.00') + single_product)
+
+    def test_all_matches_the_individual_reports(self):
+        combined, queries = self.report('all')
+
+        self.assertLessEqual(queries, 8)
+        for report_type in ReportsAPIView.REPORTS:
+            self.assertEqual(combined[report_type], self.report(report_type)[0], report_type)
+
+    def test_unknown_report_type(self):
+        self.assertEqual(self.client.get('/api/reports/', {'type': 'quarterly'}).status_code, 400)
+
+    def test_today_is_the_business_day(self):
+        # Whatever the hour, at least one of these zones is on a different date than UTC
+        for zone in ('Pacific/Kiritimati', 'Etc/GMT+12'):
+            with self.subTest(zone=zone), override_settings(TIME_ZONE=zone):
+                self.assertEqual(self.report('daily')[0]['date'], timezone.localdate())
+
+
+class DailySummaryTests(APITestCase):
+    METRICS = RollupService.FIELDS
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('manager', 'manager@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+        self.panel = Product.objects.create(
+            name='Panel', default_sale_price=Decimal('100.00'), cost_price_avg=Decimal('60.00'), stock_quantity=50
+        )
+        self.customer = Customer.objects.create(name='Tendai', phone_no='0771000000')
+
+    def sell(self, status='SOLD', quantity=2):
+        response = self.client.post('/api/transactions/', {
+            'status': status,
+            'customer': self.customer.id,
+            'items': [{'product': self.panel.id, 'quantity': quantity}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Transaction.objects.get(pk=response.data['id'])
+
+    def snapshot(self, day=None):
+        return DailySummary.objects.filter(date=day or self.today).values(*self.METRICS).get()
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        RollupService.rebuild(self.today, self.today)
+        self.assertEqual(incremental, self.snapshot())
+        return incremental
+
+    def test_postings_roll_up_incrementally(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell()
+            self.sell(status='RECEIVED', quantity=1)
+            Payment.objects.create(customer=self.customer, amount=Decimal('80.00'), payment_method='ECOCASH')
+            Expense.objects.create(description='Fuel', amount=Decimal('15.00'))
+            Loss.objects.create(loss_type='DAMAGE', product=self.panel, quantity=1, unit_cost=Decimal('5.00'))
+
+        summary = self.assertMatchesRebuild()
+        self.assertEqual((summary['total_transactions'], summary['products_sold'], summary['products_received']), (1, 1, 1))
+        self.assertEqual(summary['total_sales_amount'], Decimal('200.00'))
+        self.assertEqual(summary['cost_of_goods_sold'], Decimal('120.00'))
+        self.assertEqual((summary['ecocash_sales'], summary['payments_received']), (Decimal('80.00'), Decimal('80.00')))
+        self.assertEqual(summary['net_profit'], Decimal('60.00'))
+        self.assertEqual(summary['new_customers'], 1)
+
+    def test_edits_and_deletes_refresh_the_day(self):
+        sale = self.sell()
+        expense = Expense.objects.create(description='Fuel', amount=Decimal('15.00'))
+
+        sale.status = 'RECEIVED'
+        sale.save()
+        expense.delete()
+
+        summary = self.assertMatchesRebuild()
+        self.assertEqual((summary['total_transactions'], summary['total_sales_amount'], summary['total_expenses']), (0, 0, 0))
+        self.assertEqual(summary['products_received'], 1)
+
+    def test_rebuild_is_a_fixed_number_of_grouped_queries(self):
+        for _ in range(5):
+            self.sell()
+        Transaction.objects.filter(pk=self.sell().pk).update(timestamp=timezone.now() - timedelta(days=3))
+
+        with CaptureQueriesContext(connection) as ctx:
+            days = RollupService.rebuild(self.today - timedelta(days=30), self.today)
+
+        # Six grouped reads, the existing-row read and one upsert, however many days and rows
+        self.assertEqual(len(ctx.captured_queries), 8)
+        self.assertEqual(days, 2)
+        self.assertEqual(self.snapshot(self.today - timedelta(days=3))['total_transactions'], 1)
+
+    def test_rebuild_command_backfills_history(self):
+        self.sell()
+        DailySummary.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_daily_summaries', stdout=out)
+
+        self.assertIn('Rebuilt 1 daily summaries', out.getvalue())
+        self.assertEqual(self.snapshot()['total_sales_amount'], Decimal('200.00'))
+
+    def test_migration_backfills_closed_days_for_profit_loss(self):
+        yesterday = self.sell()
+        Transaction.objects.filter(pk=yesterday.pk).update(timestamp=timezone.now() - timedelta(days=1))
+        # As left by 0052: rows from before the field existed hold no revenue
+        DailySummary.objects.update(sales_revenue=0, cost_of_goods_sold=0)
+
+        import_module('pos_app.migrations.0059_backfill_daily_summaries').backfill(None, None)
+
+        totals = ReportEngine.profit_loss(self.today - timedelta(days=1), self.today - timedelta(days=1))
+        self.assertEqual((totals['total_sales'], totals['cost_of_goods_sold']), (Decimal('200.00'), Decimal('120.00')))
+
+    def test_generate_endpoint_recomputes_a_day(self):
+        self.sell()
+        DailySummary.objects.filter(date=self.today).update(total_sales_amount=0)
+
+        response = self.client.post('/api/daily-summaries/generate/', {'date': self.today.isoformat()}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Decimal(response.data['total_sales_amount']), Decimal('200.00'))
+        self.assertEqual(self.client.post('/api/daily-summaries/generate/', {'date': '2024-02-30'}).status_code, 400)
+
+    def test_profit_loss_composes_rollups_with_the_open_day(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell()
+            last_week = self.sell(quantity=1)
+            Expense.objects.create(description='Fuel', amount=Decimal('15.00'))
+        Transaction.objects.filter(pk=last_week.pk).update(timestamp=timezone.now() - timedelta(days=7))
+        RollupService.rebuild(self.today - timedelta(days=7), self.today)
+
+        def generate(days):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post('/api/profit-loss-reports/generate/', {
+                    'period_type': 'YEARLY',
+                    'start_date': (self.today - timedelta(days=days)).isoformat(),
+                    'end_date': self.today.isoformat(),
+                }, format='json')
+            self.assertEqual(response.status_code, 200, response.data)
+            return response.data, len(ctx.captured_queries)
+
+        week, week_queries = generate(7)
+        year, year_queries = generate(365)
+
+        self.assertEqual(week_queries, year_queries)
+        self.assertEqual(Decimal(year['total_sales']), Decimal('300.00'))
+        self.assertEqual(Decimal(year['cost_of_goods_sold']), Decimal('180.00'))
+        self.assertEqual(Decimal(year['net_profit']), Decimal('105.00'))
+        self.assertEqual(Decimal(generate(6)[0]['total_sales']), Decimal('200.00'))
+
+    def test_single_product_sales_count_in_profit_loss(self):
+        # Saved outside checkout: one product on the header and no items
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell()
+            Transaction.objects.create(product=self.panel, quantity=3, status='SOLD', sale_by=self.user)
+            last_week = Transaction.objects.create(product=self.panel, quantity=1, status='SOLD', sale_by=self.user)
+        summary = self.assertMatchesRebuild()
+        self.assertEqual((summary['sales_revenue'], summary['cost_of_goods_sold']), (Decimal('600.00'), Decimal('360.00')))
+
+        Transaction.objects.filter(pk=last_week.pk).update(timestamp=timezone.now() - timedelta(days=7))
+        RollupService.rebuild(self.today - timedelta(days=7), self.today)
+        # Closed days come from the rollups, today from raw rows
+        totals = ReportEngine.profit_loss(self.today - timedelta(days=7), self.today)
+        self.assertEqual((totals['total_sales'], totals['cost_of_goods_sold']), (Decimal('600.00'), Decimal('360.00')))
+        totals = ReportEngine.profit_loss(self.today, self.today)
+        self.assertEqual((totals['total_sales'], totals['cost_of_goods_sold']), (Decimal('500.00'), Decimal('300.00')))
+
+    def test_reseller_margin_agrees_across_reports(self):
+        reseller = Reseller.objects.create(name='Solar Hub', phone_no='0772000000')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell()
+            response = self.client.post('/api/transactions/', {
+                'status': 'SOLD',
+                'reseller': reseller.id,
+                'items': [{'product': self.panel.id, 'quantity': 1, 'unit_price': '130.00'}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        # The reseller line counts at the default price: 2 x 100 + 1 x 100
+        summary = self.assertMatchesRebuild()
+        self.assertEqual((summary['sales_revenue'], summary['gross_profit']), (Decimal('300.00'), Decimal('120.00')))
+        report = self.client.get('/api/reports/', {'type': 'profit_loss'}).data
+        self.assertEqual((report['total_sales'], report['gross_profit']), (Decimal('300.00'), Decimal('120.00')))
+        generated = self.client.post('/api/profit-loss-reports/generate/', {
+            'start_date': self.today.isoformat(), 'end_date': self.today.isoformat()
+        }, format='json').data
+        self.assertEqual((Decimal(generated['total_sales']), Decimal(generated['gross_profit'])), (Decimal('300.00'), Decimal('120.00')))
+
+
+class ResellerBalanceTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('manager', 'manager@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.resellers = Reseller.objects.bulk_create([
+            Reseller(name=f'Reseller {i}', phone_no='0772000000', account_code=f'RESL-T-{i}') for i in range(5)
+        ])
+        for reseller in self.resellers:
+            Transaction.objects.bulk_create([
+                Transaction(reseller=reseller, status='SOLD', quantity=2, dealership_price=Decimal('40.00'), total_amount=Decimal('100.00')),
+                Transaction(reseller=reseller, status='SOLD', total_amount=Decimal('80.00')),
+                Transaction(reseller=reseller, status='RECEIVED', total_amount=Decimal('40.00')),
+                Transaction(reseller=reseller, status='SOLD', quantity=3, dealership_price=Decimal('50.00'), total_amount=Decimal('120.00')),
+                Transaction(reseller=reseller, status='SOLD', total_amount=Decimal('0.00')),
+            ])
+
+    def test_annotations_match_the_per_transaction_balance(self):
+        reseller = Reseller.objects.with_balances().get(pk=self.resellers[0].pk)
+        transactions = Transaction.objects.filter(reseller=reseller)
+
+        self.assertEqual(reseller.computed_balance, sum(Decimal(t.reseller_balance) for t in transactions))
+        # Balance: 20 + 20 + 10 - 30; only the two profitable sales earn commission
+        self.assertEqual((reseller.computed_balance, reseller.commission_owed, reseller.sale_count), (Decimal('20.00'), Decimal('40.00'), 4))
+        self.assertEqual(Reseller.objects.get(pk=reseller.pk).calculated_reseller_balance, Decimal('20.00'))
+
+    def test_list_is_one_grouped_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/resellers/')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual(len(results), 5)
+        self.assertEqual({(row['calculated_reseller_balance'], row['sale_count']) for row in results}, {(Decimal('20.00'), 4)})
+        self.assertLessEqual(len(ctx.captured_queries), 2)
+
+    def test_created_reseller_has_zero_balances(self):
+        response = self.client.post('/api/resellers/', {'name': 'New Hub', 'phone_no': '0773000000'}, format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['commission_owed'], response.data['sale_count']), ('0.00', 0))
+
+
+class DashboardTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser('cashier', 'cashier@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Inverter', default_sale_price=Decimal('200.00'), stock_quantity=20)
+
+    def poll(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/dashboard/', **headers)
+        return response, len(ctx.captured_queries)
+
+    def test_steady_state_polls_do_not_query(self):
+        first, _ = self.poll()
+        self.assertEqual(first.status_code, 200)
+
+        second, queries = self.poll()
+        self.assertEqual((second.data, second['ETag'], queries), (first.data, first['ETag'], 0))
+
+        unchanged, queries = self.poll(first['ETag'])
+        self.assertEqual((unchanged.status_code, queries), (304, 0))
+
+    def test_writes_invalidate_the_snapshot(self):
+        first, _ = self.poll()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/transactions/', {
+                'status': 'SOLD', 'items': [{'product': self.product.id, 'quantity': 1}]
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        after_sale, _ = self.poll(first['ETag'])
+        self.assertEqual(after_sale.status_code, 200)
+        self.assertEqual(after_sale.data['today_sales'], {'total': Decimal('200.00'), 'count': 1})
+        self.assertNotEqual(after_sale['ETag'], first['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark_all_read/')
+        self.assertEqual(self.poll()[0].data['unread_notifications'], 0)
+
+
+class ProductScanTests(APITestCase):
+    def setUp(self):
+        ProductLookupService.clear()
+        self.user = User.objects.create_superuser('cashier', 'cashier@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(
+            name='Inverter', product_unique_code='INV-0001', barcode='6001234567890', default_sale_price=Decimal('200.00')
+        )
+
+    def scan(self, code):
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get('/api/products/scan/', {'code': code})
+        return response, len(ctx.captured_queries)
+
+    def test_exact_barcode_and_code_lookups_are_cached(self):
+        response, queries = self.scan('6001234567890')
+        self.assertEqual((response.status_code, response.data['id'], queries), (200, self.product.id, 1))
+
+        # A hit only reads the live stock
+        response, queries = self.scan('6001234567890')
+        self.assertEqual((response.status_code, queries), (200, 1))
+        self.assertEqual(self.scan('INV-0001')[0].data['default_sale_price'], '200.00')
+        # Only exact matches resolve
+        self.assertEqual(self.scan('600123')[0].status_code, 404)
+        self.assertEqual(self.client.get('/api/products/scan/').status_code, 400)
+
+    def test_product_writes_invalidate_the_cache(self):
+        self.scan('6001234567890')
+        self.scan('9999')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.default_sale_price = Decimal('180.00')
+            self.product.save()
+            Product.objects.create(name='Battery', barcode='9999', default_sale_price=Decimal('40.00'))
+        self.assertEqual(self.scan('6001234567890')[0].data['default_sale_price'], '180.00')
+        self.assertEqual(self.scan('9999')[0].data['name'], 'Battery')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            InventoryService.apply_deltas({self.product.id: -3})
+        self.assertEqual(self.scan('6001234567890')[0].data['stock_quantity'], -3)
+
+    def test_cached_scans_read_stock_written_elsewhere(self):
+        self.scan('6001234567890')
+
+        # Written by another worker: no eviction reaches this one
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=7)
+        self.assertEqual(self.scan('6001234567890')[0].data['stock_quantity'], 7)
+
+        with self.captureOnCommitCallbacks(execute=False):
+            self.product.delete()
+        self.assertEqual(self.scan('6001234567890')[0].status_code, 404)
+
+    def test_batch_scan_resolves_misses_in_one_query(self):
+        Product.objects.create(name='Battery', product_unique_code='BAT-0001', default_sale_price=Decimal('40.00'))
+        self.scan('INV-0001')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/products/scan/batch/', {
+                'codes': ['INV-0001', 'BAT-0001', '6001234567890', 'NOPE', 'BAT-0001']
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        # Stock for the cached INV-0001, then every miss together
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(response.data['missing'], ['NOPE'])
+        self.assertEqual(response.data['results']['BAT-0001']['name'], 'Battery')
+        self.assertEqual(response.data['results']['6001234567890']['id'], self.product.id)
+        self.assertEqual(self.client.post('/api/products/scan/batch/', {'codes': 'INV-0001'}, format='json').status_code, 400)
+
+
+class CatalogSyncTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser('till', 'till@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Solar')
+        self.panel = Product.objects.create(name='Panel', category=self.category, default_sale_price=Decimal('100.00'), stock_quantity=10)
+        self.battery = Product.objects.create(name='Battery', category=self.category, default_sale_price=Decimal('40.00'), stock_quantity=5)
+
+    def sync(self, since=None, **headers):
+        response = self.client.get('/api/catalog/', {'since': since} if since is not None else {}, **headers)
+        if response.status_code != 200:
+            return response, None
+        return response, json.loads(gzip.decompress(response.content) if response.get('Content-Encoding') == 'gzip' else response.content)
+
+    def products(self, payload):
+        columns = payload['products']['columns']
+        return {row[0]: dict(zip(columns, row)) for row in payload['products']['rows']}
+
+    def test_snapshot_lists_active_products_compressed(self):
+        Product.objects.create(name='Old Panel', is_active=False)
+
+        response, snapshot = self.sync(HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(snapshot['full'])
+        self.assertEqual(set(self.products(snapshot)), {self.panel.id, self.battery.id})
+        self.assertEqual(self.products(snapshot)[self.panel.id]['default_sale_price'], '100.00')
+        self.assertEqual(snapshot['categories']['rows'], [[self.category.id, 'Solar']])
+        self.assertEqual(self.sync(HTTP_IF_NONE_MATCH=response['ETag'])[0].status_code, 304)
+
+    def test_delta_carries_only_changes_and_removals(self):
+        _, snapshot = self.sync()
+
+        self.panel.default_sale_price = Decimal('95.00')
+        self.panel.save()
+        self.battery.is_active = False
+        self.battery.save()
+        cable = Product.objects.create(name='Cable', default_sale_price=Decimal('2.00'))
+        doomed = Product.objects.create(name='Doomed')
+        doomed_id = doomed.id
+        doomed.delete()
+
+        _, delta = self.sync(snapshot['version'])
+
+        self.assertFalse(delta['full'])
+        self.assertGreater(delta['version'], snapshot['version'])
+        self.assertEqual(set(self.products(delta)), {self.panel.id, cable.id})
+        self.assertEqual(self.products(delta)[self.panel.id]['default_sale_price'], '95.00')
+        self.assertEqual(sorted(delta['removed_products']), sorted([self.battery.id, doomed_id]))
+
+        _, empty = self.sync(delta['version'])
+        self.assertEqual((empty['products']['rows'], empty['removed_products']), ([], []))
+
+    def test_stock_movements_leave_the_catalog_version_alone(self):
+        _, snapshot = self.sync()
+
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=False):
+            InventoryService.apply_deltas({self.panel.id: -2})
+
+        self.assertEqual(CatalogService.current_version(), snapshot['version'])
+        self.assertEqual(self.client.get('/api/products/scan/', {'code': self.panel.product_unique_code}).data['stock_quantity'], 8)
+
+    def test_unknown_versions_fall_back_to_a_snapshot(self):
+        self.assertTrue(self.sync(10 ** 9)[1]['full'])
+        self.assertEqual(self.sync('abc')[0].status_code, 400)
+
+
+class ConcurrentCatalogTests(TransactionTestCase):
+    # Worker blocks take code numbering out of the save's transaction; the version must stay in it
+    @override_settings(SEQUENCE_BLOCK_SIZE=5)
+    def test_version_is_not_visible_before_its_row(self):
+        product = Product.objects.create(name='Panel', default_sale_price=Decimal('100.00'))
+        seen = CatalogService.current_version()
+        stamped, release = threading.Event(), threading.Event()
+
+        # Runs after stamp_catalog_version, before the row is written
+        def hold(sender, instance, **kwargs):
+            stamped.set()
+            release.wait(5)
+
+        def edit():
+            try:
+                product.default_sale_price = Decimal('90.00')
+                product.save()
+            finally:
+                connections.close_all()
+
+        pre_save.connect(hold, sender=Product)
+        thread = threading.Thread(target=edit)
+        thread.start()
+        try:
+            self.assertTrue(stamped.wait(5))
+            self.assertEqual(CatalogService.current_version(), seen)
+        finally:
+            release.set()
+            thread.join()
+            pre_save.disconnect(hold, sender=Product)
+
+        self.assertEqual(CatalogService.changes(seen)['products']['rows'][0][0], product.id)
+
+
+class NotificationStreamTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser('cashier', 'cashier@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.first = Notification.objects.create(message='First', notification_type='GENERAL')
+        self.second = Notification.objects.create(message='Second', notification_type='GENERAL')
+
+    def events(self, chunks):
+        return [
+            dict(line.split(': ', 1) for line in chunk.strip().splitlines())
+            for chunk in chunks if not chunk.startswith((': ', 'retry'))
+        ]
+
+    def close(self, response):
+        # As the server does when a client leaves before reading; keep the test connection open
+        request_finished.disconnect(close_old_connections)
+        try:
+            response.close()
+        finally:
+            request_finished.connect(close_old_connections)
+
+    @override_settings(NOTIFICATION_STREAM_MAX_SECONDS=0)
+    def test_resumes_after_last_event_id(self):
+        response = self.client.get('/api/notifications/stream/', HTTP_LAST_EVENT_ID=str(self.first.id))
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = self.events(chunk.decode() for chunk in response.streaming_content)
+        self.assertEqual([(event['event'], event.get('id')) for event in events], [('notification', str(self.second.id)), ('unread', None)])
+        self.assertEqual(json.loads(events[0]['data'])['message'], 'Second')
+        self.assertEqual(json.loads(events[1]['data']), {'unread': 2})
+
+    @override_settings(NOTIFICATION_STREAM_MAX_SECONDS=3, NOTIFICATION_STREAM_HEARTBEAT=0.01)
+    def test_pushes_changes_and_stays_quiet_otherwise(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location.name}}
+        with override_settings(CACHES=shared):
+            self.assertTrue(NotificationBroker.shared())
+            self.check_push_and_quiet()
+
+    def check_push_and_quiet(self):
+        response = self.client.get('/api/notifications/stream/')
+        stream = (chunk.decode() for chunk in response.streaming_content)
+        next(stream)
+        self.assertEqual(self.events([next(stream)]), [{'event': 'unread', 'data': '{"unread": 2}'}])
+
+        with CaptureQueriesContext(connection) as ctx:
+            idle = [next(stream) for _ in range(3)]
+        self.assertEqual((idle, len(ctx.captured_queries)), ([': keepalive\n\n'] * 3, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            third = Notification.objects.create(message='Third', notification_type='GENERAL')
+        chunk = next(chunk for chunk in stream if not chunk.startswith(': '))
+        self.assertEqual(self.events([chunk])[0]['id'], str(third.id))
+        self.assertEqual(json.loads(self.events([next(stream)])[0]['data']), {'unread': 3})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark_all_read/')
+        chunk = next(chunk for chunk in stream if not chunk.startswith(': '))
+        self.assertEqual(json.loads(self.events([chunk])[0]['data']), {'unread': 0})
+        # The stream ends at NOTIFICATION_STREAM_MAX_SECONDS, closing the response and its slot
+        self.assertEqual(set(stream), {': keepalive\n\n'})
+
+    def test_rejects_bad_event_ids(self):
+        self.assertEqual(self.client.get('/api/notifications/stream/', HTTP_LAST_EVENT_ID='abc').status_code, 400)
+
+    def test_version_is_read_outside_the_lock(self):
+        reading, release = threading.Event(), threading.Event()
+
+        def slow(execute, sql, params, many, context):
+            reading.set()
+            release.wait(5)
+            return execute(sql, params, many, context)
+
+        def waiting_stream():
+            try:
+                with connection.execute_wrapper(slow):
+                    NotificationBroker.wait(None, 0)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=waiting_stream)
+        thread.start()
+        try:
+            self.assertTrue(reading.wait(5))
+            # Other streams and publishers are not stuck behind the slow read
+            self.assertTrue(NotificationBroker._condition.acquire(timeout=1))
+            NotificationBroker._condition.release()
+        finally:
+            release.set()
+            thread.join()
+
+    @override_settings(NOTIFICATION_STREAM_MAX_PER_WORKER=1)
+    def test_streams_per_worker_are_capped(self):
+        first = self.client.get('/api/notifications/stream/')
+        self.assertEqual(first.status_code, 200)
+
+        refused = self.client.get('/api/notifications/stream/')
+        self.assertEqual((refused.status_code, refused['Retry-After']), (503, '300'))
+
+        # Closing a stream, even one never read, frees its slot
+        self.close(first)
+        second = self.client.get('/api/notifications/stream/')
+        self.assertEqual(second.status_code, 200)
+        self.close(second)
+
+    def test_per_process_cache_falls_back_to_the_database(self):
+        self.assertFalse(NotificationBroker.shared())
+        seen = NotificationBroker.version()
+
+        # Written by another worker: nothing publishes in this process
+        Notification.objects.bulk_create([Notification(message='Elsewhere', notification_type='GENERAL')])
+        moved = NotificationBroker.wait(seen, 0)
+        self.assertNotEqual(moved, seen)
+
+        Notification.objects.update(is_read=True)
+        with self.assertNumQueries(2):
+            self.assertNotEqual(NotificationBroker.wait(moved, 0), moved)
+
+
+class IdempotencyTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('cashier', 'cashier@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Inverter', default_sale_price=Decimal('100.00'), stock_quantity=10)
+        self.payload = {'status': 'SOLD', 'items': [{'product': self.product.id, 'quantity': 1}]}
+
+    def post(self, key, payload=None):
+        return self.client.post('/api/transactions/', payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_stored_response_without_writing(self):
+        first = self.post('till-1-0001')
+        replay = self.post('till-1-0001')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json()['id'], first.data['id'])
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(Receipt.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 9)
+
+    def test_key_reused_for_different_body_is_rejected(self):
+        self.post('till-1-0002')
+        response = self.post('till-1-0002', {**self.payload, 'notes': 'changed'})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_failed_request_does_not_consume_key(self):
+        bad = self.post('till-1-0003', {'status': 'SOLD', 'items': [{'product': 999999, 'quantity': 1}]})
+        self.assertEqual(bad.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_expired_keys_are_purged(self):
+        self.post('till-1-0004')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(purge_expired_idempotency_keys(), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    def test_concurrent_replays_write_once(self):
+        user = User.objects.create_superuser('cashier', 'cashier@example.com', 'password')
+        product = Product.objects.create(name='Battery', default_sale_price=Decimal('50.00'), stock_quantity=10)
+        payload = {'status': 'SOLD', 'items': [{'product': product.id, 'quantity': 1}]}
+        barrier = threading.Barrier(4)
+        responses = []
+
+        def retry():
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                responses.append(client.post('/api/transactions/', payload, format='json', HTTP_IDEMPOTENCY_KEY='till-2-0001'))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=retry) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(r.status_code for r in responses), [201] * 4)
+        self.assertEqual(len({r.json()['id'] for r in responses}), 1)
+        self.assertEqual(Transaction.objects.count(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 9)
+
+
+class BatchIngestTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('cashier', 'cashier@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.panel = Product.objects.create(name='Panel', default_sale_price=Decimal('100.00'), stock_quantity=50)
+        self.battery = Product.objects.create(name='Battery', default_sale_price=Decimal('40.00'), stock_quantity=50)
+        self.customer = Customer.objects.create(name='Tendai', phone_no='0771000000')
+        self.reseller = Reseller.objects.create(name='Solar Hub', phone_no='0772000000')
+
+    def post_batch(self, sales):
+        # Payment collections and low stock alerts are written on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/transactions/batch/', sales, format='json')
+
+    def test_batch_writes_valid_sales_and_reports_invalid_ones(self):
+        response = self.post_batch([
+            {'status': 'SOLD', 'items': [
+                {'product': self.panel.id, 'quantity': 2},
+                {'product': self.battery.id, 'quantity': 1, 'unit_price': '35.00'},
+            ]},
+            {'status': 'COLLECTED_TO_PAY', 'product': self.battery.id, 'quantity': 3, 'customer': self.customer.id},
+            {'status': 'SOLD', 'items': [{'product': 999999, 'quantity': 1}]},
+            {'status': 'SOLD', 'items': [{'product': self.panel.id, 'quantity': 0}]},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'created', 'error', 'error'])
+        self.assertEqual(response.data['results'][0]['total_amount'], '235.00')
+
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(TransactionItem.objects.count(), 2)
+        self.assertEqual(StockMovement.objects.filter(movement_type='SALE').count(), 3)
+        self.assertEqual(Receipt.objects.count(), 2)
+        self.assertEqual(PaymentCollection.objects.get().amount, Decimal('120.00'))
+        self.panel.refresh_from_db()
+        self.battery.refresh_from_db()
+        self.assertEqual(self.panel.stock_quantity, 48)
+        self.assertEqual(self.battery.stock_quantity, 46)
+
+    def test_reseller_sale_accrues_commission(self):
+        self.post_batch([{'status': 'SOLD', 'reseller': self.reseller.id, 'items': [{'product': self.panel.id, 'quantity': 1}]}])
+
+        self.reseller.refresh_from_db()
+        self.assertEqual(self.reseller.current_balance, Decimal('25.00'))
+        self.assertTrue(PaymentCollection.objects.filter(collection_type='RESELLER_PAYMENT', reseller=self.reseller).exists())
+
+    def test_replayed_batch_is_not_written_twice(self):
+        sales = [
+            {'status': 'SOLD', 'idempotency_key': f'till-3-{i}', 'items': [{'product': self.panel.id, 'quantity': 1}]}
+            for i in range(3)
+        ]
+        first = self.post_batch(sales)
+        replay = self.post_batch(sales)
+
+        self.assertEqual(first.data['created'], 3)
+        self.assertEqual(replay.data['duplicates'], 3)
+        self.assertEqual(
+            [r['id'] for r in replay.data['results']],
+            [r['id'] for r in first.data['results']]
+        )
+        self.assertEqual(Transaction.objects.count(), 3)
+        self.panel.refresh_from_db()
+        self.assertEqual(self.panel.stock_quantity, 47)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        Product.objects.update(stock_quantity=1000)
+
+        def queries(count):
+            sales = [{'status': 'SOLD', 'items': [
+                {'product': self.panel.id, 'quantity': 1},
+                {'product': self.battery.id, 'quantity': 1},
+            ]} for _ in range(count)]
+            with CaptureQueriesContext(connection) as ctx:
+                self.post_batch(sales)
+            return len(ctx.captured_queries)
+
+        # The first sale of the day creates the receipt counter
+        queries(1)
+        self.assertEqual(queries(5), queries(40))
+
+
+class InventoryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('storekeeper', 'store@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Battery', default_sale_price=Decimal('40.00'), stock_quantity=30)
+
+    def assertInStock(self, quantity):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, quantity)
+        self.assertFalse(InventoryService.check_drift().exists())
+
+    def test_opening_stock_is_recorded_in_the_ledger(self):
+        movement = StockMovement.objects.get(product=self.product)
+        self.assertEqual((movement.movement_type, movement.reason, movement.quantity), ('ADJUSTMENT_IN', 'OPENING', 30))
+        self.assertInStock(30)
+
+    def test_movement_api_applies_edits_and_deletes(self):
+        response = self.client.post('/api/stock-movements/', {
+            'movement_type': 'RECEIPT', 'product': self.product.id, 'quantity': 10, 'reason': 'PURCHASE'
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertInStock(40)
+
+        self.client.patch(f"/api/stock-movements/{response.data['id']}/", {'movement_type': 'RETURN_OUT', 'quantity': 5}, format='json')
+        self.assertInStock(25)
+
+        self.client.delete(f"/api/stock-movements/{response.data['id']}/")
+        self.assertInStock(30)
+
+    def test_stock_take_and_loss_post_single_movements(self):
+        response = self.client.post('/api/stock-takes/', {'product': self.product.id, 'counted_quantity': 27}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        Loss.objects.create(loss_type='DAMAGE', product=self.product, quantity=2, recorded_by=self.user)
+
+        self.assertInStock(25)
+        self.assertEqual(StockMovement.objects.filter(reason='COUNT_DIFFERENCE').get().quantity, 3)
+        self.assertEqual(StockMovement.objects.filter(reference_doc_type='LOSS').get().quantity, 2)
+
+    def test_product_edits_cannot_bypass_the_ledger(self):
+        response = self.client.patch(f'/api/products/{self.product.id}/', {'stock_quantity': 999}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('/api/stock-takes/', str(response.data['stock_quantity']))
+        self.assertInStock(30)
+
+        # Round-tripping the current value with other edits is accepted
+        response = self.client.patch(f'/api/products/{self.product.id}/', {'stock_quantity': 30, 'name': 'Lithium Battery'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertInStock(30)
+
+    def test_rebuild_stock_corrects_drift(self):
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=12)
+        drifted = InventoryService.check_drift().get()
+        self.assertEqual((drifted.ledger_quantity, drifted.drift), (30, -18))
+
+        out = StringIO()
+        call_command('rebuild_stock', stdout=out)
+
+        self.assertIn('corrected 1 products', out.getvalue())
+        self.assertInStock(30)
+
+
+class LowStockAlertTests(APITestCase):
+    def setUp(self):
+        self.products = [
+            Product.objects.create(name=f'Battery {i}', default_sale_price=Decimal('40.00'), stock_quantity=10, low_stock_threshold=5)
+            for i in range(3)
+        ]
+
+    def open_alerts(self):
+        return Notification.objects.filter(notification_type='LOW_STOCK', resolved_at__isnull=True)
+
+    def move(self, deltas):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                for product, delta in deltas:
+                    InventoryService.apply_deltas({product.id: delta})
+        return callbacks
+
+    def test_a_transaction_is_checked_once_after_commit(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.move([(product, -6) for product in self.products] * 2)
+
+        self.assertEqual(self.open_alerts().count(), 3)
+        checks = [query['sql'] for query in ctx.captured_queries if 'pos_app_notification' in query['sql']]
+        # One SELECT finds the products needing alerts, one INSERT raises them all
+        self.assertEqual(len(checks), 2)
+
+    def test_one_open_alert_until_stock_recovers(self):
+        product = self.products[0]
+        self.move([(product, -6)])
+        self.move([(product, -1)])
+        self.assertEqual(self.open_alerts().get().related_product, product)
+
+        self.move([(product, 20)])
+        self.assertFalse(self.open_alerts().exists())
+
+        self.move([(product, -25)])
+        self.assertEqual(self.open_alerts().count(), 1)
+        self.assertEqual(Notification.objects.filter(notification_type='LOW_STOCK').count(), 2)
+
+    def test_constraint_rejects_duplicate_open_alerts(self):
+        self.move([(self.products[0], -6)])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notification.objects.create(notification_type='LOW_STOCK', message='duplicate', related_product=self.products[0])
+
+    def test_command_evaluates_every_product(self):
+        Product.objects.filter(pk=self.products[1].pk).update(stock_quantity=1)
+
+        out = StringIO()
+        call_command('check_low_stock', stdout=out)
+        call_command('check_low_stock', stdout=out)
+
+        self.assertIn('created 1 low stock', out.getvalue())
+        self.assertIn('created 0 low stock', out.getvalue())
+
+
+class SequenceTests(APITestCase):
+    def test_codes_follow_their_sequences(self):
+        customers = [Customer.objects.create(name=f'Customer {i}', phone_no='0770000000') for i in range(3)]
+        year = timezone.now().year
+
+        self.assertEqual([c.account_code for c in customers], [f'CUST-{year}-{i:04d}' for i in (1, 2, 3)])
+        self.assertEqual(Sequence.objects.get(name=f'CUST-{year}').last_value, 3)
+
+    def test_rolled_back_allocation_leaves_no_gap(self):
+        Sequence.objects.allocate('TEST')
+        try:
+            with transaction.atomic():
+                Sequence.objects.allocate('TEST')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertEqual(Sequence.objects.allocate('TEST'), 2)
+
+    def test_block_allocation_reserves_contiguous_values(self):
+        self.assertEqual(Sequence.objects.allocate('BLOCK', 10), 1)
+        self.assertEqual(Sequence.objects.allocate('BLOCK', 5), 11)
+
+    @override_settings(SEQUENCE_BLOCK_SIZE=5)
+    def test_worker_blocks_are_only_used_outside_transactions(self):
+        # Test methods run inside an atomic block, so values stay gap-free here
+        self.assertEqual([Sequence.objects.next_value('WORKER') for _ in range(3)], [1, 2, 3])
+
+
+class ConcurrentSequenceTests(TransactionTestCase):
+    def run_in_threads(self, target, count=8):
+        barrier = threading.Barrier(count)
+
+        def run():
+            barrier.wait()
+            try:
+                target()
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_parallel_writers_get_distinct_values(self):
+        values = []
+        self.run_in_threads(lambda: values.extend(Sequence.objects.allocate('PARALLEL') for _ in range(25)))
+
+        self.assertEqual(sorted(values), list(range(1, 201)))
+
+    @override_settings(SEQUENCE_BLOCK_SIZE=10)
+    def test_parallel_block_allocation_has_no_duplicates(self):
+        values = []
+        self.run_in_threads(lambda: values.extend(Sequence.objects.next_value('BLOCKS') for _ in range(25)))
+
+        self.assertEqual(len(values), 200)
+        self.assertEqual(len(set(values)), 200)
+
+    def test_failed_save_gives_its_code_back(self):
+        # Not in a transaction here, so the save brings its own
+        with self.assertRaises(IntegrityError):
+            Customer.objects.create(name=None, phone_no='0770000000')
+        customer = Customer.objects.create(name='Walk-in', phone_no='0770000000')
+
+        self.assertEqual(customer.account_code, f'CUST-{timezone.now().year}-0001')
+
+    def test_parallel_customer_creation_has_unique_account_codes(self):
+        self.run_in_threads(lambda: [
+            Customer.objects.create(name='Walk-in', phone_no='0770000000') for _ in range(5)
+        ])
+
+        codes = list(Customer.objects.values_list('account_code', flat=True))
+        self.assertEqual(len(codes), 40)
+        self.assertEqual(len(set(codes)), 40)
+
+
+class ConcurrentInventoryTests(TransactionTestCase):
+    run_in_threads = ConcurrentSequenceTests.run_in_threads
+
+    def test_parallel_movements_do_not_lose_updates(self):
+        product = Product.objects.create(name='Panel', stock_quantity=100)
+        self.run_in_threads(lambda: [
+            InventoryService.post_movements([StockMovement(movement_type='SALE', product=product, quantity=1)])
+            for _ in range(5)
+        ])
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 60)
+        self.assertFalse(InventoryService.check_drift().exists())
+
+
+class NotificationRetentionTests(APITestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.product = Product.objects.create(name='Inverter', default_sale_price=Decimal('300.00'), stock_quantity=1, low_stock_threshold=5)
+        # Drop the notification announcing the new product
+        Notification.objects.all().delete()
+
+    def notify(self, days_ago, notification_type='GENERAL', **fields):
+        notification = Notification.objects.create(message='Old news', notification_type=notification_type, **fields)
+        Notification.objects.filter(id=notification.id).update(timestamp=self.now - timedelta(days=days_ago))
+        return notification
+
+    def test_purge_keeps_recent_and_open_alerts_and_archives_the_rest(self):
+        for _ in range(5):
+            self.notify(40)
+        self.notify(100, 'PAYMENT_DUE')
+        recent = [self.notify(5), self.notify(40, 'PAYMENT_DUE')]
+        open_alert = self.notify(60, 'LOW_STOCK', related_product=self.product)
+        self.notify(60, 'LOW_STOCK', related_product=self.product, resolved_at=self.now)
+
+        with CaptureQueriesContext(connection) as ctx:
+            deleted = NotificationService.purge(now=self.now, batch_size=2)
+
+        self.assertEqual(deleted, 7)
+        self.assertEqual(
+            set(Notification.objects.values_list('id', flat=True)),
+            {notification.id for notification in recent} | {open_alert.id}
+        )
+        # Chunks are deleted by primary key range, never by selecting whole rows
+        self.assertFalse([query for query in ctx.captured_queries if query['sql'].startswith('SELECT "pos_app_notification"."id", "pos_app_notification"."message"')])
+        self.assertEqual(len([query for query in ctx.captured_queries if query['sql'].startswith('DELETE')]), 4)
+        self.assertEqual(
+            dict(NotificationArchive.objects.values_list('notification_type', 'count')),
+            {'GENERAL': 5, 'PAYMENT_DUE': 1, 'LOW_STOCK': 1}
+        )
+
+    def test_archive_counts_accumulate_across_runs(self):
+        self.notify(40)
+        NotificationService.purge(now=self.now)
+        self.notify(40)
+        NotificationService.purge(now=self.now)
+
+        archived = NotificationArchive.objects.get(notification_type='GENERAL')
+        self.assertEqual((archived.date, archived.count), (timezone.localdate(self.now - timedelta(days=40)), 2))
+
+    @override_settings(NOTIFICATION_RETENTION_DAYS={'GENERAL': None})
+    def test_retention_is_configurable_per_type(self):
+        kept = self.notify(400)
+        self.notify(400, 'STOCK_ALERT')
+
+        out = StringIO()
+        call_command('purge_notifications', '--no-archive', stdout=out)
+
+        self.assertIn('Purged 1 notifications', out.getvalue())
+        self.assertEqual(list(Notification.objects.values_list('id', flat=True)), [kept.id])
+        self.assertFalse(NotificationArchive.objects.exists())
+
+    def test_delete_all_uses_batched_deletes(self):
+        for days in range(3):
+            self.notify(days)
+        self.client.force_authenticate(User.objects.create_superuser('owner', 'owner@example.com', 'password'))
+
+        response = self.client.delete('/api/notifications/delete_all/')
+
+        self.assertEqual(response.data, {'status': '3 notifications deleted'})
+        self.assertFalse(Notification.objects.exists())
+
+    def test_raw_deletes_skip_nothing_the_collector_would_do(self):
+        # NotificationService.delete bypasses the ORM collector. If a model
+        # ever references Notification, or a pre_delete receiver is added,
+        # switch it back to queryset.delete().
+        self.assertEqual(Notification._meta.related_objects, ())
+        self.assertFalse(pre_delete.has_listeners(Notification))
+        for days in range(3):
+            self.notify(days)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            deleted = NotificationService.delete(Notification.objects.all(), batch_size=1)
+
+        # One stream wake-up and one dashboard invalidation, not a pair per row
+        self.assertEqual(deleted, 3)
+        self.assertEqual(len(callbacks), 2)
+        self.assertIn(NotificationBroker._notify, callbacks)
+
+
+class QueryPlanTests(APITestCase):
+    """The hot filters must be answered from an index, never by scanning the whole table"""
+    ENDPOINTS = [
+        '/api/transactions/to_collect/',
+        '/api/transactions/to_pay/',
+        '/api/transactions/daily_sales/',
+        '/api/notifications/unread/',
+        '/api/products/low_stock/',
+        '/api/products/out_of_stock/',
+        '/api/customers/with_balance/',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        products = Product.objects.bulk_create(
+            Product(name=f'Panel {i}', product_unique_code=f'P{i}', default_sale_price=Decimal('100.00'), stock_quantity=0 if i % 250 == 0 else 50 - i % 60, low_stock_threshold=5)
+            for i in range(2000)
+        )
+        customers = Customer.objects.bulk_create(
+            Customer(name=f'Customer {i}', account_code=f'C{i}', outstanding_balance=Decimal('75.00') if i % 100 == 0 else 0)
+            for i in range(2000)
+        )
+        statuses = ['PAID_TO_COLLECT', 'COLLECTED_TO_PAY'] + ['SOLD'] * 48
+        Transaction.objects.bulk_create(
+            Transaction(product=products[i % 2000], customer=customers[i % 2000], status=statuses[i % 50], total_amount=Decimal('100.00'))
+            for i in range(5000)
+        )
+        Notification.objects.bulk_create(
+            Notification(message=f'Notice {i}', notification_type='GENERAL', is_read=i % 50 != 0)
+            for i in range(5000)
+        )
+        StockMovement.objects.bulk_create(
+            StockMovement(product=products[i % 2000], movement_type='RECEIPT', quantity=1)
+            for i in range(5000)
+        )
+        PaymentCollection.objects.bulk_create(
+            PaymentCollection(customer=customers[i % 2000], amount=Decimal('10.00'), status='PENDING' if i % 50 == 0 else 'PAID')
+            for i in range(5000)
+        )
+        Transaction.objects.update(timestamp=now - timedelta(days=30))
+        # Give the planner real statistics, as a production database would have
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.product = products[1]
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_superuser('owner', 'owner@example.com', 'password'))
+
+    def plan(self, sql, params=None):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Tables are small enough that a sequential scan could win on cost; only a missing index should force one
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql, params)
+                return [row[0] for row in cursor.fetchall()]
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def partial_indexes(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT indexname FROM pg_indexes WHERE indexdef LIKE '% WHERE %'")
+            else:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+            return {row[0] for row in cursor.fetchall()}
+
+    def full_scans(self, plan):
+        """Plan steps that read every row of a table or of a full index.
+
+        Walking an index end to end (for its ordering) is as slow as a table
+        scan, so only scans of partial indexes, which hold just the matching
+        rows, are allowed.
+        """
+        partial = self.partial_indexes()
+        if connection.vendor == 'postgresql':
+            nodes = []
+            for line in plan:
+                text = line.strip()
+                if text.startswith('->') or not nodes:
+                    nodes.append([text.lstrip('-> ')])
+                else:
+                    nodes[-1].append(text)
+            scans = []
+            for node, *details in nodes:
+                index = re.search(r' using (\S+) on ', node)
+                if 'Seq Scan' in node or (
+                    'Index' in node and 'Scan' in node and index and index.group(1) not in partial
+                    and not any(detail.startswith('Index Cond') for detail in details)
+                ):
+                    scans.append(node)
+            return scans
+        scans = []
+        for line in plan:
+            index = re.search(r'USING (?:COVERING )?INDEX (\S+)', line)
+            if line.startswith('SCAN ') and not (index and index.group(1) in partial):
+                scans.append(line)
+        return scans
+
+    def assertUsesIndexes(self, sql, params=None):
+        plan = self.plan(sql, params)
+        self.assertFalse(self.full_scans(plan), f'{sql}\n' + '\n'.join(plan))
+
+    def test_hot_endpoints_use_indexes(self):
+        for url in self.ENDPOINTS:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                selects = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('SELECT')]
+                self.assertTrue(selects)
+                for sql in selects:
+                    self.assertUsesIndexes(sql)
+
+    def test_hot_querysets_use_indexes(self):
+        querysets = {
+            'unread count': Notification.objects.filter(is_read=False).values('id'),
+            'low stock count': Product.objects.filter(stock_quantity__lte=F('low_stock_threshold')).values('id'),
+            'customers with balance': Customer.objects.filter(outstanding_balance__gt=0).values('id'),
+            'pending collections by due date': PaymentCollection.objects.filter(status='PENDING').order_by('due_date'),
+            'product stock history': StockMovement.objects.filter(product=self.product),
+            'product ledger': Product.objects.filter(pk=self.product.pk).annotate(on_hand=InventoryService.ledger_quantity()),
+        }
+        for name, queryset in querysets.items():
+            with self.subTest(name):
+                self.assertUsesIndexes(*queryset.query.sql_with_params())
+
+
+class RequestProfilingTests(APITestCase):
+    def setUp(self):
+        RequestProfiler.clear()
+        self.user = User.objects.create_superuser('owner', 'owner@example.com', 'password')
+        self.client.force_authenticate(self.user)
+
+    def test_reports_queries_and_timing(self):
+        with self.assertLogs('pos_app.requests', 'INFO') as logs:
+            response = self.client.get('/api/customers/')
+
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", dup;desc="\d+ repeated", total;dur=[\d.]+$')
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['path'], record['view'], record['status']), ('/api/customers/', 'customer-list', 200))
+        self.assertEqual(logs.records[-1].levelname, 'INFO')
+        self.assertFalse(RequestProfiler.slow_requests())
+
+    def test_timings_are_hidden_from_non_staff(self):
+        self.client.force_authenticate(User.objects.create_user('cashier', password='password'))
+        with self.assertLogs('pos_app.requests', 'INFO'):
+            response = self.client.get('/api/customers/')
+        self.assertNotIn('Server-Timing', response)
+
+        with override_settings(DEBUG=True), self.assertLogs('pos_app.requests', 'INFO'):
+            self.assertIn('Server-Timing', self.client.get('/api/customers/'))
+
+    def test_fingerprints_repeated_queries(self):
+        products = [Product.objects.create(name=f'Cable {i}', default_sale_price=Decimal('5.00')) for i in range(3)]
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for product in products:
+                Product.objects.get(pk=product.pk)
+            list(Product.objects.filter(pk__in=[product.pk for product in products[:2]]))
+            list(Product.objects.filter(pk__in=[product.pk for product in products]))
+
+        self.assertEqual(recorder.count, 5)
+        self.assertEqual([duplicate['count'] for duplicate in recorder.duplicates()], [3, 2])
+        self.assertIn('IN (...)', recorder.duplicates()[1]['sql'])
+
+    @override_settings(REQUEST_PROFILING_SLOW_QUERIES=1)
+    def test_slow_requests_are_sampled_for_superusers(self):
+        with self.assertLogs('pos_app.requests', 'WARNING'):
+            self.client.get('/api/customers/')
+
+        response = self.client.get('/api/debug/slow-requests/')
+        self.assertEqual([record['path'] for record in response.data['results']], ['/api/customers/'])
+
+        self.client.force_authenticate(User.objects.create_user('cashier', password='password'))
+        self.assertEqual(self.client.get('/api/debug/slow-requests/').status_code, 403)
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_switched_off_removes_the_middleware(self):
+        response = self.client.get('/api/customers/')
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get('/api/debug/slow-requests/').data['enabled'], False)
+
+
+class LatencySummaryTests(SimpleTestCase):
+    def test_percentiles_stay_within_the_samples(self):
+        for samples in ([22.53, 9.1, 8.7, 9.4, 10.2], [165.0, 120.5, 118.2], list(range(1, 21)), [4.0, 4.0]):
+            summary = latency_summary(samples)
+            self.assertLessEqual(summary['p50_ms'], summary['p95_ms'], samples)
+            self.assertLessEqual(summary['p95_ms'], summary['max_ms'], samples)
+            self.assertEqual(summary['max_ms'], max(samples))
+
+
+class SeedBenchmarkDataTests(APITestCase):
+    def test_seeds_a_consistent_history(self):
+        out = StringIO()
+        call_command(
+            'seed_benchmark_data', '--sales', '60', '--days', '3', '--products', '12',
+            '--categories', '2', '--customers', '8', '--resellers', '2', stdout=out
+        )
+
+        self.assertIn('60 transaction', out.getvalue())
+        self.assertEqual(Receipt.objects.count(), 60)
+        self.assertEqual(
+            TransactionItem.objects.count(),
+            StockMovement.objects.filter(movement_type='SALE').count()
+        )
+        today = timezone.localdate()
+        days = {timezone.localtime(moment).date() for moment in Transaction.objects.values_list('timestamp', flat=True)}
+        self.assertEqual(days, {today - timedelta(days=offset) for offset in range(3)})
+        # Stock levels agree with the ledger, and the rollups with the sales
+        self.assertFalse(InventoryService.check_drift().exists())
+        self.assertEqual(sum(DailySummary.objects.values_list('total_transactions', flat=True)), 60)
+
+
+class DatabaseProfileTests(APITestCase):
+    def test_sqlite_connections_use_the_write_profile(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with connection.cursor() as cursor:
+            pragmas = {
+                name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                for name in ('journal_mode', 'synchronous', 'foreign_keys', 'busy_timeout')
+            }
+
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'foreign_keys': 1, 'busy_timeout': 20000})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        # WAL comes from the migration; connecting must not rewrite the file's header
+        self.assertNotIn('journal_mode', connection.settings_dict['OPTIONS']['init_command'])
+
+    def test_tune_keeps_explicit_settings(self):
+        tuned = database.tune({
+            'ENGINE': 'django.db.backends.postgresql', 'NAME': 'pos',
+            'CONN_MAX_AGE': 60, 'OPTIONS': {'sslmode': 'require'},
+        })
+
+        self.assertEqual(tuned['OPTIONS'], {'connect_timeout': 10, 'sslmode': 'require'})
+        self.assertEqual((tuned['CONN_MAX_AGE'], tuned['CONN_HEALTH_CHECKS']), (60, True))
+        self.assertEqual(database.tune({'ENGINE': 'django.db.backends.mysql'})['OPTIONS'], {})
@@ -31,7 +31,10 @@ router.register(r'report-schedules', views.ReportScheduleViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('reports/', views.ReportsAPIView.as_view(), name='reports'),
+    path('exports/<str:dataset>/', views.ExportAPIView.as_view(), name='export'),
     path('dashboard/', views.DashboardAPIView.as_view(), name='dashboard'),
+    path('catalog/', views.CatalogSyncAPIView.as_view(), name='catalog-sync'),
+    path('debug/slow-requests/', views.SlowRequestsAPIView.as_view(), name='slow-requests'),
     # Authentication endpoints
     path('auth/login/', auth_views.login_view, name='login'),
     path('auth/logout/', auth_views.logout_view, name='logout'),
@@ -1,20 +1,84 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Sum, Count, Q, F
-from drf_spectacular.utils import extend_schema
-from django.db import transaction
+from django.db.models import Q, F, Prefetch
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from django.db import IntegrityError, transaction
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
 from .models import *
 from .serializers import *
+from .middleware import RequestProfiler
+from .pagination import CreatedAtCursorPagination, DateCursorPagination, TimestampCursorPagination
+from .services import (
+    CatalogService, CheckoutService, DashboardService, ExportService, InventoryService, NotificationBroker,
+    NotificationService, ProductLookupService, ReportEngine, RollupService
+)
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class IdempotentCreateMixin:
+    """Replay the stored response when a create is retried with the same Idempotency-Key header.
+
+    The key row is inserted in the same DB transaction as the write it guards,
+    so a concurrent retry waits on the unique constraint and then replays the
+    committed response instead of writing a second time.
+    """
+    idempotency_scope = None
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': 'Idempotency-Key must be at most 255 characters'}, status=400)
+        
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        scope = self.idempotency_scope or self.basename
+        request_hash = hashlib.sha256(f"{request.user.pk}:{request.path}:".encode() + request.body).hexdigest()
+        now = timezone.now()
+        
+        with transaction.atomic():
+            # An expired key may be reused as if it had never been seen
+            IdempotencyKey.objects.filter(scope=scope, key=key, expires_at__lte=now).delete()
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        scope=scope,
+                        key=key,
+                        request_hash=request_hash,
+                        user=request.user,
+                        expires_at=now + timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+                    )
+            except IntegrityError:
+                record = IdempotencyKey.objects.get(scope=scope, key=key)
+                return self.replay_response(record, request_hash)
+            
+            response = super().create(request, *args, **kwargs)
+            record.response_status = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=['response_status', 'response_body'])
+        
+        return response
+    
+    def replay_response(self, record, request_hash):
+        if record.request_hash != request_hash:
+            return Response({'error': 'Idempotency-Key was already used for a different request'}, status=422)
+        if record.response_status is None:
+            return Response({'error': 'A request with this Idempotency-Key is still in progress'}, status=409)
+        return Response(record.response_body, status=record.response_status, headers={'Idempotent-Replayed': 'true'})
+
+
 class BusinessProfileViewSet(viewsets.ModelViewSet):
     queryset = BusinessProfile.objects.all()
     serializer_class = BusinessProfileSerializer
@@ -86,6 +150,40 @@ class ProductViewSet(viewsets.ModelViewSet):
             )
         return queryset
     
+    SCAN_BATCH_MAX_CODES = 200
+    
+    @extend_schema(
+        description="Resolve an exact barcode or product code scanned at the till. Stock is live; "
+                    "other product details may lag a write made through another worker by up to PRODUCT_LOOKUP_CACHE_TTL seconds",
+        parameters=[OpenApiParameter('code', str, required=True)]
+    )
+    @action(detail=False, methods=['get'])
+    def scan(self, request):
+        code = request.query_params.get('code', '').strip()
+        if not code:
+            return Response({'error': 'code is required'}, status=400)
+        
+        product = ProductLookupService.resolve([code])[code]
+        if product is None:
+            return Response({'error': f'No product with barcode or code {code}'}, status=404)
+        return Response(product)
+    
+    @extend_schema(description="Resolve many scanned codes at once; unknown codes map to null")
+    @action(detail=False, methods=['post'], url_path='scan/batch')
+    def scan_batch(self, request):
+        codes = request.data.get('codes')
+        if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+            return Response({'error': 'codes must be a list of strings'}, status=400)
+        if len(codes) > self.SCAN_BATCH_MAX_CODES:
+            return Response({'error': f'At most {self.SCAN_BATCH_MAX_CODES} codes per request'}, status=400)
+        
+        codes = list(dict.fromkeys(code.strip() for code in codes if code.strip()))
+        products = ProductLookupService.resolve(codes)
+        return Response({
+            'results': products,
+            'missing': [code for code in codes if products[code] is None],
+        })
+    
     @extend_schema(description="Get products with low stock")
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
@@ -116,106 +214,64 @@ class CustomerViewSet(viewsets.ModelViewSet):
 class ResellerViewSet(viewsets.ModelViewSet):
     queryset = Reseller.objects.all()
     serializer_class = ResellerSerializer
+    
+    def get_queryset(self):
+        # Balances, commission and sale counts come from one grouped query per page
+        # Meta.ordering is not applied to grouped queries, so restate it for stable pages
+        return Reseller.objects.with_balances().order_by('-id')
+    
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
+    pagination_class = TimestampCursorPagination
+    
+    def get_queryset(self):
+        # Everything TransactionSerializer reads, loaded in a fixed number of queries per page
+        return Transaction.objects.select_related('product', 'customer', 'reseller').prefetch_related(
+            Prefetch('items', queryset=TransactionItem.objects.select_related('product'))
+        )
     
     def perform_create(self, serializer):
         try:
             # Get items data from request if present
             items_data = self.request.data.get('items', [])
             
-            # Automatically set the sale_by field to the current user
-            transaction = serializer.save(sale_by=self.request.user)
-            
-            # Create transaction items if provided
-            if items_data:
-                total_amount = 0
-                for item_data in items_data:
-                    product = Product.objects.get(id=item_data['product'])
-                    quantity = int(item_data['quantity'])
-                    unit_price = float(item_data.get('unit_price', product.default_sale_price))
-                    
-                    TransactionItem.objects.create(
-                        transaction=transaction,
-                        product=product,
-                        quantity=quantity,
-                        unit_price=unit_price
-                    )
-                    total_amount += unit_price * quantity
-                    
-                    # Update stock for multi-item transaction
-                    if transaction.status in ['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']:
-                        product.stock_quantity -= quantity
-                        product.save()
-                        
-                        # Create stock movement record
-                        StockMovement.objects.create(
-                            movement_type='SALE',
-                            product=product,
-                            quantity=quantity,
-                            unit_cost=product.cost_price_avg,
-                            reason='SALE',
-                            notes=f'Sale transaction {transaction.id}',
-                            performed_by=self.request.user
-                        )
-                
-                # Update transaction total
-                transaction.total_amount = total_amount
-                transaction.save()
+            with transaction.atomic():
+                # Stock, movements, receipt and collections are all posted by
+                # SalePostingService, so the post_save receivers stay out of the way
+                sale, receipt = CheckoutService.checkout(serializer.validated_data, items_data, self.request.user)
+                serializer.instance = sale
             
-            # Update stock for single product transaction
-            elif transaction.product and transaction.status in ['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']:
-                # Reduce stock for sales
-                product = transaction.product
-                product.stock_quantity -= transaction.quantity
-                product.save()
+            if receipt:
+                print(f"Receipt created: {receipt.receipt_number} for transaction {sale.id}")
                 
-                # Create stock movement record
-                StockMovement.objects.create(
-                    movement_type='SALE',
-                    product=product,
-                    quantity=transaction.quantity,
-                    unit_cost=product.cost_price_avg,
-                    reason='SALE',
-                    notes=f'Sale transaction {transaction.id}',
-                    performed_by=self.request.user
-                )
-            
-            # Automatically create receipt for sales transactions
-            if transaction.status in ['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']:
-                self.create_receipt(transaction)
+                # Print receipt details to console for immediate viewing
+                self.print_receipt_to_console(receipt)
         except Exception as e:
             print(f"Error creating transaction: {e}")
             raise
     
-    def create_receipt(self, transaction):
-        """Create a receipt for the transaction"""
-        from datetime import datetime
-        
-        # Generate receipt number
-        receipt_number = f"RCP-{datetime.now().strftime('%Y%m%d')}-{transaction.id:06d}"
-        
-        # Create receipt
-        receipt = Receipt.objects.create(
-            receipt_number=receipt_number,
-            transaction=transaction,
-            customer=transaction.customer,
-            total_amount=transaction.total_amount,
-            tax_amount=transaction.tax_amount,
-            payment_method=transaction.payment_method,
-            printed_by=self.request.user,
-            zimra_receipt_no=transaction.zimra_receipt_no
-        )
-        
-        print(f"Receipt created: {receipt.receipt_number} for transaction {transaction.id}")
-        
-        # Print receipt details to console for immediate viewing
-        self.print_receipt_to_console(receipt)
-        
-        return receipt
+    @extend_schema(description="Ingest a batch of sales queued by an offline till")
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        sales_data = request.data
+        if not isinstance(sales_data, list):
+            return Response({'error': 'Expected a list of sales'}, status=400)
+        if len(sales_data) > CheckoutService.BATCH_MAX_SALES:
+            return Response({'error': f'At most {CheckoutService.BATCH_MAX_SALES} sales per batch'}, status=400)
+        
+        results = CheckoutService.ingest_batch(sales_data, request.user)
+        return Response({
+            'created': sum(1 for result in results if result['status'] == 'created'),
+            'duplicates': sum(1 for result in results if result['status'] == 'duplicate'),
+            'errors': sum(1 for result in results if result['status'] == 'error'),
+            'results': results,
+        })
     
     def print_receipt_to_console(self, receipt):
         """Print receipt details to console"""
@@ -261,11 +317,14 @@ class TransactionViewSet(viewsets.ModelViewSet):
     @extend_schema(description="Get today's sales transactions")
     @action(detail=False, methods=['get'])
     def daily_sales(self, request):
+        from datetime import timedelta
         from django.utils import timezone
-        today = timezone.now().date()
-        transactions = Transaction.objects.filter(
-            timestamp__date=today,
-            status__in=['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']
+        today = timezone.localdate()
+        # A timestamp range, unlike timestamp__date, can use the (status, timestamp) index
+        transactions = self.get_queryset().filter(
+            timestamp__gte=ExportService.day_start(today),
+            timestamp__lt=ExportService.day_start(today + timedelta(days=1)),
+            status__in=SALE_STATUSES
         )
         serializer = self.get_serializer(transactions, many=True)
         return Response(serializer.data)
@@ -273,14 +332,14 @@ class TransactionViewSet(viewsets.ModelViewSet):
     @extend_schema(description="Get products paid but to be collected")
     @action(detail=False, methods=['get'])
     def to_collect(self, request):
-        transactions = Transaction.objects.filter(status='PAID_TO_COLLECT')
+        transactions = self.get_queryset().filter(status='PAID_TO_COLLECT')
         serializer = self.get_serializer(transactions, many=True)
         return Response(serializer.data)
     
     @extend_schema(description="Get products collected but to pay later")
     @action(detail=False, methods=['get'])
     def to_pay(self, request):
-        transactions = Transaction.objects.filter(status='COLLECTED_TO_PAY')
+        transactions = self.get_queryset().filter(status='COLLECTED_TO_PAY')
         serializer = self.get_serializer(transactions, many=True)
         return Response(serializer.data)
 
@@ -290,7 +349,7 @@ class ResellerSaleViewSet(viewsets.ModelViewSet):
     serializer_class = ResellerSaleSerializer
 
 
-class InvoiceViewSet(viewsets.ModelViewSet):
+class InvoiceViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
     
@@ -346,28 +405,38 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = DateCursorPagination
 
 
 class StockMovementViewSet(viewsets.ModelViewSet):
     queryset = StockMovement.objects.all()
     serializer_class = StockMovementSerializer
+    pagination_class = TimestampCursorPagination
     
     def perform_create(self, serializer):
         try:
-            movement = serializer.save(performed_by=self.request.user)
-            # Update product stock quantity
-            product = movement.product
-            if movement.movement_type in ['RECEIPT', 'ADJUSTMENT_IN', 'RETURN_IN']:
-                product.stock_quantity += movement.quantity
-            elif movement.movement_type in ['SALE', 'ADJUSTMENT_OUT', 'RETURN_OUT']:
-                product.stock_quantity -= movement.quantity
-            product.save()
+            # The movement and its stock change commit together
+            with transaction.atomic():
+                movement = serializer.save(performed_by=self.request.user)
+                InventoryService.apply([movement])
         except Exception as e:
             print(f"Error creating stock movement: {e}")
             raise
+    
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            # Take the old movement back out before applying the edited one
+            InventoryService.apply([StockMovement.objects.select_for_update().get(pk=serializer.instance.pk)], reverse=True)
+            movement = serializer.save()
+            InventoryService.apply([movement])
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            InventoryService.apply([instance], reverse=True)
+            instance.delete()
 
 
 class StockTakeViewSet(viewsets.ModelViewSet):
@@ -376,36 +445,33 @@ class StockTakeViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         try:
-            # Set system quantity to current product stock before saving
-            product = serializer.validated_data.get('product')
-            if product:
-                serializer.validated_data['system_quantity'] = product.stock_quantity
-            
-            stock_take = serializer.save(performed_by=self.request.user)
-            
-            # Update product stock if there's a difference
-            if stock_take.difference != 0:
-                product = stock_take.product
-                product.stock_quantity = stock_take.counted_quantity
-                product.save()
-                # Create stock movement record for the adjustment
-                StockMovement.objects.create(
-                    movement_type='ADJUSTMENT_IN' if stock_take.difference > 0 else 'ADJUSTMENT_OUT',
-                    product=product,
-                    quantity=abs(stock_take.difference),
-                    unit_cost=product.cost_price_avg,
-                    reason='COUNT_DIFFERENCE',
-                    notes=f'Stock take adjustment: {stock_take.notes}',
-                    performed_by=self.request.user
-                )
+            with transaction.atomic():
+                # Set system quantity to current product stock before saving
+                product = serializer.validated_data.get('product')
+                if product:
+                    product.refresh_from_db(fields=['stock_quantity'])
+                    serializer.validated_data['system_quantity'] = product.stock_quantity
+                
+                # The handle_stock_take_adjustment signal posts any difference to the ledger
+                serializer.save(performed_by=self.request.user)
         except Exception as e:
             print(f"Error creating stock take: {e}")
             raise
 
 
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients negotiate text/event-stream; errors are still rendered as JSON text"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode() if data is not None else b''
+
+
 class NotificationViewSet(viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
+    pagination_class = TimestampCursorPagination
     
     def destroy(self, request, *args, **kwargs):
         if not request.user.is_superuser:
@@ -419,6 +485,36 @@ class NotificationViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(notifications, many=True)
         return Response(serializer.data)
     
+    @extend_schema(
+        description="Server-Sent Events stream of new notifications ('notification' events, id = notification id) "
+                    "and unread count changes ('unread' events). Reconnect with Last-Event-ID (or ?last_event_id=) to resume. "
+                    "Returns 503 when this worker has no free stream slot; poll /api/notifications/unread/ instead",
+        parameters=[OpenApiParameter('last_event_id', int, required=False)]
+    )
+    @action(detail=False, methods=['get'], renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream(self, request):
+        from django.http import StreamingHttpResponse
+        
+        last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return Response({'error': 'Last-Event-ID must be a notification id'}, status=400)
+        
+        events = NotificationService.open_stream(last_event_id)
+        if events is None:
+            # EventSource gives up on a 503; clients fall back to polling /api/notifications/unread/
+            return Response(
+                {'error': 'Too many open notification streams, poll /api/notifications/unread/ instead'},
+                status=503, headers={'Retry-After': str(getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300))}
+            )
+        
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
     @extend_schema(description="Mark notification as read")
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
@@ -431,6 +527,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         count = Notification.objects.filter(is_read=False).update(is_read=True)
+        DashboardService.invalidate()
+        NotificationBroker.publish()
         return Response({'status': f'{count} notifications marked as read'})
     
     @extend_schema(description="Delete all notifications")
@@ -438,14 +536,14 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def delete_all(self, request):
         if not request.user.is_superuser:
             return Response({'error': 'Only superusers can delete all notifications'}, status=403)
-        count = Notification.objects.count()
-        Notification.objects.all().delete()
+        count = NotificationService.delete(Notification.objects.all())
         return Response({'status': f'{count} notifications deleted'})
     
     @extend_schema(description="Create test notifications for debugging")
     @action(detail=False, methods=['post'])
     def create_test_notifications(self, request):
         from datetime import datetime
+        from django.utils import timezone
         
         # Create test notifications of each type
         notifications_created = []
@@ -463,7 +561,9 @@ class NotificationViewSet(viewsets.ModelViewSet):
             notif2 = Notification.objects.create(
                 message=f'Test low stock alert: {product.name} has only 2 units remaining',
                 notification_type='LOW_STOCK',
-                related_product=product
+                related_product=product,
+                # Display-only sample; it must not take the product's single open-alert slot
+                resolved_at=timezone.now()
             )
             notifications_created.append(notif2.id)
         
@@ -768,8 +868,7 @@ class ProfitLossReportViewSet(viewsets.ModelViewSet):
     @extend_schema(description="Generate profit/loss report for period")
     @action(detail=False, methods=['post'])
     def generate(self, request):
-        from datetime import datetime
-        from django.utils import timezone
+        from django.utils.dateparse import parse_date
         
         period_type = request.data.get('period_type', 'MONTHLY')
         start_date = request.data.get('start_date')
@@ -777,34 +876,20 @@ class ProfitLossReportViewSet(viewsets.ModelViewSet):
         
         if not start_date or not end_date:
             return Response({'error': 'start_date and end_date required'}, status=400)
+        try:
+            start_date, end_date = parse_date(str(start_date)), parse_date(str(end_date))
+        except ValueError:
+            start_date = end_date = None
+        if start_date is None or end_date is None:
+            return Response({'error': 'start_date and end_date must be YYYY-MM-DD'}, status=400)
         
-        # Calculate metrics
-        transactions = Transaction.objects.filter(
-            timestamp__date__range=[start_date, end_date],
-            status__in=['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']
-        )
-        
-        total_sales = transactions.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        total_tax = transactions.aggregate(Sum('tax_amount'))['tax_amount__sum'] or 0
-        cost_of_goods = sum(t.dealership_price * t.quantity for t in transactions)
-        
-        expenses = Expense.objects.filter(date__date__range=[start_date, end_date])
-        total_expenses = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
-        
-        losses = Loss.objects.filter(date__date__range=[start_date, end_date])
-        total_losses = losses.aggregate(Sum('total_loss_amount'))['total_loss_amount__sum'] or 0
-        
-        # Create report
+        # Closed days come from the DailySummary rollups, so a year costs the same as a week
         report = ProfitLossReport.objects.create(
             period_type=period_type,
             start_date=start_date,
             end_date=end_date,
-            total_sales=total_sales,
-            total_tax_collected=total_tax,
-            cost_of_goods_sold=cost_of_goods,
-            total_expenses=total_expenses,
-            total_losses=total_losses,
-            generated_by=request.user
+            generated_by=request.user,
+            **ReportEngine.profit_loss(start_date, end_date)
         )
         
         serializer = self.get_serializer(report)
@@ -815,223 +900,121 @@ class DailySummaryViewSet(viewsets.ModelViewSet):
     queryset = DailySummary.objects.all()
     serializer_class = DailySummarySerializer
     
-    @extend_schema(description="Generate daily summary for specific date")
+    @extend_schema(description="Recompute the daily summary for a specific date (rows are otherwise kept current as records post)")
     @action(detail=False, methods=['post'])
     def generate(self, request):
         from django.utils import timezone
+        from django.utils.dateparse import parse_date
         
-        date = request.data.get('date', timezone.now().date())
-        
-        # Get or create daily summary
-        summary, created = DailySummary.objects.get_or_create(
-            date=date,
-            defaults=self._calculate_daily_metrics(date)
-        )
+        date = request.data.get('date')
+        try:
+            day = parse_date(str(date)) if date else timezone.localdate()
+        except ValueError:
+            day = None
+        if day is None:
+            return Response({'error': 'date must be YYYY-MM-DD'}, status=400)
         
-        if not created:
-            # Update existing summary
-            metrics = self._calculate_daily_metrics(date)
-            for key, value in metrics.items():
-                setattr(summary, key, value)
-            summary.save()
+        RollupService.rebuild(day, day)
+        summary, _ = DailySummary.objects.get_or_create(date=day)
         
         serializer = self.get_serializer(summary)
         return Response(serializer.data)
-    
-    def _calculate_daily_metrics(self, date):
-        transactions = Transaction.objects.filter(timestamp__date=date)
-        sales_transactions = transactions.filter(status__in=['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY'])
-        
-        expenses = Expense.objects.filter(date__date=date)
-        losses = Loss.objects.filter(date__date=date)
-        payments = Payment.objects.filter(date__date=date)
-        
-        total_sales = sales_transactions.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        total_expenses = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
-        total_losses = losses.aggregate(Sum('total_loss_amount'))['total_loss_amount__sum'] or 0
-        cost_of_goods = sum(item.product.cost_price_avg * item.quantity for t in sales_transactions for item in t.items.all()) or 0
-        
-        return {
-            'total_transactions': sales_transactions.count(),
-            'total_sales_amount': total_sales,
-            'total_tax_amount': sales_transactions.aggregate(Sum('tax_amount'))['tax_amount__sum'] or 0,
-            'cash_sales': payments.filter(payment_method='CASH').aggregate(Sum('amount'))['amount__sum'] or 0,
-            'card_sales': payments.filter(payment_method='CARD').aggregate(Sum('amount'))['amount__sum'] or 0,
-            'ecocash_sales': payments.filter(payment_method='ECOCASH').aggregate(Sum('amount'))['amount__sum'] or 0,
-            'products_received': transactions.filter(status='RECEIVED').count(),
-            'products_sold': transactions.filter(status='SOLD').count(),
-            'products_to_collect': transactions.filter(status='PAID_TO_COLLECT').count(),
-            'products_to_pay': transactions.filter(status='COLLECTED_TO_PAY').count(),
-            'total_expenses': total_expenses,
-            'total_losses': total_losses,
-            'cost_of_goods_sold': cost_of_goods,
-            'gross_profit': total_sales - cost_of_goods,
-            'net_profit': total_sales - cost_of_goods - total_expenses - total_losses,
-            'new_customers': Customer.objects.filter(date_created__date=date).count(),
-            'payments_received': payments.filter(customer__isnull=False).aggregate(Sum('amount'))['amount__sum'] or 0,
-        }
 
 
 class ReportsAPIView(APIView):
-    @extend_schema(description="Get various business reports")
+    REPORTS = ['daily', 'weekly', 'monthly', 'stock', 'customers', 'resellers', 'expenses', 'losses', 'profit_loss']
+    
+    @extend_schema(description="Get various business reports; type=all returns every report in one response")
     def get(self, request):
         report_type = request.query_params.get('type', 'daily')
         
+        if report_type == 'all':
+            return Response(self.all_reports())
+        if report_type not in self.REPORTS:
+            return Response({'error': 'Invalid report type'}, status=400)
+        
+        return Response(self.build_report(report_type, {}))
+    
+    def all_reports(self):
+        # Reports over the same table share one aggregate, so this is a handful of queries
+        cache = {}
+        return {report_type: self.build_report(report_type, cache) for report_type in self.REPORTS}
+    
+    def build_report(self, report_type, cache):
+        from django.utils import timezone
+        # The business day, as ReportEngine and the rollups count it, not the UTC date
+        today = timezone.localdate()
+        
         if report_type == 'daily':
-            data = self.daily_sales_report()
+            return self.daily_sales_report(today, self.metrics(cache, 'sales', ReportEngine.sales, today))
         elif report_type == 'weekly':
-            data = self.weekly_sales_report()
+            return self.weekly_sales_report(today, self.metrics(cache, 'sales', ReportEngine.sales, today))
         elif report_type == 'monthly':
-            data = self.monthly_sales_report()
+            return self.monthly_sales_report(today, self.metrics(cache, 'sales', ReportEngine.sales, today))
         elif report_type == 'stock':
-            data = self.stock_report()
+            return ReportEngine.stock()
         elif report_type == 'customers':
-            data = self.customer_balance_report()
+            return ReportEngine.customer_balances()
         elif report_type == 'resellers':
-            data = self.reseller_commission_report()
+            return ReportEngine.reseller_balances()
         elif report_type == 'expenses':
-            data = self.expenses_report()
+            expenses = self.metrics(cache, 'expenses', ReportEngine.grouped_totals, Expense, 'expense_type', 'amount', today)
+            return {
+                'total_expenses_today': expenses['today_total'],
+                'expenses_by_type': expenses['by_type'],
+            }
         elif report_type == 'losses':
-            data = self.losses_report()
+            losses = self.metrics(cache, 'losses', ReportEngine.grouped_totals, Loss, 'loss_type', 'total_loss_amount', today)
+            return {
+                'total_losses_today': losses['today_total'],
+                'losses_by_type': losses['by_type'],
+            }
         elif report_type == 'profit_loss':
-            data = self.profit_loss_report()
-        else:
-            return Response({'error': 'Invalid report type'}, status=400)
-        
-        return Response(data)
+            return self.profit_loss_report(
+                today,
+                self.metrics(cache, 'expenses', ReportEngine.grouped_totals, Expense, 'expense_type', 'amount', today),
+                self.metrics(cache, 'losses', ReportEngine.grouped_totals, Loss, 'loss_type', 'total_loss_amount', today),
+            )
     
-    def daily_sales_report(self):
-        from django.utils import timezone
-        today = timezone.now().date()
-        
-        transactions = Transaction.objects.filter(
-            timestamp__date=today,
-            status__in=['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']
-        )
-        
+    @staticmethod
+    def metrics(cache, key, compute, *args):
+        if key not in cache:
+            cache[key] = compute(*args)
+        return cache[key]
+    
+    def daily_sales_report(self, today, sales):
         return {
             'date': today,
-            'total_transactions': transactions.count(),
-            'total_amount': transactions.aggregate(Sum('total_amount'))['total_amount__sum'] or 0,
-            'total_tax': transactions.aggregate(Sum('tax_amount'))['tax_amount__sum'] or 0,
+            'total_transactions': sales['daily_count'],
+            'total_amount': sales['daily_amount'],
+            'total_tax': sales['daily_tax'],
         }
     
-    def weekly_sales_report(self):
-        from django.utils import timezone
+    def weekly_sales_report(self, today, sales):
         from datetime import timedelta
         
-        today = timezone.now().date()
-        week_start = today - timedelta(days=7)
-        
-        transactions = Transaction.objects.filter(
-            timestamp__date__range=[week_start, today],
-            status__in=['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']
-        )
-        
         return {
-            'start_date': week_start,
+            'start_date': today - timedelta(days=7),
             'end_date': today,
-            'total_transactions': transactions.count(),
-            'total_amount': transactions.aggregate(Sum('total_amount'))['total_amount__sum'] or 0,
-        }
-    
-    def monthly_sales_report(self):
-        from django.utils import timezone
-        
-        now = timezone.now()
-        transactions = Transaction.objects.filter(
-            timestamp__year=now.year,
-            timestamp__month=now.month,
-            status__in=['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']
-        )
-        
-        return {
-            'year': now.year,
-            'month': now.month,
-            'total_transactions': transactions.count(),
-            'total_amount': transactions.aggregate(Sum('total_amount'))['total_amount__sum'] or 0,
-        }
-    
-    def stock_report(self):
-        products = Product.objects.filter(is_active=True)
-        
-        return {
-            'total_products': products.count(),
-            'low_stock_products': products.filter(stock_quantity__lte=F('low_stock_threshold')).count(),
-            'out_of_stock_products': products.filter(stock_quantity=0).count(),
-        }
-    
-    def customer_balance_report(self):
-        customers = Customer.objects.filter(outstanding_balance__gt=0)
-        
-        return {
-            'total_customers_with_balance': customers.count(),
-            'total_outstanding': customers.aggregate(Sum('outstanding_balance'))['outstanding_balance__sum'] or 0,
-        }
-    
-    def reseller_commission_report(self):
-        resellers = Reseller.objects.filter(current_balance__gt=0)
-        
-        return {
-            'total_resellers_owed': resellers.count(),
-            'total_amount_owed': resellers.aggregate(Sum('current_balance'))['current_balance__sum'] or 0,
+            'total_transactions': sales['weekly_count'],
+            'total_amount': sales['weekly_amount'],
         }
     
-    def expenses_report(self):
-        from django.utils import timezone
-        today = timezone.now().date()
-        
-        expenses = Expense.objects.filter(date__date=today)
-        
+    def monthly_sales_report(self, today, sales):
         return {
-            'total_expenses_today': expenses.aggregate(Sum('amount'))['amount__sum'] or 0,
-            'expenses_by_type': expenses.values('expense_type').annotate(total=Sum('amount')),
+            'year': today.year,
+            'month': today.month,
+            'total_transactions': sales['monthly_count'],
+            'total_amount': sales['monthly_amount'],
         }
     
-    def losses_report(self):
-        from django.utils import timezone
-        today = timezone.now().date()
-        
-        losses = Loss.objects.filter(date__date=today)
-        
-        return {
-            'total_losses_today': losses.aggregate(Sum('total_loss_amount'))['total_loss_amount__sum'] or 0,
-            'losses_by_type': losses.values('loss_type').annotate(total=Sum('total_loss_amount')),
-        }
-    
-    def profit_loss_report(self):
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        today = timezone.now().date()
+    def profit_loss_report(self, today, expenses, losses):
         month_start = today.replace(day=1)
         
-        # Get monthly data
-        transactions = Transaction.objects.filter(
-            timestamp__date__range=[month_start, today],
-            status__in=['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']
-        )
-        
-        # Calculate revenue excluding reseller markup
-        business_revenue = 0
-        cost_of_goods = 0
-        for t in transactions:
-            for item in t.items.all():
-                if t.reseller:
-                    # For reseller transactions, use product default price (not markup)
-                    business_revenue += item.product.default_sale_price * item.quantity
-                else:
-                    # For direct sales, use full amount
-                    business_revenue += item.unit_price * item.quantity
-                cost_of_goods += item.product.cost_price_avg * item.quantity
-        
-        total_sales = business_revenue
-        
-        expenses = Expense.objects.filter(date__date__range=[month_start, today])
-        total_expenses = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
-        
-        losses = Loss.objects.filter(date__date__range=[month_start, today])
-        total_losses = losses.aggregate(Sum('total_loss_amount'))['total_loss_amount__sum'] or 0
+        # Revenue excludes reseller markup
+        total_sales, cost_of_goods = ReportEngine.sales_margin(month_start, today)
+        total_expenses = expenses['month_total']
+        total_losses = losses['month_total']
         
         gross_profit = total_sales - cost_of_goods
         net_profit = gross_profit - total_expenses - total_losses
@@ -1052,6 +1035,7 @@ class ReportsAPIView(APIView):
 class PaymentCollectionViewSet(viewsets.ModelViewSet):
     queryset = PaymentCollection.objects.all()
     serializer_class = PaymentCollectionSerializer
+    pagination_class = CreatedAtCursorPagination
     
     def perform_create(self, serializer):
         try:
@@ -1181,27 +1165,109 @@ class PaymentCollectionViewSet(viewsets.ModelViewSet):
         })
 
 
+class ExportAPIView(APIView):
+    @extend_schema(description="Stream a ledger (transactions, items, payments, stock-movements, expenses) as CSV or NDJSON. "
+                               "Filter with ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive); choose ?output=csv|ndjson")
+    def get(self, request, dataset):
+        from django.http import StreamingHttpResponse
+        from django.utils.dateparse import parse_date
+        
+        if dataset not in ExportService.DATASETS:
+            return Response({'error': f'Unknown export. Available: {", ".join(ExportService.DATASETS)}'}, status=404)
+        
+        output = request.query_params.get('output', 'csv')
+        if output not in ExportService.FORMATS:
+            return Response({'error': f'output must be one of {", ".join(ExportService.FORMATS)}'}, status=400)
+        
+        bounds = {}
+        for param in ('start', 'end'):
+            value = request.query_params.get(param)
+            try:
+                bounds[param] = parse_date(value) if value else None
+            except ValueError:
+                bounds[param] = None
+            if value and not bounds[param]:
+                return Response({'error': f'{param} must be a date in YYYY-MM-DD format'}, status=400)
+        
+        response = StreamingHttpResponse(
+            ExportService.stream(dataset, output, bounds['start'], bounds['end']),
+            content_type=ExportService.FORMATS[output]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{output}"'
+        return response
+
+
+class CatalogSyncAPIView(APIView):
+    @extend_schema(
+        description="Product catalog for till sync. Without since, a full snapshot of active products and categories; "
+                    "with ?since=<version from the last sync>, only what changed, plus removed ids. "
+                    "Stock levels are as of the sync and changes to them alone are not in deltas; scan for live stock. "
+                    "Rows are positional under 'columns'; send the ETag as If-None-Match to get a 304 when nothing changed",
+        parameters=[OpenApiParameter('since', int, required=False)]
+    )
+    def get(self, request):
+        import gzip
+        from django.http import HttpResponse
+        from django.utils.http import parse_etags
+        
+        since = request.query_params.get('since')
+        try:
+            since = int(since) if since else 0
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'since must be a catalog version returned by an earlier sync'}, status=400)
+        
+        version = CatalogService.current_version()
+        etag = f'"catalog-{version}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return HttpResponse(status=304, headers={'ETag': etag})
+        
+        # A version the server has never issued (e.g. after a restore) gets a fresh snapshot
+        payload = CatalogService.changes(since) if 0 < since <= version else CatalogService.snapshot()
+        body = CatalogService.encode(payload)
+        response = HttpResponse(content_type='application/json')
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response['Content-Encoding'] = 'gzip'
+        else:
+            body = gzip.decompress(body)
+        response.content = body
+        response['ETag'] = f'"catalog-{payload["version"]}"'
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+
 class DashboardAPIView(APIView):
-    @extend_schema(description="Get dashboard summary data")
+    @extend_schema(description="Get dashboard summary data; send the returned ETag as If-None-Match to get a 304 when nothing changed")
     def get(self, request):
-        from django.utils import timezone
+        from django.utils.http import parse_etags
         
-        today = timezone.now().date()
-        today_sales = Transaction.objects.filter(
-            timestamp__date=today,
-            status__in=['SOLD', 'PAID_TO_COLLECT', 'COLLECTED_TO_PAY']
-        ).aggregate(total=Sum('total_amount'), count=Count('id'))
-        
-        dashboard_data = {
-            'today_sales': today_sales,
-            'low_stock_count': Product.objects.filter(stock_quantity__lte=F('low_stock_threshold')).count(),
-            'pending_invoices': Invoice.objects.filter(status='PENDING').count(),
-            'customers_with_balance': Customer.objects.filter(outstanding_balance__gt=0).count(),
-            'unread_notifications': Notification.objects.filter(is_read=False).count(),
-            'pending_collections': PaymentCollection.objects.filter(status='PENDING').count(),
-        }
+        dashboard_data, etag = DashboardService.snapshot()
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            return Response(status=304, headers=headers)
         
-        return Response(dashboard_data)
+        return Response(dashboard_data, headers=headers)
+
+
+class SlowRequestsAPIView(APIView):
+    @extend_schema(description="Slow requests sampled by the profiling middleware in this worker, newest first (superusers only)")
+    def get(self, request):
+        if not request.user.is_superuser:
+            return Response({'error': 'Only superusers can view slow requests'}, status=403)
+        return Response({
+            'enabled': getattr(settings, 'REQUEST_PROFILING', False),
+            'results': RequestProfiler.slow_requests(),
+        })
+    
+    @extend_schema(description="Clear the sampled slow requests (superusers only)")
+    def delete(self, request):
+        if not request.user.is_superuser:
+            return Response({'error': 'Only superusers can clear slow requests'}, status=403)
+        RequestProfiler.clear()
+        return Response(status=204)
 
 
 class ReportScheduleViewSet(viewsets.ModelViewSet):